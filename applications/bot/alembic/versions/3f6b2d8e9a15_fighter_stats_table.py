@@ -0,0 +1,111 @@
+"""Fighter stats table
+
+Revision ID: 3f6b2d8e9a15
+Revises: 8c3e5a71d2b4
+Create Date: 2026-10-18 19:05:37.214586
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f6b2d8e9a15"
+down_revision = "8c3e5a71d2b4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The matches of each fighter in each tier, summed up. Averages are the sums divided
+    # by the number of matches they are defined for, shares need a pot and odds a bet.
+    op.create_table(
+        "fighter_stats",
+        sa.Column("fighter_id", sa.Integer(), nullable=False),
+        sa.Column("tier", sa.String(length=1), nullable=False),
+        sa.Column("matches", sa.Integer(), nullable=False),
+        sa.Column("wins", sa.Integer(), nullable=False),
+        sa.Column("bet_on", sa.BigInteger(), nullable=False),
+        sa.Column("bet_against", sa.BigInteger(), nullable=False),
+        sa.Column("bet_share_sum", sa.Float(), nullable=False),
+        sa.Column("bet_share_matches", sa.Integer(), nullable=False),
+        sa.Column("odds_sum", sa.Float(), nullable=False),
+        sa.Column("odds_matches", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["fighter_id"], ["fighter.id"], onupdate="CASCADE", ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("fighter_id", "tier"),
+    )
+
+    # Every match seen from the side of both of its fighters, as the bot adds them up
+    # at this revision. Matches where a fighter somehow fought themselves are only
+    # counted once, from the red side. Sums are accumulated in the order matches were
+    # played.
+    op.execute(
+        """
+        INSERT INTO fighter_stats
+            (
+                fighter_id,
+                tier,
+                matches,
+                wins,
+                bet_on,
+                bet_against,
+                bet_share_sum,
+                bet_share_matches,
+                odds_sum,
+                odds_matches
+            )
+        SELECT
+            fighter_id,
+            tier,
+            COUNT(*) AS matches,
+            COUNT(*) FILTER (WHERE won) AS wins,
+            SUM(bet_on) AS bet_on,
+            SUM(bet_against) AS bet_against,
+            COALESCE(
+                SUM(
+                    bet_on::float / NULLIF(bet_on::bigint + bet_against, 0) ORDER BY id
+                ),
+                0
+            ) AS bet_share_sum,
+            COUNT(*) FILTER (WHERE bet_on::bigint + bet_against > 0)
+                AS bet_share_matches,
+            COALESCE(
+                SUM(bet_against::float / NULLIF(bet_on, 0) ORDER BY id), 0
+            ) AS odds_sum,
+            COUNT(*) FILTER (WHERE bet_on > 0) AS odds_matches
+        FROM
+            (
+                SELECT
+                    id,
+                    fighter_red AS fighter_id,
+                    tier,
+                    winner = fighter_red AS won,
+                    bet_red AS bet_on,
+                    bet_blue AS bet_against
+                FROM
+                    match
+                UNION ALL
+                SELECT
+                    id,
+                    fighter_blue,
+                    tier,
+                    winner = fighter_blue,
+                    bet_blue,
+                    bet_red
+                FROM
+                    match
+                WHERE
+                    fighter_blue <> fighter_red
+            ) AS side
+        GROUP BY
+            fighter_id,
+            tier
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("fighter_stats")
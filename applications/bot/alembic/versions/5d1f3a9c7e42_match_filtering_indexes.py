@@ -0,0 +1,74 @@
+"""Match filtering indexes
+
+Revision ID: 5d1f3a9c7e42
+Revises: 248ad8274833
+Create Date: 2026-10-18 16:20:41.318402
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5d1f3a9c7e42"
+down_revision = "248ad8274833"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built concurrently so the bot can keep writing matches while indexes are built.
+    with op.get_context().autocommit_block():
+        # Matches of a fighter ordered by ID. A red OR blue lookup is answered by a
+        # BitmapOr across both indexes.
+        op.create_index(
+            "ix_match_fighter_red_id",
+            "match",
+            ["fighter_red", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_match_fighter_blue_id",
+            "match",
+            ["fighter_blue", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_match_winner",
+            "match",
+            ["winner"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_match_tier_match_format",
+            "match",
+            ["tier", "match_format"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_match_date",
+            "match",
+            ["date"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for index_name in [
+            "ix_match_date",
+            "ix_match_tier_match_format",
+            "ix_match_winner",
+            "ix_match_fighter_blue_id",
+            "ix_match_fighter_red_id",
+        ]:
+            op.drop_index(
+                index_name,
+                table_name="match",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,153 @@
+"""Match rating table
+
+Revision ID: 8c3e5a71d2b4
+Revises: 5d1f3a9c7e42
+Create Date: 2026-10-18 17:42:10.502913
+
+"""
+
+import io
+import math
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8c3e5a71d2b4"
+down_revision = "5d1f3a9c7e42"
+branch_labels = None
+depends_on = None
+
+# The rating rules as they were at this revision, kept here so that the migration gives
+# the same ratings however the bot changes.
+DEFAULT_ELO = 1500
+ELO_K_FACTOR = 32
+# Matches read from, and ratings written to, the database at a time.
+BATCH_SIZE = 100_000
+
+
+def calculate_elo(elo: int, opponent_elo: int, won: bool) -> int:
+    tr_alpha = math.pow(10, elo / 400)
+    tr_beta = math.pow(10, opponent_elo / 400)
+    es_alpha = tr_alpha / (tr_alpha + tr_beta)
+    return int(elo + (ELO_K_FACTOR * ((1 if won else 0) - es_alpha)))
+
+
+def write_match_ratings(connection) -> None:
+    """
+    Replays every match in the order it was played, as the bot recorded them, and
+    writes the ratings both fighters went into and came out of it with.
+    """
+    # Tier, Elo and tier Elo of every fighter, created with the tier of its first match.
+    fighters: dict[int, tuple[str, int, int]] = {}
+    rows: list[str] = []
+
+    def flush(write_cursor) -> None:
+        write_cursor.copy_expert(
+            """
+            COPY match_rating (
+                match_id,
+                elo_before_red,
+                elo_after_red,
+                tier_elo_before_red,
+                tier_elo_after_red,
+                elo_before_blue,
+                elo_after_blue,
+                tier_elo_before_blue,
+                tier_elo_after_blue
+            ) FROM STDIN
+            """,
+            io.StringIO("".join(rows)),
+        )
+        rows.clear()
+
+    with (
+        connection.cursor(name="match_history") as read_cursor,
+        connection.cursor() as write_cursor,
+    ):
+        read_cursor.itersize = BATCH_SIZE
+        read_cursor.execute(
+            """
+            SELECT
+                id,
+                fighter_red,
+                fighter_blue,
+                winner = fighter_red,
+                tier
+            FROM
+                match
+            ORDER BY
+                date,
+                id
+            """
+        )
+        for match_id, red, blue, red_won, tier in read_cursor:
+            red_tier, red_elo, red_tier_elo = fighters.setdefault(
+                red, (tier, DEFAULT_ELO, DEFAULT_ELO)
+            )
+            blue_tier, blue_elo, blue_tier_elo = fighters.setdefault(
+                blue, (tier, DEFAULT_ELO, DEFAULT_ELO)
+            )
+
+            # Tier Elo resets for a fighter that changed tiers.
+            red_elo_after = calculate_elo(red_elo, blue_elo, red_won)
+            red_tier_elo_after = calculate_elo(
+                red_tier_elo if red_tier == tier else DEFAULT_ELO,
+                blue_tier_elo,
+                red_won,
+            )
+            blue_elo_after = calculate_elo(blue_elo, red_elo, not red_won)
+            blue_tier_elo_after = calculate_elo(
+                blue_tier_elo if blue_tier == tier else DEFAULT_ELO,
+                red_tier_elo,
+                not red_won,
+            )
+            # Blue wins should a fighter somehow be on both sides.
+            fighters[red] = (tier, red_elo_after, red_tier_elo_after)
+            fighters[blue] = (tier, blue_elo_after, blue_tier_elo_after)
+
+            rows.append(
+                f"{match_id}\t{red_elo}\t{red_elo_after}\t{red_tier_elo}\t"
+                f"{red_tier_elo_after}\t{blue_elo}\t{blue_elo_after}\t"
+                f"{blue_tier_elo}\t{blue_tier_elo_after}\n"
+            )
+            if len(rows) == BATCH_SIZE:
+                flush(write_cursor)
+        flush(write_cursor)
+
+
+def upgrade():
+    # The Elo and tier Elo of both fighters going into, and coming out of, each match.
+    # `tier_elo_before_*` is the fighter's tier Elo as it was, before being reset by a
+    # change of tier.
+    op.create_table(
+        "match_rating",
+        sa.Column("match_id", sa.Integer(), nullable=False),
+        *(
+            sa.Column(f"{rating}_{when}_{colour}", sa.Integer(), nullable=False)
+            for colour in ["red", "blue"]
+            for rating in ["elo", "tier_elo"]
+            for when in ["before", "after"]
+        ),
+    )
+
+    # Existing matches never stored their ratings, replay the history to get them.
+    # Constraints are added afterwards, checking them all at once is far quicker than
+    # row by row.
+    write_match_ratings(op.get_bind().connection)
+
+    op.create_primary_key("match_rating_pkey", "match_rating", ["match_id"])
+    op.create_foreign_key(
+        "match_rating_match_id_fkey",
+        "match_rating",
+        "match",
+        ["match_id"],
+        ["id"],
+        onupdate="CASCADE",
+        ondelete="CASCADE",
+    )
+
+
+def downgrade():
+    op.drop_table("match_rating")
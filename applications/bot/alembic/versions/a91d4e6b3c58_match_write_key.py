@@ -0,0 +1,44 @@
+"""Match write key
+
+Revision ID: a91d4e6b3c58
+Revises: e2a9c7f41b35
+Create Date: 2026-10-19 10:41:52.208316
+
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a91d4e6b3c58"
+down_revision = "e2a9c7f41b35"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Set by the bot when it queues a match so that a match replayed after its commit
+    # was lost is only recorded once. Matches recorded before have none.
+    op.add_column("match", sa.Column("write_key", postgresql.UUID(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_match_write_key",
+            "match",
+            ["write_key"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_match_write_key",
+            table_name="match",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column("match", "write_key")
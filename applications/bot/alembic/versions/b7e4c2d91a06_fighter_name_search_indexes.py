@@ -0,0 +1,56 @@
+"""Fighter name search indexes
+
+Revision ID: b7e4c2d91a06
+Revises: 3f6b2d8e9a15
+Create Date: 2026-10-18 19:41:52.603127
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b7e4c2d91a06"
+down_revision = "3f6b2d8e9a15"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Trusted since PostgreSQL 13, the database owner can create it without being a
+    # superuser.
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        # Similarity ranked lookups, `name % 'query'` only looks at names sharing
+        # trigrams with the query.
+        op.create_index(
+            "ix_fighter_name_trgm",
+            "fighter",
+            ["name"],
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Case insensitive exact and prefix lookups. Byte ordering lets `LIKE 'abc%'`
+        # use the index whatever the collation of the database.
+        op.create_index(
+            "ix_fighter_lower_name",
+            "fighter",
+            [sa.text('(lower(name) COLLATE "C")')],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    # `pg_trgm` is left installed, other objects may have come to rely on it.
+    with op.get_context().autocommit_block():
+        for index_name in ["ix_fighter_lower_name", "ix_fighter_name_trgm"]:
+            op.drop_index(
+                index_name,
+                table_name="fighter",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,49 @@
+"""Fighter rank indexes
+
+Revision ID: e2a9c7f41b35
+Revises: b7e4c2d91a06
+Create Date: 2026-10-18 23:12:07.481925
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e2a9c7f41b35"
+down_revision = "b7e4c2d91a06"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        # Fighters ordered as they are ranked, highest rated first with ties broken by
+        # ID. Leaderboards and `order_by` on ELO read straight off these, keyset
+        # cursors seek into them.
+        op.create_index(
+            "ix_fighter_tier_tier_elo_id",
+            "fighter",
+            ["tier", sa.text("tier_elo DESC"), sa.text("id DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_fighter_elo_id",
+            "fighter",
+            [sa.text("elo DESC"), sa.text("id DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for index_name in ["ix_fighter_elo_id", "ix_fighter_tier_tier_elo_id"]:
+            op.drop_index(
+                index_name,
+                table_name="fighter",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
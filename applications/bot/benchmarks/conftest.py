@@ -0,0 +1,46 @@
+import logging
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from src.irc import TwitchBot
+
+CORPUS_PATH = Path(__file__).parent / "corpus" / "saltybet.txt"
+
+# Lines per second of every benchmark that ran, reported at the end of the session.
+lines_per_second: dict[str, float] = {}
+
+
+@pytest.fixture(scope="session")
+def corpus() -> list[str]:
+    return CORPUS_PATH.read_text(encoding="utf-8").splitlines()
+
+
+@pytest.fixture(scope="session")
+def twitch_bot() -> TwitchBot:
+    # Not connected, only the parsing methods are used.
+    return TwitchBot("benchmark", "oauth:benchmark", logging.getLogger("benchmark"))
+
+
+@pytest.fixture
+def record_lines_per_second(request, benchmark) -> Callable[[int], None]:
+    def record(lines: int) -> None:
+        # Benchmarks are disabled, eg. `--benchmark-disable`, nothing to report.
+        if benchmark.stats is None:
+            return
+
+        result = lines / benchmark.stats.stats.median
+        benchmark.extra_info["lines_per_second"] = round(result)
+        lines_per_second[request.node.name] = result
+
+    return record
+
+
+def pytest_terminal_summary(terminalreporter) -> None:
+    if not lines_per_second:
+        return
+
+    terminalreporter.section("lines per second")
+    for name, result in lines_per_second.items():
+        terminalreporter.write_line(f"{name:<45}{result:>15,.0f}")
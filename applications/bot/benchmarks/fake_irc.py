@@ -0,0 +1,351 @@
+"""
+A local stand-in for the Twitch IRC server.
+
+Speaks enough of the Twitch handshake for `TwitchBot` to connect, authenticate and join
+the channel, then replays recorded or synthetic chat at a set rate. It sends its own
+PINGs and can drop or stall connections after a number of lines, which reproduces the
+bot's reconnect paths on demand.
+
+Point a running bot at it with:
+    TWITCH_IRC_HOST=localhost TWITCH_IRC_PORT=6667 TWITCH_IRC_TLS=false
+
+Usage:
+    poetry run python -m benchmarks.fake_irc --port 6667 --rate 100 --loop
+    poetry run python -m benchmarks.fake_irc --synthetic-matches 1000 --rate 5000
+"""
+
+import asyncio
+import random
+import ssl
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Callable
+
+CORPUS_PATH = Path(__file__).parent / "corpus" / "saltybet.txt"
+
+WELCOME = ":tmi.twitch.tv 001 {nick} :Welcome, GLHF!"
+NAMES = ":{nick}.tmi.twitch.tv 353 {nick} = #saltybet :{nick}"
+NAMES_END = ":{nick}.tmi.twitch.tv 366 {nick} #saltybet :End of /NAMES list"
+PING = "PING :tmi.twitch.tv"
+PONG = "PONG :tmi.twitch.tv"
+
+WAIFU = ":waifu4u!waifu4u@waifu4u.tmi.twitch.tv PRIVMSG #saltybet :"
+VIEWER = ":{name}!{name}@{name}.tmi.twitch.tv PRIVMSG #saltybet :"
+VIEWER_MESSAGES = ["lol", "F", "!balance", "salt", "PogChamp", "red is dead", "gg"]
+
+# Lines are written in batches of this size when the rate is unlimited.
+BATCH_SIZE = 512
+# How often lines are written when the rate is limited, in seconds.
+TICK = 0.01
+
+
+def read_corpus(path: Path = CORPUS_PATH) -> list[str]:
+    return path.read_text(encoding="utf-8").splitlines()
+
+
+def synthetic_chat(
+    matches: int, chat_per_match: int = 20, fighters: int = 2_000, seed: int = 0
+) -> list[str]:
+    """
+    Generates the chat of `matches` matchmaking matches, each with `chat_per_match`
+    lines of viewer chat around the waifu4u messages.
+    """
+    rng = random.Random(seed)
+    names = [f"Synthetic Fighter {i}" for i in range(fighters)]
+    viewers = [f"viewer_{i}" for i in range(500)]
+
+    def chat(count: int) -> list[str]:
+        return [
+            VIEWER.format(name=rng.choice(viewers)) + rng.choice(VIEWER_MESSAGES)
+            for _ in range(count)
+        ]
+
+    lines: list[str] = []
+    for _ in range(matches):
+        red, blue = rng.sample(names, 2)
+        tier = rng.choice("XSABP")
+        winner, colour = rng.choice([(red, "Red"), (blue, "Blue")])
+        lines.append(
+            f"{WAIFU}Bets are OPEN for {red} vs {blue}! ({tier} Tier) (matchmaking) "
+            "www.saltybet.com"
+        )
+        lines.extend(chat(chat_per_match // 2))
+        lines.append(
+            f"{WAIFU}Bets are locked. "
+            f"{red} ({rng.randint(-5, 10)}) - ${rng.randint(1, 10_000_000):,}, "
+            f"{blue} ({rng.randint(-5, 10)}) - ${rng.randint(1, 10_000_000):,}"
+        )
+        lines.extend(chat(chat_per_match - chat_per_match // 2))
+        lines.append(
+            f"{WAIFU}{winner} wins! Payouts to Team {colour}. "
+            "99 more matches until the next tournament!"
+        )
+    return lines
+
+
+class FakeTwitchServer:
+    """
+    Replays `lines` to whoever connects, once the handshake is done.
+
+    The replay position is shared between connections, a client that reconnects picks
+    up after the last line that was written to it. Lines written to a connection that
+    dropped before the client read them are lost, as they would be with Twitch.
+
+    `rate` is in lines per second, `0` writes them as fast as the client reads.
+    `disconnect_after` closes each connection after that many lines, `stall_after`
+    stops writing and answering PINGs instead so only the client's keepalive notices.
+    `on_sent` is called with every replayed line right before it is written.
+    """
+
+    def __init__(
+        self,
+        lines: list[str],
+        host: str = "localhost",
+        port: int = 0,
+        rate: float = 0,
+        loop: bool = False,
+        ping_interval: float | None = 60,
+        disconnect_after: int | None = None,
+        stall_after: int | None = None,
+        ssl_context: ssl.SSLContext | None = None,
+        on_sent: Callable[[str], None] | None = None,
+    ) -> None:
+        self.lines = lines
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.loop = loop
+        self.ping_interval = ping_interval
+        self.disconnect_after = disconnect_after
+        self.stall_after = stall_after
+        self.ssl_context = ssl_context
+        self.on_sent = on_sent
+
+        self.position = 0
+        self.sent = 0
+        self.connections = 0
+        self.pongs = 0
+        self.finished = asyncio.Event()
+        self.server: asyncio.Server | None = None
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(
+            self._handle, self.host, self.port, ssl=self.ssl_context
+        )
+        # Port `0` picks a free port, expose the one actually bound.
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        tasks: list[asyncio.Task] = []
+        try:
+            await self._handshake(reader, writer)
+            self.connections += 1
+
+            stalled = asyncio.Event()
+            tasks.append(asyncio.create_task(self._read(reader, writer, stalled)))
+            if self.ping_interval:
+                tasks.append(asyncio.create_task(self._ping(writer, stalled)))
+            replay = asyncio.create_task(self._replay(writer, stalled))
+            tasks.append(replay)
+
+            # Whichever ends first ends the connection, the client going away or the
+            # replay being done with it.
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+            if stalled.is_set():
+                # Hold the connection open, silently, until the client gives up on it.
+                await tasks[0]
+        except (ConnectionError, ssl.SSLError, TimeoutError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _handshake(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        nick = ""
+        async with asyncio.timeout(10):
+            while True:
+                command, _, argument = (await self._readline(reader)).partition(" ")
+                if command == "NICK":
+                    nick = argument
+                    self._write(writer, [WELCOME.format(nick=nick)])
+                elif command == "JOIN" and nick:
+                    self._write(
+                        writer, [NAMES.format(nick=nick), NAMES_END.format(nick=nick)]
+                    )
+                    await writer.drain()
+                    return
+
+    async def _read(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        stalled: asyncio.Event,
+    ) -> None:
+        while True:
+            line = await self._readline(reader)
+            if line.startswith("PONG"):
+                self.pongs += 1
+            elif line.startswith("PING") and not stalled.is_set():
+                self._write(writer, [PONG])
+
+    async def _ping(self, writer: asyncio.StreamWriter, stalled: asyncio.Event) -> None:
+        assert self.ping_interval is not None
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            if not stalled.is_set():
+                self._write(writer, [PING])
+
+    async def _replay(
+        self, writer: asyncio.StreamWriter, stalled: asyncio.Event
+    ) -> None:
+        limit = self.disconnect_after or self.stall_after
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        sent = 0
+        while limit is None or sent < limit:
+            if self.rate:
+                await asyncio.sleep(TICK)
+                due = int((loop.time() - start) * self.rate) - sent
+            else:
+                due = BATCH_SIZE
+            if limit is not None:
+                due = min(due, limit - sent)
+
+            batch = self._next_lines(due)
+            if not batch:
+                if self.finished.is_set():
+                    # Keep the connection open, like Twitch would between matches.
+                    await asyncio.Future()
+                continue
+
+            if self.on_sent is not None:
+                for line in batch:
+                    self.on_sent(line)
+            self._write(writer, batch)
+            await writer.drain()
+            sent += len(batch)
+            self.sent += len(batch)
+
+        if self.stall_after is not None:
+            stalled.set()
+
+    def _next_lines(self, count: int) -> list[str]:
+        batch: list[str] = []
+        while len(batch) < count and self.lines and not self.finished.is_set():
+            lines = self.lines[self.position : self.position + count - len(batch)]
+            batch.extend(lines)
+            self.position += len(lines)
+            if self.position >= len(self.lines):
+                if self.loop:
+                    self.position = 0
+                else:
+                    self.finished.set()
+        return batch
+
+    @staticmethod
+    async def _readline(reader: asyncio.StreamReader) -> str:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Client disconnected")
+        return line.decode("utf-8", "replace").rstrip("\r\n")
+
+    @staticmethod
+    def _write(writer: asyncio.StreamWriter, lines: list[str]) -> None:
+        writer.write("".join(f"{line}\r\n" for line in lines).encode("utf-8"))
+
+
+def server_ssl_context(certfile: Path, keyfile: Path) -> ssl.SSLContext:
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+def add_server_arguments(arg_parser: ArgumentParser) -> None:
+    arg_parser.add_argument(
+        "--corpus", type=Path, default=CORPUS_PATH, help="Chat lines to replay."
+    )
+    arg_parser.add_argument(
+        "--synthetic-matches",
+        type=int,
+        help="Replay this many generated matches instead of the corpus.",
+    )
+    arg_parser.add_argument(
+        "--rate", type=float, default=0, help="Lines per second, 0 is unlimited."
+    )
+    arg_parser.add_argument(
+        "--ping-interval", type=float, default=60, help="Seconds between PINGs."
+    )
+    arg_parser.add_argument(
+        "--disconnect-after", type=int, help="Lines after which to drop a connection."
+    )
+    arg_parser.add_argument(
+        "--stall-after",
+        type=int,
+        help="Lines after which a connection goes silent, PINGs included.",
+    )
+    arg_parser.add_argument("--certfile", type=Path, help="Serve TLS with this cert.")
+    arg_parser.add_argument("--keyfile", type=Path, help="Key of --certfile.")
+
+
+def server_lines(arguments) -> list[str]:
+    if arguments.synthetic_matches:
+        return synthetic_chat(arguments.synthetic_matches)
+    return read_corpus(arguments.corpus)
+
+
+async def serve(arguments) -> None:
+    server = FakeTwitchServer(
+        server_lines(arguments),
+        host=arguments.host,
+        port=arguments.port,
+        rate=arguments.rate,
+        loop=arguments.loop,
+        ping_interval=arguments.ping_interval,
+        disconnect_after=arguments.disconnect_after,
+        stall_after=arguments.stall_after,
+        ssl_context=(
+            server_ssl_context(arguments.certfile, arguments.keyfile)
+            if arguments.certfile
+            else None
+        ),
+    )
+    await server.start()
+    print(f"Serving {len(server.lines):,} lines on {server.host}:{server.port}")
+    try:
+        await asyncio.Future()
+    finally:
+        await server.close()
+
+
+def main() -> None:
+    arg_parser = ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--host", default="localhost")
+    arg_parser.add_argument("--port", type=int, default=6667)
+    arg_parser.add_argument(
+        "--loop", action="store_true", help="Start over once every line was replayed."
+    )
+    add_server_arguments(arg_parser)
+    arguments = arg_parser.parse_args()
+
+    try:
+        asyncio.run(serve(arguments))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
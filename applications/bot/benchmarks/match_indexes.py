@@ -0,0 +1,190 @@
+"""
+Benchmarks the match filtering indexes on a large seeded table.
+
+Seeds a throw away `benchmark` schema with a copy of the `match` table, times the query
+shapes used by the web service without any indexes, then again with the indexes
+created by the `5d1f3a9c7e42` migration. The schema is dropped afterwards, existing
+data is never touched.
+
+Usage:
+    poetry run python -m benchmarks.match_indexes --matches 5000000
+"""
+
+import os
+import random
+import statistics
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import psycopg2
+from dotenv import load_dotenv
+
+SCHEMA = "benchmark"
+
+# Mirrors the indexes of the `5d1f3a9c7e42` migration.
+INDEXES = [
+    "CREATE INDEX ON {schema}.match (fighter_red, id)",
+    "CREATE INDEX ON {schema}.match (fighter_blue, id)",
+    "CREATE INDEX ON {schema}.match (winner)",
+    "CREATE INDEX ON {schema}.match (tier, match_format)",
+    "CREATE INDEX ON {schema}.match (date)",
+]
+
+QUERIES = {
+    "fighter red or blue": (
+        "SELECT * FROM {schema}.match "
+        "WHERE fighter_red = %(fighter)s OR fighter_blue = %(fighter)s"
+    ),
+    "fighter recent matches": (
+        "SELECT * FROM {schema}.match "
+        "WHERE fighter_red = %(fighter)s OR fighter_blue = %(fighter)s "
+        "ORDER BY id DESC LIMIT 10"
+    ),
+    "fighter red page": (
+        "SELECT * FROM {schema}.match WHERE fighter_red = %(fighter)s "
+        "ORDER BY id ASC OFFSET 0 LIMIT 100"
+    ),
+    "winner count": "SELECT COUNT(*) FROM {schema}.match WHERE winner = %(fighter)s",
+    "tier and format page": (
+        "SELECT * FROM {schema}.match "
+        "WHERE tier = %(tier)s AND match_format = 'tournament' "
+        "ORDER BY id ASC OFFSET 0 LIMIT 100"
+    ),
+    "single day": (
+        "SELECT * FROM {schema}.match WHERE date >= %(day)s "
+        "AND date < %(day)s + interval '1 day'"
+    ),
+}
+
+
+def seed(cursor, matches: int, fighters: int) -> None:
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(
+        f"CREATE TABLE {SCHEMA}.match (LIKE public.match INCLUDING DEFAULTS)"
+    )
+    cursor.execute(f"ALTER TABLE {SCHEMA}.match ADD PRIMARY KEY (id)")
+    # Tournament matches are rare compared to matchmaking, and there are roughly 10
+    # matches per hour.
+    cursor.execute(
+        f"""
+        INSERT INTO {SCHEMA}.match
+            (
+                id,
+                date,
+                fighter_red,
+                fighter_blue,
+                winner,
+                bet_red,
+                bet_blue,
+                tier,
+                match_format,
+                colour,
+                streak_red,
+                streak_blue
+            )
+        SELECT
+            s.id,
+            now() - (s.id * interval '6 minutes'),
+            s.red,
+            s.blue,
+            CASE WHEN s.red_won THEN s.red ELSE s.blue END,
+            (random() * 1000000)::int,
+            (random() * 1000000)::int,
+            (ARRAY['X', 'S', 'A', 'B', 'P'])[1 + s.id %% 5],
+            CASE WHEN random() < 0.1 THEN 'tournament' ELSE 'matchmaking' END,
+            CASE WHEN s.red_won THEN 'Red' ELSE 'Blue' END,
+            (random() * 20)::int - 10,
+            (random() * 20)::int - 10
+        FROM (
+            SELECT
+                id,
+                red,
+                1 + (red + (random() * (%(fighters)s - 2))::int) %% %(fighters)s
+                    AS blue,
+                random() < 0.5 AS red_won
+            FROM (
+                SELECT id, 1 + (random() * (%(fighters)s - 1))::int AS red
+                FROM generate_series(1, %(matches)s) AS id
+            ) AS r
+        ) AS s
+        """,
+        {"matches": matches, "fighters": fighters},
+    )
+    cursor.execute(f"ANALYZE {SCHEMA}.match")
+
+
+def run_queries(cursor, fighters: int, repeat: int) -> dict[str, float]:
+    cursor.execute(f"SELECT MIN(date)::date, MAX(date)::date FROM {SCHEMA}.match")
+    first_day, last_day = cursor.fetchone()
+
+    timings: dict[str, float] = {}
+    for name, query in QUERIES.items():
+        samples = []
+        for _ in range(repeat):
+            params = {
+                "fighter": random.randint(1, fighters),
+                "tier": random.choice("XSABP"),
+                "day": first_day + (last_day - first_day) * random.random(),
+            }
+            start = time.perf_counter()
+            cursor.execute(query.format(schema=SCHEMA), params)
+            cursor.fetchall()
+            samples.append(time.perf_counter() - start)
+        timings[name] = statistics.median(samples) * 1000
+    return timings
+
+
+def main() -> None:
+    arg_parser = ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--matches", type=int, default=5_000_000)
+    arg_parser.add_argument("--fighters", type=int, default=15_000)
+    arg_parser.add_argument(
+        "--repeat", type=int, default=20, help="Runs per query, the median is reported."
+    )
+    arguments = arg_parser.parse_args()
+
+    if os.environ.get("PRODUCTION") is None:
+        load_dotenv(Path(__file__).parent.parent.parent.parent / ".env")
+
+    connection = psycopg2.connect(
+        dbname=os.environ["POSTGRES_DB"],
+        user=os.environ["POSTGRES_USER"],
+        password=os.environ["POSTGRES_PASSWORD"],
+        host=os.environ["POSTGRES_HOST"],
+        port=int(os.environ["POSTGRES_PORT"]),
+    )
+    connection.autocommit = True
+    cursor = connection.cursor()
+
+    try:
+        print(f"Seeding {arguments.matches:,} matches...")
+        start = time.perf_counter()
+        seed(cursor, arguments.matches, arguments.fighters)
+        print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+        without_indexes = run_queries(cursor, arguments.fighters, arguments.repeat)
+
+        print("Creating indexes...")
+        start = time.perf_counter()
+        for index in INDEXES:
+            cursor.execute(index.format(schema=SCHEMA))
+        cursor.execute(f"ANALYZE {SCHEMA}.match")
+        print(f"Indexes created in {time.perf_counter() - start:.1f}s")
+
+        with_indexes = run_queries(cursor, arguments.fighters, arguments.repeat)
+    finally:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        connection.close()
+
+    print()
+    print(f"{'Query':<25}{'No indexes (ms)':>18}{'Indexes (ms)':>16}{'Speedup':>10}")
+    for name in QUERIES:
+        before = without_indexes[name]
+        after = with_indexes[name]
+        print(f"{name:<25}{before:>18.2f}{after:>16.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
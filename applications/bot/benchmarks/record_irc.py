@@ -0,0 +1,80 @@
+"""
+Records the Salty Bet chat from Twitch into a file `fake_irc` and `soak` can replay.
+
+Logs in anonymously, no Twitch account is needed. Only the chat lines of the channel
+are kept, one raw IRC line per line, in the same format as `corpus/saltybet.txt`.
+
+Usage:
+    poetry run python -m benchmarks.record_irc --output chat.txt --duration 3600
+"""
+
+import asyncio
+import random
+import ssl
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from src.irc import TwitchBot
+
+CHAT = "PRIVMSG #saltybet :"
+
+
+async def record(output: Path, duration: float | None) -> int:
+    context = ssl.create_default_context()
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    reader, writer = await asyncio.open_connection(
+        TwitchBot.HOST, TwitchBot.PORT, ssl=context
+    )
+    # Twitch lets any `justinfan` nickname read chat without authenticating.
+    writer.write(f"NICK justinfan{random.randint(10_000, 99_999)}\r\n".encode())
+    writer.write(b"JOIN #saltybet\r\n")
+
+    recorded = 0
+    deadline = time.monotonic() + duration if duration else None
+    with output.open("a", encoding="utf-8") as output_file:
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                try:
+                    async with asyncio.timeout(
+                        deadline - time.monotonic() if deadline else None
+                    ):
+                        raw_line = await reader.readline()
+                except TimeoutError:
+                    break
+                if not raw_line:
+                    print("Disconnected by Twitch.")
+                    break
+
+                line = raw_line.decode("utf-8", "replace").rstrip("\r\n")
+                if line.startswith("PING"):
+                    writer.write(b"PONG :tmi.twitch.tv\r\n")
+                elif CHAT in line:
+                    output_file.write(f"{line}\n")
+                    recorded += 1
+                    if recorded % 1000 == 0:
+                        print(f"Recorded {recorded:,} lines")
+        finally:
+            writer.close()
+    return recorded
+
+
+def main() -> None:
+    arg_parser = ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--output", type=Path, required=True, help="Appended to when it exists."
+    )
+    arg_parser.add_argument(
+        "--duration", type=float, help="Seconds to record for, forever by default."
+    )
+    arguments = arg_parser.parse_args()
+
+    try:
+        recorded = asyncio.run(record(arguments.output, arguments.duration))
+    except KeyboardInterrupt:
+        return
+    print(f"Recorded {recorded:,} lines to {arguments.output}")
+
+
+if __name__ == "__main__":
+    main()
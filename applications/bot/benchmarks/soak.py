@@ -0,0 +1,362 @@
+"""
+Soak tests the bot against `fake_irc`, from reading IRC to committing matches.
+
+Runs the fake server on its own thread and the bot pipeline the way the bot process
+does, `TwitchBot.listen` into `handle_message` into a `DatabaseWriter` in front of
+`Database`. Writes go to a throw away `soak` schema which is dropped afterwards,
+existing data is never touched. Notifications still go out on the events channel.
+
+Reports the lines per second read from IRC, the latency from the server writing a
+winner line to its match being committed, and how often the bot reconnected.
+
+Usage:
+    poetry run python -m benchmarks.soak --synthetic-matches 10000
+    poetry run python -m benchmarks.soak --rate 5000 --loop --duration 600
+    poetry run python -m benchmarks.soak --disconnect-after 5000
+    poetry run python -m benchmarks.soak --stall-after 5000 --client-ping-interval 2
+"""
+
+import asyncio
+import logging
+import os
+import ssl
+import statistics
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import psycopg2
+from dotenv import load_dotenv
+
+from benchmarks.fake_irc import (
+    FakeTwitchServer,
+    add_server_arguments,
+    server_lines,
+    server_ssl_context,
+)
+from src.database import Database
+from src.irc import TwitchBot
+from src.objects import (
+    Match,
+    MatchFormat,
+    OpenBetExhibitionMessage,
+    OpenBetMessage,
+    WinMessage,
+)
+from src.run import handle_message
+from src.writer import DatabaseWriter
+
+SCHEMA = "soak"
+# Every table the bot writes to, bar the heartbeat which the soak test never touches.
+TABLES = ["fighter", "match", "match_rating", "fighter_stats", "current_match"]
+# Ingestion is considered over once the server is done and the bot read nothing for
+# this long, in seconds.
+IDLE_TIMEOUT = 2
+
+
+class MatchLatency:
+    """
+    Pairs the winner lines written by the server with the matches being committed.
+
+    `on_sent` is called from the server thread, `on_recorded` from the database writer
+    thread.
+    """
+
+    def __init__(self, parser: TwitchBot) -> None:
+        self.parser = parser
+        self.current: tuple[str, str] | None = None
+        self.sent_at: dict[tuple[str, str], deque[float]] = {}
+        self.latencies: list[float] = []
+        self.lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        with self.lock:
+            return sum(len(sent_at) for sent_at in self.sent_at.values())
+
+    def on_sent(self, line: str) -> None:
+        if not line.startswith(TwitchBot.WAIFU_PREFIX):
+            return
+
+        message = self.parser.parse_line(line)
+        if isinstance(message, OpenBetMessage):
+            self.current = None
+            if message.match_format != MatchFormat.EXHIBITION:
+                self.current = (message.fighter_red_name, message.fighter_blue_name)
+        elif isinstance(message, OpenBetExhibitionMessage):
+            self.current = None
+        elif isinstance(message, WinMessage) and self.current is not None:
+            with self.lock:
+                self.sent_at.setdefault(self.current, deque()).append(
+                    time.perf_counter()
+                )
+            self.current = None
+
+    def on_recorded(self, match: Match) -> None:
+        now = time.perf_counter()
+        with self.lock:
+            sent_at = self.sent_at.get(
+                (match.fighter_red_name, match.fighter_blue_name)
+            )
+            if sent_at:
+                self.latencies.append(now - sent_at.popleft())
+
+
+class SoakDatabase(Database):
+    """
+    Writes to the `soak` schema and times every match it records.
+    """
+
+    def __init__(self, match_latency: MatchLatency, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.match_latency = match_latency
+        self.connection_kwargs["options"] = f"-c search_path={SCHEMA}"
+        self.reconnect()
+
+    def record_match(
+        self, match: Match, now: datetime | None = None, write_key: str | None = None
+    ) -> None:
+        super().record_match(match, now, write_key)
+        self.match_latency.on_recorded(match)
+
+
+class SoakTwitchBot(TwitchBot):
+    """
+    Counts the lines read from the server, bar PINGs and PONGs.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.lines_read = 0
+        self.first_read_at: float | None = None
+        self.last_read_at = 0.0
+
+    async def _receive(self) -> str:
+        message = await super()._receive()
+        if message.startswith(("PING", "PONG")):
+            return message
+        self.last_read_at = time.perf_counter()
+        if self.first_read_at is None:
+            self.first_read_at = self.last_read_at
+        self.lines_read += 1
+        return message
+
+
+def create_schema(cursor) -> None:
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in TABLES:
+        # Defaults are left out, they would draw ids from the sequences of `public`.
+        cursor.execute(
+            f"CREATE TABLE {SCHEMA}.{table} "
+            f"(LIKE public.{table} INCLUDING ALL EXCLUDING DEFAULTS)"
+        )
+    for table in ["fighter", "match"]:
+        cursor.execute(
+            f"ALTER TABLE {SCHEMA}.{table} "
+            "ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY"
+        )
+
+
+def run_server(
+    server: FakeTwitchServer, ready: threading.Event, stop: threading.Event
+) -> None:
+    async def serve() -> None:
+        await server.start()
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+        await server.close()
+
+    asyncio.run(serve())
+
+
+async def ingest(
+    irc_bot: SoakTwitchBot,
+    server: FakeTwitchServer,
+    database_writer: DatabaseWriter,
+    logger: logging.Logger,
+    duration: float | None,
+) -> None:
+    async def listen() -> None:
+        current_match: Match | None = None
+        async for message in irc_bot.listen():
+            current_match = handle_message(
+                message, current_match, database_writer, logger
+            )
+
+    listener = asyncio.create_task(listen())
+    start = time.perf_counter()
+    while not listener.done():
+        await asyncio.sleep(0.1)
+        now = time.perf_counter()
+        if duration is not None and now - start > duration:
+            break
+        if server.finished.is_set() and now - irc_bot.last_read_at > IDLE_TIMEOUT:
+            break
+    listener.cancel()
+    try:
+        # Surfaces whatever made the bot stop listening early, if anything did.
+        await listener
+    except asyncio.CancelledError:
+        pass
+    irc_bot.close()
+
+
+def wait_for_writes(
+    database_writer: DatabaseWriter, match_latency: MatchLatency
+) -> None:
+    # Matches whose winner line was lost to a disconnect are never committed, give up
+    # once nothing has been committed for a while.
+    committed = len(match_latency.latencies)
+    deadline = time.monotonic() + IDLE_TIMEOUT
+    while time.monotonic() < deadline:
+        if database_writer.queue.empty() and match_latency.pending == 0:
+            return
+        time.sleep(0.1)
+        if len(match_latency.latencies) != committed:
+            committed = len(match_latency.latencies)
+            deadline = time.monotonic() + IDLE_TIMEOUT
+
+
+def report(
+    server: FakeTwitchServer,
+    irc_bot: SoakTwitchBot,
+    match_latency: MatchLatency,
+    matches_in_database: int,
+) -> None:
+    elapsed = irc_bot.last_read_at - (irc_bot.first_read_at or irc_bot.last_read_at)
+    latencies = sorted(latency * 1000 for latency in match_latency.latencies)
+
+    print()
+    print(f"{'Lines sent':<25}{server.sent:>15,}")
+    print(f"{'Lines read':<25}{irc_bot.lines_read:>15,}")
+    print(f"{'Seconds':<25}{elapsed:>15.2f}")
+    if elapsed:
+        print(f"{'Lines per second':<25}{irc_bot.lines_read / elapsed:>15,.0f}")
+    print(f"{'Matches committed':<25}{len(latencies):>15,}")
+    print(f"{'Matches in database':<25}{matches_in_database:>15,}")
+    print(f"{'Reconnects':<25}{max(server.connections - 1, 0):>15,}")
+    print(f"{'PONGs to server PINGs':<25}{server.pongs:>15,}")
+    if len(latencies) >= 2:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print()
+        print("Winner line to match committed (ms)")
+        for name, value in [
+            ("p50", quantiles[49]),
+            ("p95", quantiles[94]),
+            ("p99", quantiles[98]),
+            ("max", latencies[-1]),
+        ]:
+            print(f"{name:<25}{value:>15.2f}")
+
+
+def main() -> None:
+    arg_parser = ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--loop", action="store_true", help="Replay the lines until --duration."
+    )
+    arg_parser.add_argument("--duration", type=float, help="Seconds to soak for.")
+    arg_parser.add_argument(
+        "--client-ping-interval",
+        type=float,
+        help="Overrides how long the bot waits on a silent server before a PING.",
+    )
+    arg_parser.add_argument("--log-level", default="WARNING")
+    add_server_arguments(arg_parser)
+    arguments = arg_parser.parse_args()
+    if arguments.loop and arguments.duration is None:
+        arg_parser.error("--loop needs a --duration")
+
+    if os.environ.get("PRODUCTION") is None:
+        load_dotenv(Path(__file__).parent.parent.parent.parent / ".env")
+
+    logging.basicConfig(level=arguments.log_level)
+    logger = logging.getLogger("soak")
+
+    match_latency = MatchLatency(TwitchBot("soak", "oauth:soak", logger))
+    server = FakeTwitchServer(
+        server_lines(arguments),
+        rate=arguments.rate,
+        loop=arguments.loop,
+        ping_interval=arguments.ping_interval,
+        disconnect_after=arguments.disconnect_after,
+        stall_after=arguments.stall_after,
+        ssl_context=(
+            server_ssl_context(arguments.certfile, arguments.keyfile)
+            if arguments.certfile
+            else None
+        ),
+        on_sent=match_latency.on_sent,
+    )
+
+    database = SoakDatabase(
+        match_latency,
+        dbname=os.environ["POSTGRES_DB"],
+        user=os.environ["POSTGRES_USER"],
+        password=os.environ["POSTGRES_PASSWORD"],
+        host=os.environ["POSTGRES_HOST"],
+        port=int(os.environ["POSTGRES_PORT"]),
+        logger=logger,
+    )
+    with database.connection, database.connection.cursor() as cursor:
+        create_schema(cursor)
+
+    ready = threading.Event()
+    stop = threading.Event()
+    server_thread = threading.Thread(
+        target=run_server, args=(server, ready, stop), daemon=True
+    )
+    server_thread.start()
+    ready.wait()
+
+    irc_bot = SoakTwitchBot(
+        "justinfan_soak",
+        "oauth:soak",
+        logger,
+        host=server.host,
+        port=server.port,
+        use_tls=arguments.certfile is not None,
+        ssl_context=(
+            ssl.create_default_context(cafile=arguments.certfile)
+            if arguments.certfile
+            else None
+        ),
+    )
+    if arguments.client_ping_interval:
+        irc_bot.PING_INTERVAL = arguments.client_ping_interval
+        irc_bot.PONG_TIMEOUT = arguments.client_ping_interval / 2
+
+    with tempfile.TemporaryDirectory() as spill_directory:
+        database_writer = DatabaseWriter(
+            database, Path(spill_directory) / "pending_writes.jsonl", logger
+        )
+        database_writer.start()
+        try:
+            print(f"Replaying {len(server.lines):,} lines...")
+            asyncio.run(
+                ingest(irc_bot, server, database_writer, logger, arguments.duration)
+            )
+            wait_for_writes(database_writer, match_latency)
+        finally:
+            stop.set()
+            server_thread.join()
+
+    # The writer thread may still hold the connection, use a fresh one.
+    connection = psycopg2.connect(**database.connection_kwargs)
+    with connection, connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {SCHEMA}.match")
+        (matches_in_database,) = cursor.fetchone()
+        cursor.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    connection.close()
+
+    report(server, irc_bot, match_latency, matches_in_database)
+
+
+if __name__ == "__main__":
+    main()
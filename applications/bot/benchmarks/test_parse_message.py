@@ -0,0 +1,101 @@
+"""
+Benchmarks parsing chat lines read from IRC into waifu4u messages.
+
+The corpus follows the shape of the Salty Bet chat, mostly viewers chatting with the
+waifu4u betting messages in between. Every line goes through the same path it would
+in `TwitchBot.listen`.
+
+Usage:
+    poetry run pytest benchmarks/
+"""
+
+import pytest
+
+from src.irc import ReturnMessages, TwitchBot
+from src.objects import (
+    LockedBetMessage,
+    MatchFormat,
+    OpenBetExhibitionMessage,
+    OpenBetMessage,
+    WinMessage,
+)
+
+
+def previous_parse_line(twitch_bot: TwitchBot, line: str) -> ReturnMessages | None:
+    """
+    The parser as it was before dispatching on the message prefix, kept to check that
+    both give the same output and to compare their speed.
+    """
+    if not line.startswith(":waifu4u"):
+        return None
+
+    try:
+        message = line.split("#saltybet :")[1]
+    except IndexError:
+        # Used to be logged as an error by `listen`.
+        return None
+
+    twitch_bot.logger.debug(message)
+    waifu_message: ReturnMessages | None = None
+    if match := twitch_bot.OPEN_BET_RE.match(message):
+        if "(matchmaking)" in message:
+            match_format = MatchFormat.MATCHMAKING
+        elif "tournament bracket" in message:
+            match_format = MatchFormat.TOURNAMENT
+        else:
+            match_format = MatchFormat.EXHIBITION
+
+        waifu_message = OpenBetMessage(
+            fighter_red_name=match.group(1),
+            fighter_blue_name=match.group(2),
+            tier=match.group(3),
+            match_format=match_format,
+        )
+    elif match := twitch_bot.LOCKED_BET_RE.match(message):
+        waifu_message = LockedBetMessage(
+            fighter_red_name=match.group(1),
+            streak_red=int(match.group(2)),
+            bet_red=int(match.group(3).replace(",", "")),
+            fighter_blue_name=match.group(5),
+            streak_blue=int(match.group(6)),
+            bet_blue=int(match.group(7).replace(",", "")),
+        )
+    elif match := twitch_bot.WINNER_RE.match(message):
+        waifu_message = WinMessage(winner_name=match.group(1), colour=match.group(2))
+    elif match := twitch_bot.OPEN_BET_EXHIBITION_RE.match(message):
+        waifu_message = OpenBetExhibitionMessage(
+            fighter_red_name=match.group(1), fighter_blue_name=match.group(2)
+        )
+
+    return waifu_message
+
+
+def test_parse_line_matches_previous_parser(twitch_bot, corpus):
+    parsed = 0
+    for line in corpus:
+        expected = previous_parse_line(twitch_bot, line)
+        assert twitch_bot.parse_line(line) == expected, line
+        parsed += expected is not None
+
+    # Sanity check the corpus actually has waifu4u messages in it.
+    assert parsed > 0
+
+
+@pytest.fixture(params=["all", "waifu4u"])
+def lines(request, corpus) -> list[str]:
+    # `waifu4u` only keeps the betting messages, the lines that actually get parsed.
+    if request.param == "waifu4u":
+        return [line for line in corpus if line.startswith(":waifu4u")]
+    return corpus
+
+
+@pytest.mark.benchmark(group="parse_line")
+def test_parse_line(benchmark, twitch_bot, lines, record_lines_per_second):
+    benchmark(lambda: [twitch_bot.parse_line(line) for line in lines])
+    record_lines_per_second(len(lines))
+
+
+@pytest.mark.benchmark(group="parse_line")
+def test_previous_parse_line(benchmark, twitch_bot, lines, record_lines_per_second):
+    benchmark(lambda: [previous_parse_line(twitch_bot, line) for line in lines])
+    record_lines_per_second(len(lines))
@@ -1,15 +1,49 @@
+import json
 import logging
 import math
 from datetime import datetime, timezone
+from typing import Any
 
 import psycopg2
 import psycopg2.extras
 
+from src.fighter_cache import CachedFighter, FighterCache
 from src.objects import Match, MatchFormat
 
 
 class Database:
     ACCEPTED_MATCH_FORMATS = [MatchFormat.MATCHMAKING, MatchFormat.TOURNAMENT]
+    # Channel used to push match events to listeners, namely the web service.
+    EVENTS_CHANNEL = "saltyboy_events"
+    DEFAULT_ELO = 1500
+    ELO_K_FACTOR = 32
+    # Comfortably more than the number of fighters on Salty Bet.
+    DEFAULT_FIGHTER_CACHE_SIZE = 25_000
+    # Advisory lock held, shared, by every connection caching fighters. Anything that
+    # rewrites fighters behind the cache's back, eg. `src.ratings`, takes it exclusively
+    # and so can't run while the bot does.
+    FIGHTER_CACHE_LOCK = 5_741_209
+    FIGHTER_UPDATE_COLUMNS = (
+        "id",
+        "last_updated",
+        "best_streak",
+        "tier",
+        "prev_tier",
+        "tier_elo",
+        "elo",
+    )
+    FIGHTER_STATS_COLUMNS = (
+        "fighter_id",
+        "tier",
+        "matches",
+        "wins",
+        "bet_on",
+        "bet_against",
+        "bet_share_sum",
+        "bet_share_matches",
+        "odds_sum",
+        "odds_matches",
+    )
 
     def __init__(
         self,
@@ -19,18 +53,45 @@ class Database:
         host: str,
         port: int,
         logger: logging.Logger,
+        fighter_cache_size: int = DEFAULT_FIGHTER_CACHE_SIZE,
     ) -> None:
         self.logger = logger
+        self.fighter_cache = FighterCache(fighter_cache_size)
+        self.connection_kwargs: dict[str, Any] = {
+            "dbname": dbname,
+            "user": user,
+            "password": password,
+            "host": host,
+            "port": port,
+        }
+        self.connection = psycopg2.connect(
+            **self.connection_kwargs,
+            cursor_factory=psycopg2.extras.DictCursor,
+        )
+        self.caches_fighters = False
+
+    def reconnect(self) -> None:
+        if not self.connection.closed:
+            self.connection.close()
+
+        # A write may have been committed even though it raised, the cached fighters
+        # can no longer be trusted.
+        self.fighter_cache.clear()
         self.connection = psycopg2.connect(
-            dbname=dbname,
-            user=user,
-            password=password,
-            host=host,
-            port=port,
+            **self.connection_kwargs,
             cursor_factory=psycopg2.extras.DictCursor,
         )
+        if self.caches_fighters:
+            self._lock_fighter_cache()
 
-    def record_match(self, match: Match) -> None:
+    def record_match(  # pylint: disable=too-many-locals
+        self, match: Match, now: datetime | None = None, write_key: str | None = None
+    ) -> None:
+        """
+        `write_key` identifies this write of the match, a UUID. A match whose key was
+        already recorded is skipped, so a write retried after its commit went through
+        but was never acknowledged is only recorded once.
+        """
         if match.match_format not in self.ACCEPTED_MATCH_FORMATS:
             self.logger.info(
                 "Ignoring match since its match_format %s is not in %s",
@@ -45,117 +106,288 @@ class Database:
             )
             return
 
-        fighter_red = self._get_or_create_fighter(
-            match.fighter_red_name, match.tier, match.streak_red
-        )
-        fighter_blue = self._get_or_create_fighter(
-            match.fighter_blue_name, match.tier, match.streak_blue
-        )
-
         if match.bet_blue is None or match.bet_red is None or match.winner is None:
             self.logger.error("Blue bet, red bet or winner was not set: %s", match)
             return
 
-        winner: int | None = None
-        if fighter_red["name"] == match.winner:
-            winner = fighter_red["id"]
-        elif fighter_blue["name"] == match.winner:
-            winner = fighter_blue["id"]
-        else:
+        if match.winner not in [match.fighter_red_name, match.fighter_blue_name]:
             self.logger.error(
-                "Accuracy error. Winner not found in either fighter objects: %s, "
-                "fighter_red: %s, fighter_blue: %s",
-                match,
+                "Accuracy error. Winner not found in either fighter: %s", match
+            )
+            return
+
+        # The fighters, the match, its ratings, the updated ratings and stats are all
+        # written in a single transaction. Either everything is recorded or nothing is.
+        now = now or datetime.now(timezone.utc)
+        with self.connection, self.connection.cursor() as cursor:
+            fighters = self._get_or_create_fighters(
+                cursor,
+                match.tier,
+                now,
+                [
+                    (match.fighter_red_name, match.streak_red),
+                    (match.fighter_blue_name, match.streak_blue),
+                ],
+            )
+            fighter_red = fighters[match.fighter_red_name]
+            fighter_blue = fighters[match.fighter_blue_name]
+
+            red_won = fighter_red.name == match.winner
+
+            fighter_red_update = self._get_updated_fighter(
                 fighter_red,
+                match.tier,
+                match.streak_red,
+                fighter_blue.elo,
+                fighter_blue.tier_elo,
+                red_won,
+                now,
+            )
+            fighter_blue_update = self._get_updated_fighter(
                 fighter_blue,
+                match.tier,
+                match.streak_blue,
+                fighter_red.elo,
+                fighter_red.tier_elo,
+                not red_won,
+                now,
+            )
+            # Keyed by ID should the same fighter somehow be on both sides.
+            fighter_updates = {
+                fighter_red.id: fighter_red_update,
+                fighter_blue.id: fighter_blue_update,
+            }
+
+            insert_obj = {
+                "date": now,
+                "fighter_red": fighter_red.id,
+                "fighter_blue": fighter_blue.id,
+                "winner": fighter_red.id if red_won else fighter_blue.id,
+                "bet_red": match.bet_red,
+                "bet_blue": match.bet_blue,
+                "streak_red": match.streak_red,
+                "streak_blue": match.streak_blue,
+                "tier": match.tier,
+                "match_format": match.match_format.value,
+                "colour": match.colour,
+                "write_key": write_key,
+                "elo_before_red": fighter_red.elo,
+                "elo_after_red": fighter_red_update["elo"],
+                "tier_elo_before_red": fighter_red.tier_elo,
+                "tier_elo_after_red": fighter_red_update["tier_elo"],
+                "elo_before_blue": fighter_blue.elo,
+                "elo_after_blue": fighter_blue_update["elo"],
+                "tier_elo_before_blue": fighter_blue.tier_elo,
+                "tier_elo_after_blue": fighter_blue_update["tier_elo"],
+                "channel": self.EVENTS_CHANNEL,
+                "winner_event": json.dumps(
+                    {
+                        "event": "winner",
+                        "fighter_red": match.fighter_red_name,
+                        "fighter_blue": match.fighter_blue_name,
+                        "winner": match.winner,
+                        "colour": match.colour,
+                    }
+                ),
+            }
+
+            # Tuples are adapted by psycopg2 into a row, eg. `(1, 'A', ...)`.
+            update_rows = {
+                f"fighter_update_{i}": tuple(
+                    fighter_update[column] for column in self.FIGHTER_UPDATE_COLUMNS
+                )
+                for i, fighter_update in enumerate(fighter_updates.values())
+            }
+            stats_rows = self._get_fighter_stats_rows(
+                match, fighter_red.id, fighter_blue.id, red_won
+            )
+            cursor.execute(
+                f"""
+                WITH new_match AS (
+                    INSERT INTO match
+                        (
+                            date,
+                            fighter_red,
+                            fighter_blue,
+                            winner,
+                            bet_red,
+                            bet_blue,
+                            streak_red,
+                            streak_blue,
+                            tier,
+                            match_format,
+                            colour,
+                            write_key
+                        )
+                    VALUES
+                        (
+                            %(date)s,
+                            %(fighter_red)s,
+                            %(fighter_blue)s,
+                            %(winner)s,
+                            %(bet_red)s,
+                            %(bet_blue)s,
+                            %(streak_red)s,
+                            %(streak_blue)s,
+                            %(tier)s,
+                            %(match_format)s,
+                            %(colour)s,
+                            %(write_key)s
+                        )
+                    ON CONFLICT (write_key) DO NOTHING
+                    RETURNING
+                        id
+                ), new_match_rating AS (
+                    INSERT INTO match_rating
+                        (
+                            match_id,
+                            elo_before_red,
+                            elo_after_red,
+                            tier_elo_before_red,
+                            tier_elo_after_red,
+                            elo_before_blue,
+                            elo_after_blue,
+                            tier_elo_before_blue,
+                            tier_elo_after_blue
+                        )
+                    SELECT
+                        id,
+                        %(elo_before_red)s,
+                        %(elo_after_red)s,
+                        %(tier_elo_before_red)s,
+                        %(tier_elo_after_red)s,
+                        %(elo_before_blue)s,
+                        %(elo_after_blue)s,
+                        %(tier_elo_before_blue)s,
+                        %(tier_elo_after_blue)s
+                    FROM
+                        new_match
+                ), updated_fighter AS (
+                    UPDATE
+                        fighter
+                    SET
+                        last_updated = u.last_updated,
+                        best_streak = u.best_streak,
+                        tier = u.tier,
+                        prev_tier = u.prev_tier,
+                        tier_elo = u.tier_elo,
+                        elo = u.elo
+                    FROM
+                        (VALUES {", ".join(f"%({key})s" for key in update_rows)})
+                            AS u({", ".join(self.FIGHTER_UPDATE_COLUMNS)})
+                    WHERE
+                        fighter.id = u.id
+                        AND EXISTS (SELECT FROM new_match)
+                ), updated_fighter_stats AS (
+                    INSERT INTO fighter_stats
+                        ({", ".join(self.FIGHTER_STATS_COLUMNS)})
+                    SELECT
+                        *
+                    FROM
+                        (VALUES {", ".join(f"%({key})s" for key in stats_rows)})
+                            AS s({", ".join(self.FIGHTER_STATS_COLUMNS)})
+                    WHERE
+                        EXISTS (SELECT FROM new_match)
+                    ON CONFLICT (fighter_id, tier) DO UPDATE SET
+                        matches = fighter_stats.matches + EXCLUDED.matches,
+                        wins = fighter_stats.wins + EXCLUDED.wins,
+                        bet_on = fighter_stats.bet_on + EXCLUDED.bet_on,
+                        bet_against = fighter_stats.bet_against + EXCLUDED.bet_against,
+                        bet_share_sum
+                            = fighter_stats.bet_share_sum + EXCLUDED.bet_share_sum,
+                        bet_share_matches
+                            = fighter_stats.bet_share_matches
+                            + EXCLUDED.bet_share_matches,
+                        odds_sum = fighter_stats.odds_sum + EXCLUDED.odds_sum,
+                        odds_matches = fighter_stats.odds_matches + EXCLUDED.odds_matches
+                )
+                SELECT
+                    id,
+                    pg_notify(
+                        %(channel)s,
+                        (
+                            %(winner_event)s::jsonb
+                            || jsonb_build_object('match_id', id)
+                        )::text
+                    )
+                FROM
+                    new_match
+                """,
+                {**insert_obj, **update_rows, **stats_rows},
             )
+            recorded = cursor.fetchone() is not None
+
+        if not recorded:
+            self.logger.info("Match was already recorded. Skipping it: %s", match)
             return
 
-        insert_obj = {
-            "date": datetime.now(timezone.utc),
-            "fighter_red": fighter_red["id"],
-            "fighter_blue": fighter_blue["id"],
-            "winner": winner,
-            "bet_red": match.bet_red,
-            "bet_blue": match.bet_blue,
-            "streak_red": match.streak_red,
-            "streak_blue": match.streak_blue,
-            "tier": match.tier,
-            "match_format": match.match_format.value,
-            "colour": match.colour,
-        }
+        # Only written through once the transaction has committed, should it fail the
+        # cache still matches what is in the database.
+        for fighter in [fighter_red, fighter_blue]:
+            fighter_update = fighter_updates[fighter.id]
+            self.fighter_cache.set(
+                CachedFighter(
+                    id=fighter.id,
+                    name=fighter.name,
+                    tier=fighter_update["tier"],
+                    elo=fighter_update["elo"],
+                    tier_elo=fighter_update["tier_elo"],
+                    best_streak=fighter_update["best_streak"],
+                )
+            )
 
+    def warm_fighter_cache(self) -> None:
+        if self.fighter_cache.max_size <= 0:
+            return
+
+        self.caches_fighters = True
+        self._lock_fighter_cache()
+
+        # Most recently updated fighters first, they are the most likely to fight again
+        # and are the ones kept should there be more fighters than fit in the cache.
         cursor = self.connection.cursor()
         cursor.execute(
             """
-            INSERT INTO match
-                (
-                    date,
-                    fighter_red,
-                    fighter_blue,
-                    winner,
-                    bet_red,
-                    bet_blue,
-                    streak_red,
-                    streak_blue,
-                    tier,
-                    match_format,
-                    colour
-                )
-            VALUES
-                (
-                    %(date)s,
-                    %(fighter_red)s,
-                    %(fighter_blue)s,
-                    %(winner)s,
-                    %(bet_red)s,
-                    %(bet_blue)s,
-                    %(streak_red)s,
-                    %(streak_blue)s,
-                    %(tier)s,
-                    %(match_format)s,
-                    %(colour)s
-                )
+            SELECT
+                id,
+                name,
+                tier,
+                elo,
+                tier_elo,
+                best_streak
+            FROM
+                fighter
+            ORDER BY
+                last_updated DESC
+            LIMIT
+                %(limit)s
             """,
-            insert_obj,
-        )
-        self.connection.commit()
-
-        red_won = fighter_red["id"] == winner
-        self._update_fighter(
-            fighter_red,
-            match.tier,
-            match.streak_red,
-            fighter_blue["elo"],
-            fighter_blue["tier_elo"],
-            red_won,
-        )
-        self._update_fighter(
-            fighter_blue,
-            match.tier,
-            match.streak_blue,
-            fighter_red["elo"],
-            fighter_red["tier_elo"],
-            not red_won,
+            {"limit": self.fighter_cache.max_size},
         )
+        rows = cursor.fetchall()
         self.connection.commit()
         cursor.close()
 
+        for row in reversed(rows):
+            self.fighter_cache.set(self._to_cached_fighter(row))
+        self.logger.info("Warmed fighter cache with %s fighters.", len(rows))
+
     def update_current_match(
         self,
         fighter_red_name: str,
         fighter_blue_name: str,
         match_format: MatchFormat,
         tier: str | None = None,
+        updated_at: datetime | None = None,
     ) -> None:
         cursor = self.connection.cursor()
         cursor.execute("DELETE FROM current_match")
-        insert_obj = {
+        insert_obj: dict[str, Any] = {
             "fighter_red": fighter_red_name,
             "fighter_blue": fighter_blue_name,
             "tier": tier,
             "match_format": match_format.value,
-            "updated_at": datetime.now(timezone.utc),
+            "updated_at": updated_at or datetime.now(timezone.utc),
         }
         cursor.execute(
             """
@@ -178,6 +410,28 @@ class Database:
                 """,
             insert_obj,
         )
+        self._notify(
+            cursor,
+            "open",
+            {**insert_obj, "updated_at": insert_obj["updated_at"].isoformat()},
+        )
+        self.connection.commit()
+        cursor.close()
+
+    def notify_bets_locked(self, match: Match) -> None:
+        cursor = self.connection.cursor()
+        self._notify(
+            cursor,
+            "locked",
+            {
+                "fighter_red": match.fighter_red_name,
+                "fighter_blue": match.fighter_blue_name,
+                "bet_red": match.bet_red,
+                "bet_blue": match.bet_blue,
+                "streak_red": match.streak_red,
+                "streak_blue": match.streak_blue,
+            },
+        )
         self.connection.commit()
         cursor.close()
 
@@ -201,125 +455,174 @@ class Database:
         cursor.close()
         return bot_heartbeat_time
 
-    def _get_or_create_fighter(
-        self, name: str, tier: str, best_streak: int
-    ) -> psycopg2.extras.DictRow:
-        fighter = self._get_fighter_by_name(name)
-        if not fighter:
-            fighter = self._create_fighter(
-                name=name, tier=tier, best_streak=best_streak
-            )
+    def _lock_fighter_cache(self) -> None:
+        # Held for as long as the connection is open. Waits for a rewrite of the
+        # fighters that is under way to finish, the cache is filled afterwards.
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "SELECT pg_advisory_lock_shared(%(key)s)", {"key": self.FIGHTER_CACHE_LOCK}
+        )
+        self.connection.commit()
+        cursor.close()
 
-        return fighter
+    def _notify(self, cursor, event: str, payload: dict[str, Any]) -> None:
+        # Notifications are only delivered once the surrounding transaction commits.
+        cursor.execute(
+            "SELECT pg_notify(%(channel)s, %(payload)s)",
+            {
+                "channel": self.EVENTS_CHANNEL,
+                "payload": json.dumps({"event": event, **payload}),
+            },
+        )
 
-    def _create_fighter(
-        self, name: str, tier: str, best_streak: int
-    ) -> psycopg2.extras.DictRow:
-        cursor = self.connection.cursor()
-        now = datetime.now(timezone.utc)
-        insert_obj = {
-            "name": name,
-            "tier": tier,
-            "best_streak": best_streak,
-            "created_time": now,
-            "elo": 1500,
+    def _get_or_create_fighters(
+        self,
+        cursor,
+        tier: str,
+        now: datetime,
+        fighters: list[tuple[str, int]],
+    ) -> dict[str, CachedFighter]:
+        found_fighters: dict[str, CachedFighter] = {}
+        missing_fighters: dict[str, int] = {}
+        for name, best_streak in fighters:
+            if cached_fighter := self.fighter_cache.get(name):
+                found_fighters[name] = cached_fighter
+            else:
+                missing_fighters[name] = best_streak
+
+        if not missing_fighters:
+            return found_fighters
+
+        # Fighters that don't exist yet are created with their starting ratings, then
+        # both new and existing fighters are returned. Unlike an `ON CONFLICT DO UPDATE`
+        # this doesn't burn an ID or rewrite the row of fighters which already exist.
+        input_rows = {
+            f"fighter_{i}": (i, name, tier, best_streak, now, self.DEFAULT_ELO)
+            for i, (name, best_streak) in enumerate(missing_fighters.items())
         }
         cursor.execute(
-            """
-            INSERT INTO fighter
-                (
-                    name, 
-                    tier, 
-                    prev_tier,
-                    best_streak, 
-                    created_time, 
-                    last_updated, 
-                    elo, 
-                    tier_elo
-                )
-            VALUES
-                (
-                    %(name)s, 
-                    %(tier)s, 
-                    %(tier)s,
-                    %(best_streak)s, 
-                    %(created_time)s, 
-                    %(created_time)s, 
-                    %(elo)s, 
-                    %(elo)s
-                )
-            RETURNING
-                id
+            f"""
+            WITH input_fighter (
+                ordinal, name, tier, best_streak, created_time, elo
+            ) AS (
+                VALUES {", ".join(f"%({key})s" for key in input_rows)}
+            ), new_fighter AS (
+                INSERT INTO fighter
+                    (
+                        name,
+                        tier,
+                        prev_tier,
+                        best_streak,
+                        created_time,
+                        last_updated,
+                        elo,
+                        tier_elo
+                    )
+                SELECT
+                    name,
+                    tier,
+                    tier,
+                    best_streak,
+                    created_time,
+                    created_time,
+                    elo,
+                    elo
+                FROM
+                    input_fighter
+                WHERE
+                    NOT EXISTS (
+                        SELECT 1 FROM fighter WHERE fighter.name = input_fighter.name
+                    )
+                ORDER BY
+                    ordinal
+                ON CONFLICT (name) DO NOTHING
+                RETURNING
+                    *
+            )
+            SELECT * FROM new_fighter
+            UNION ALL
+            SELECT * FROM fighter WHERE name IN (SELECT name FROM input_fighter)
             """,
-            insert_obj,
+            input_rows,
         )
-        # We know this should always return something
-        fighter_id = cursor.fetchone()[0]  # type: ignore
-        self.connection.commit()
-        cursor.execute("SELECT * FROM fighter WHERE id = %(id)s", {"id": fighter_id})
-        fighter = cursor.fetchone()
-        cursor.close()
-        return fighter  # type: ignore
+        for row in cursor.fetchall():
+            found_fighters[row["name"]] = self._to_cached_fighter(row)
+        return found_fighters
 
-    def _update_fighter(
+    def _get_updated_fighter(
         self,
-        fighter: psycopg2.extras.DictRow,
+        fighter: CachedFighter,
         tier: str,
         best_streak: int,
         opponent_elo: int,
         opponent_tier_elo: int,
         won: bool,
-    ) -> None:
+        now: datetime,
+    ) -> dict[str, Any]:
         updated_tier = tier
-        prev_tier = fighter["tier"]
+        prev_tier = fighter.tier
 
         # Tier elo is the current tier elo if fighter hasn't changed tiers, otherwise
         # reset tier elo to 1500
-        tier_elo = fighter["tier_elo"] if updated_tier == prev_tier else 1500
+        tier_elo = fighter.tier_elo if updated_tier == prev_tier else self.DEFAULT_ELO
 
         updated_streak = (
-            best_streak
-            if best_streak > fighter["best_streak"]
-            else fighter["best_streak"]
+            best_streak if best_streak > fighter.best_streak else fighter.best_streak
         )
 
-        updated_elo = self._calculate_elo(fighter["elo"], opponent_elo, won)
-        updated_tier_elo = self._calculate_elo(tier_elo, opponent_tier_elo, won)
-
-        cursor = self.connection.cursor()
-        update_obj = {
-            "id": fighter["id"],
-            "last_updated": datetime.now(timezone.utc),
+        return {
+            "id": fighter.id,
+            "last_updated": now,
             "best_streak": updated_streak,
             "tier": updated_tier,
             "prev_tier": prev_tier,
-            "tier_elo": updated_tier_elo,
-            "elo": updated_elo,
+            "tier_elo": self._calculate_elo(tier_elo, opponent_tier_elo, won),
+            "elo": self._calculate_elo(fighter.elo, opponent_elo, won),
         }
-        cursor.execute(
-            """
-            UPDATE
-                fighter
-            SET
-                last_updated = %(last_updated)s,
-                best_streak = %(best_streak)s,
-                tier = %(tier)s,
-                prev_tier = %(prev_tier)s,
-                tier_elo = %(tier_elo)s,
-                elo = %(elo)s
-            WHERE
-                id = %(id)s
-            """,
-            update_obj,
-        )
-        cursor.close()
 
-    def _get_fighter_by_name(self, name: str) -> psycopg2.extras.DictRow | None:
-        cursor = self.connection.cursor()
-        cursor.execute("SELECT * FROM fighter WHERE name = %(name)s", {"name": name})
-        fighter = cursor.fetchone()
-        cursor.close()
-        return fighter  # type: ignore
+    @classmethod
+    def _get_fighter_stats_rows(
+        cls, match: Match, fighter_red_id: int, fighter_blue_id: int, red_won: bool
+    ) -> dict[str, tuple]:
+        # What the match adds to the stats of each fighter, in the order of
+        # `FIGHTER_STATS_COLUMNS`. Shares are only counted when there was a pot and odds
+        # when the fighter was bet on.
+        stats_rows: dict[int, tuple] = {}
+        # Red is written last, should the same fighter somehow be on both sides only
+        # red is counted. A row can only be updated once per statement.
+        for fighter_id, won, bet_on, bet_against in [
+            (fighter_blue_id, not red_won, match.bet_blue, match.bet_red),
+            (fighter_red_id, red_won, match.bet_red, match.bet_blue),
+        ]:
+            assert bet_on is not None and bet_against is not None
+            pot = bet_on + bet_against
+            stats_rows[fighter_id] = (
+                fighter_id,
+                match.tier,
+                1,
+                int(won),
+                bet_on,
+                bet_against,
+                bet_on / pot if pot else 0.0,
+                int(pot > 0),
+                bet_against / bet_on if bet_on else 0.0,
+                int(bet_on > 0),
+            )
+        return {
+            f"fighter_stats_{i}": stats_row
+            for i, stats_row in enumerate(stats_rows.values())
+        }
+
+    @classmethod
+    def _to_cached_fighter(cls, row: psycopg2.extras.DictRow) -> CachedFighter:
+        return CachedFighter(
+            id=row["id"],
+            name=row["name"],
+            tier=row["tier"],
+            elo=row["elo"],
+            tier_elo=row["tier_elo"],
+            best_streak=row["best_streak"],
+        )
 
     @classmethod
     def _calculate_elo(cls, elo: int, opponent_elo: int, won: bool) -> int:
@@ -334,4 +637,4 @@ class Database:
         score_alpha = 1 if won is True else 0
 
         # Calculate updated ELO
-        return int(elo + (32 * (score_alpha - es_alpha)))
+        return int(elo + (cls.ELO_K_FACTOR * (score_alpha - es_alpha)))
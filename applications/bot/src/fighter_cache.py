@@ -0,0 +1,48 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CachedFighter:
+    id: int
+    name: str
+    tier: str
+    elo: int
+    tier_elo: int
+    best_streak: int
+
+
+class FighterCache:
+    """
+    Bounded LRU cache of fighters keyed by name.
+
+    The bot is the only writer of the `fighter` table, so once a fighter has been read
+    the cache stays correct as long as every rating update is written through to it. It
+    only lives for as long as the bot process does, a restart by the watchdog starts
+    with an empty cache.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._fighters: OrderedDict[str, CachedFighter] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._fighters)
+
+    def get(self, name: str) -> CachedFighter | None:
+        fighter = self._fighters.get(name)
+        if fighter is not None:
+            self._fighters.move_to_end(name)
+        return fighter
+
+    def set(self, fighter: CachedFighter) -> None:
+        if self.max_size <= 0:
+            return
+
+        self._fighters[fighter.name] = fighter
+        self._fighters.move_to_end(fighter.name)
+        while len(self._fighters) > self.max_size:
+            self._fighters.popitem(last=False)
+
+    def clear(self) -> None:
+        self._fighters.clear()
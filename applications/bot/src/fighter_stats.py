@@ -0,0 +1,152 @@
+"""
+Rebuilds `fighter_stats`, the per tier aggregates of every fighter, from `match`.
+
+The bot keeps `fighter_stats` up to date one match at a time as part of recording it,
+this is what to reach for once the two have drifted apart, eg. a match was fixed or
+deleted by hand. Sums are accumulated in the order matches were played, the same order
+the bot adds them in, so an untouched history gives back exactly the stats stored.
+
+The bot does not cache stats and can keep running, matches it records are held until
+the rebuild is done.
+
+Usage:
+    poetry run python -m src.fighter_stats --dry-run
+"""
+
+import logging
+import os
+from argparse import ArgumentParser
+from pathlib import Path
+
+import psycopg2
+from dotenv import load_dotenv
+
+from src.database import Database
+
+# Every match seen from the side of both of its fighters. Matches where a fighter
+# somehow fought themselves are only counted once, from the red side, just as
+# `Database.record_match` does.
+FIGHTER_STATS_QUERY = """
+    SELECT
+        fighter_id,
+        tier,
+        COUNT(*) AS matches,
+        COUNT(*) FILTER (WHERE won) AS wins,
+        SUM(bet_on) AS bet_on,
+        SUM(bet_against) AS bet_against,
+        COALESCE(
+            SUM(bet_on::float / NULLIF(bet_on::bigint + bet_against, 0) ORDER BY id),
+            0
+        ) AS bet_share_sum,
+        COUNT(*) FILTER (WHERE bet_on::bigint + bet_against > 0) AS bet_share_matches,
+        COALESCE(
+            SUM(bet_against::float / NULLIF(bet_on, 0) ORDER BY id), 0
+        ) AS odds_sum,
+        COUNT(*) FILTER (WHERE bet_on > 0) AS odds_matches
+    FROM
+        (
+            SELECT
+                id,
+                fighter_red AS fighter_id,
+                tier,
+                winner = fighter_red AS won,
+                bet_red AS bet_on,
+                bet_blue AS bet_against
+            FROM
+                match
+            UNION ALL
+            SELECT
+                id,
+                fighter_blue,
+                tier,
+                winner = fighter_blue,
+                bet_blue,
+                bet_red
+            FROM
+                match
+            WHERE
+                fighter_blue <> fighter_red
+        ) AS side
+    GROUP BY
+        fighter_id,
+        tier
+"""
+
+
+def rebuild_fighter_stats(cursor) -> int:
+    """
+    Replaces every row of `fighter_stats` with stats aggregated from `match`. Returns
+    the number of rows which were added, changed or removed.
+    """
+    columns = ", ".join(Database.FIGHTER_STATS_COLUMNS)
+    cursor.execute(
+        f"""
+        CREATE TEMPORARY TABLE rebuilt_fighter_stats ON COMMIT DROP AS
+        {FIGHTER_STATS_QUERY}
+        """
+    )
+    cursor.execute(
+        """
+        SELECT
+            COUNT(*)
+        FROM
+            fighter_stats
+            FULL OUTER JOIN rebuilt_fighter_stats AS rebuilt
+                USING (fighter_id, tier)
+        WHERE
+            ROW(fighter_stats.*) IS DISTINCT FROM ROW(rebuilt.*)
+        """
+    )
+    (changed,) = cursor.fetchone()
+    cursor.execute("TRUNCATE fighter_stats")
+    cursor.execute(
+        f"""
+        INSERT INTO fighter_stats ({columns})
+        SELECT {columns} FROM rebuilt_fighter_stats
+        """
+    )
+    return changed
+
+
+def main() -> None:
+    arg_parser = ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report how many rows would change, nothing is written.",
+    )
+    arguments = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("fighter_stats")
+
+    if os.environ.get("PRODUCTION") is None:
+        load_dotenv(Path(__file__).parent.parent.parent.parent / ".env")
+
+    connection = psycopg2.connect(
+        dbname=os.environ["POSTGRES_DB"],
+        user=os.environ["POSTGRES_USER"],
+        password=os.environ["POSTGRES_PASSWORD"],
+        host=os.environ["POSTGRES_HOST"],
+        port=int(os.environ["POSTGRES_PORT"]),
+    )
+    try:
+        with connection, connection.cursor() as cursor:
+            # Nothing may be recorded between reading the matches and writing the stats.
+            cursor.execute(
+                "LOCK TABLE match, fighter_stats IN SHARE ROW EXCLUSIVE MODE"
+            )
+            changed = rebuild_fighter_stats(cursor)
+            if arguments.dry_run:
+                connection.rollback()
+            logger.info(
+                "%s fighter stats rows %s.",
+                changed,
+                "would change" if arguments.dry_run else "changed",
+            )
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
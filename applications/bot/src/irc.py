@@ -1,13 +1,19 @@
+import asyncio
 import logging
 import re
 import ssl
-import time
-from collections.abc import Iterator
-from datetime import datetime, timedelta, timezone
-from select import select
-from socket import socket
-from ssl import SSLSocket
+from collections import deque
+from collections.abc import AsyncIterator
 
+from src.metrics import (
+    IRC_DISCARDED_LINES,
+    IRC_LAST_READ,
+    IRC_READ_BYTES,
+    IRC_READ_LINES,
+    IRC_RECONNECTS,
+    PARSE_ERRORS,
+    WAIFU_MESSAGES,
+)
 from src.objects import (
     LockedBetMessage,
     MatchFormat,
@@ -17,7 +23,7 @@ from src.objects import (
 )
 
 ReturnMessages = (
-    OpenBetMessage | LockedBetMessage | WinMessage | OpenBetExhibitionMessage | None
+    OpenBetMessage | LockedBetMessage | WinMessage | OpenBetExhibitionMessage
 )
 
 
@@ -25,9 +31,109 @@ class RemoteSocketDisconnect(Exception):
     """Generic exception instructing us to restart the connection"""
 
 
+class IRCLineProtocol(asyncio.BufferedProtocol):
+    """
+    Frames the IRC stream into lines.
+
+    The transport reads straight into a persistent buffer handed out by `get_buffer`,
+    only complete lines are decoded. A line, or a multibyte character, split across
+    reads stays in the buffer until the rest of it arrives.
+    """
+
+    BUFFER_SIZE = 64 * 1024
+    # Partial lines are moved to the front of the buffer once less than this is free.
+    MIN_FREE_SPACE = 4 * 1024
+    # Stop reading from the socket while this many lines are waiting to be consumed.
+    MAX_QUEUED_LINES = 1024
+
+    def __init__(self) -> None:
+        self.transport: asyncio.Transport | None = None
+        self._buffer = bytearray(self.BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        # `_buffer[_start:_end]` holds the start of the next, incomplete, line.
+        self._start = 0
+        self._end = 0
+        # Set when a single line doesn't fit in the buffer, the rest of it is dropped.
+        self._discarding = False
+        self._lines: deque[str] = deque()
+        self._waiter: asyncio.Future[None] | None = None
+        self._connection_lost = False
+        self._paused = False
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        assert isinstance(transport, asyncio.Transport)
+        self.transport = transport
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self._connection_lost = True
+        self._wake_up()
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if len(self._buffer) - self._end < self.MIN_FREE_SPACE:
+            if self._start == 0:
+                self._discarding = True
+                self._end = 0
+            else:
+                partial_line = bytes(self._view[self._start : self._end])
+                self._view[: len(partial_line)] = partial_line
+                self._start = 0
+                self._end = len(partial_line)
+        return self._view[self._end :]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        scan_from = self._end
+        self._end += nbytes
+        IRC_READ_BYTES.inc(nbytes)
+        queued_lines = len(self._lines)
+        while (newline := self._buffer.find(b"\n", scan_from, self._end)) != -1:
+            if self._discarding:
+                self._discarding = False
+                IRC_DISCARDED_LINES.inc()
+            else:
+                line = str(self._view[self._start : newline], "utf-8", "replace")
+                self._lines.append(line.rstrip("\r"))
+            self._start = scan_from = newline + 1
+        if read_lines := len(self._lines) - queued_lines:
+            IRC_READ_LINES.inc(read_lines)
+
+        if self._start == self._end:
+            self._start = self._end = 0
+
+        if self._lines:
+            self._wake_up()
+        if len(self._lines) >= self.MAX_QUEUED_LINES and self.transport:
+            self._paused = True
+            self.transport.pause_reading()
+
+    async def readline(self) -> str:
+        while not self._lines:
+            if self._connection_lost:
+                raise RemoteSocketDisconnect("No bytes returned")
+            self._waiter = asyncio.get_running_loop().create_future()
+            await self._waiter
+
+        if self._paused and len(self._lines) <= self.MAX_QUEUED_LINES // 2:
+            self._paused = False
+            if self.transport:
+                self.transport.resume_reading()
+        return self._lines.popleft()
+
+    def _wake_up(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        self._waiter = None
+
+
 class TwitchBot:
     MAX_AUTH_ATTEMPTS = 5
 
+    HOST = "irc.chat.twitch.tv"
+    PORT = 6697
+    # Send our own PING when nothing has been read for this long, and give up on the
+    # connection should the PONG not come back in time.
+    PING_INTERVAL = 60
+    PONG_TIMEOUT = 30
+
     OPEN_BET_RE = re.compile(r"Bets are OPEN for (.+) vs (.+)!\s+\((.) Tier\)\s+.*")
     OPEN_BET_EXHIBITION_RE = re.compile(
         r"Bets are OPEN for (.+) vs (.+)!\s+\(.+\)\s+\(exhibitions\)\s+.*"
@@ -36,26 +142,49 @@ class TwitchBot:
         r"Bets are locked. (.+) \((-?[0-9]+)\) - \$(([0-9]{1,3},)*[0-9]{1,3}), (.+) \((-?[0-9]+)\) - \$(([0-9]{1,3},)*[0-9]{1,3})"  # pylint: disable=line-too-long
     )
     WINNER_RE = re.compile(r"(.+) wins! Payouts to Team (Red|Blue)\..*")
+    # Literal text each of the patterns above requires.
+    OPEN_BET_PREFIX = "Bets are OPEN for "
+    LOCKED_BET_PREFIX = "Bets are locked"
+    WINNER_MARKER = " wins! Payouts to Team "
+
+    WAIFU_PREFIX = ":waifu4u"
+    CHANNEL_SEPARATOR = "#saltybet :"
 
     def __init__(
-        self, twitch_username: str, twitch_oauth_token: str, logger: logging.Logger
+        self,
+        twitch_username: str,
+        twitch_oauth_token: str,
+        logger: logging.Logger,
+        host: str = HOST,
+        port: int = PORT,
+        use_tls: bool = True,
+        ssl_context: ssl.SSLContext | None = None,
     ) -> None:
+        """
+        `host`, `port` and `use_tls` point the bot at another IRC server than Twitch,
+        eg. a local stand-in. `ssl_context` replaces the default one, to trust a self
+        signed certificate.
+        """
         self.username = twitch_username
         self.oauth_token = twitch_oauth_token
-        self.ssl_sock: SSLSocket
-        self.last_read = datetime.now(timezone.utc)
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.ssl_context = ssl_context
+        self.transport: asyncio.Transport | None = None
+        self.protocol: IRCLineProtocol
+        self.last_read = 0.0
         self.logger = logger
 
-        self.connect()
-
-    def connect(self) -> None:
+    async def connect(self) -> None:
         num_auth_attempts = 0
         connected = False
         while not connected:
             try:
-                self._initialize_socket()
+                await self._initialize_connection()
                 connected = True
             except TimeoutError:
+                self.close()
                 num_auth_attempts += 1
                 if num_auth_attempts > self.MAX_AUTH_ATTEMPTS:
                     raise
@@ -63,56 +192,67 @@ class TwitchBot:
         # Join channel
         self.logger.info("Joining channel saltybet...")
         self._send("JOIN #saltybet")
-        joined = False
-        joined_start = datetime.now(timezone.utc)
-        while not joined:
-            for message in self._receive(expect_disconnect=False):
-                self.logger.info(message)
-                if "End of /NAMES list" in message:
-                    self.logger.info("Joined successfully!")
-                    joined = True
-                    break
-                if datetime.now(timezone.utc) - joined_start > timedelta(seconds=5):
-                    raise TimeoutError(
-                        "Took longer than 5 seconds to join saltybet channel."
-                    )
-
-    def listen(self) -> Iterator[ReturnMessages]:
-        while True:
-            if self.last_read < datetime.now(timezone.utc) - timedelta(minutes=10):
-                self.logger.warning("Last read was over 10 minutes ago.")
-                self.connect()
+        try:
+            async with asyncio.timeout(5):
+                while True:
+                    message = await self._receive()
+                    self.logger.info(message)
+                    if "End of /NAMES list" in message:
+                        self.logger.info("Joined successfully!")
+                        break
+        except TimeoutError as e:
+            raise TimeoutError(
+                "Took longer than 5 seconds to join saltybet channel."
+            ) from e
 
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    async def listen(self) -> AsyncIterator[ReturnMessages]:
+        while True:
+            await self.connect()
+            keepalive = asyncio.create_task(self._keepalive())
             try:
-                for message in self._receive():
+                while True:
+                    message = await self._receive()
                     if "PING :tmi.twitch.tv" == message:
                         self.logger.info("Received a PING, sending PONG.")
                         self._send("PONG :tmi.twitch.tv")
 
-                    if not message.startswith(":waifu4u"):
-                        continue
-
                     try:
-                        if return_message := self.parse_message(
-                            message.split("#saltybet :")[1]
-                        ):
+                        if return_message := self.parse_line(message):
                             self.logger.debug(message)
                             yield return_message
                     except Exception:
+                        PARSE_ERRORS.inc()
                         self.logger.error("Something went wrong", exc_info=True)
-            except RemoteSocketDisconnect:
-                # Questionable if this is ever hit
-                self.logger.info("Remote socket was likely disconnected. Reconnecting.")
-                self.connect()
+            except (RemoteSocketDisconnect, ConnectionError, ssl.SSLError):
+                IRC_RECONNECTS.inc()
+                self.logger.info("Remote socket was disconnected. Reconnecting.")
+            finally:
+                keepalive.cancel()
+                self.close()
 
-            yield None
+    def parse_line(self, line: str) -> ReturnMessages | None:
+        # Most lines are chat from viewers, reject those before doing any other work.
+        if not line.startswith(self.WAIFU_PREFIX):
+            return None
 
-            time.sleep(5)
+        parts = line.split(self.CHANNEL_SEPARATOR, 2)
+        if len(parts) < 2:
+            return None
+        return self.parse_message(parts[1])
 
     def parse_message(self, message: str) -> ReturnMessages | None:
         self.logger.debug(message)
         waifu_message: ReturnMessages | None = None
-        if match := self.OPEN_BET_RE.match(message):
+        # Every pattern is only tried when the literal text it requires is there, in
+        # particular the winner pattern which is by far the slowest to not match.
+        if message.startswith(self.OPEN_BET_PREFIX) and (
+            match := self.OPEN_BET_RE.match(message)
+        ):
             if "(matchmaking)" in message:
                 match_format = MatchFormat.MATCHMAKING
             elif "tournament bracket" in message:
@@ -126,7 +266,9 @@ class TwitchBot:
                 tier=match.group(3),
                 match_format=match_format,
             )
-        elif match := self.LOCKED_BET_RE.match(message):
+        elif message.startswith(self.LOCKED_BET_PREFIX) and (
+            match := self.LOCKED_BET_RE.match(message)
+        ):
             waifu_message = LockedBetMessage(
                 fighter_red_name=match.group(1),
                 streak_red=int(match.group(2)),
@@ -135,64 +277,76 @@ class TwitchBot:
                 streak_blue=int(match.group(6)),
                 bet_blue=int(match.group(7).replace(",", "")),
             )
-        elif match := self.WINNER_RE.match(message):
+        elif self.WINNER_MARKER in message and (match := self.WINNER_RE.match(message)):
             waifu_message = WinMessage(
                 winner_name=match.group(1), colour=match.group(2)
             )
-        elif match := self.OPEN_BET_EXHIBITION_RE.match(message):
+        elif message.startswith(self.OPEN_BET_PREFIX) and (
+            match := self.OPEN_BET_EXHIBITION_RE.match(message)
+        ):
             waifu_message = OpenBetExhibitionMessage(
                 fighter_red_name=match.group(1), fighter_blue_name=match.group(2)
             )
 
+        WAIFU_MESSAGES.labels(
+            type(waifu_message).__name__ if waifu_message else "Unrecognized"
+        ).inc()
         return waifu_message
 
+    async def _keepalive(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.PONG_TIMEOUT)
+            idle = loop.time() - self.last_read
+            if idle > self.PING_INTERVAL + self.PONG_TIMEOUT:
+                self.logger.warning(
+                    "Nothing read for %s seconds. Reconnecting.", int(idle)
+                )
+                # Closing the connection ends the pending read in `listen`.
+                self.close()
+                return
+            if idle > self.PING_INTERVAL:
+                self.logger.debug("Nothing read for a while, sending PING.")
+                self._send("PING :tmi.twitch.tv")
+
     def _send(self, message: str) -> None:
-        self.ssl_sock.send(f"{message}\n".encode("utf-8"))
+        if self.transport is None:
+            raise RemoteSocketDisconnect("Not connected")
+        self.transport.write(f"{message}\n".encode("utf-8"))
 
-    def _receive(self, expect_disconnect: bool = True) -> list[str]:
-        try:
-            readable_sockets, _, _ = select([self.ssl_sock], [], [], 10)
-            decoded_read_buffer: str | None = None
-            for readable_socket in readable_sockets:
-                read_buffer = readable_socket.recv(1024)
-
-                if not read_buffer and expect_disconnect is True:
-                    # Likely that the remote socket was killed we must reconnect!
-                    raise RemoteSocketDisconnect("No bytes returned")
-
-                self.last_read = datetime.now(timezone.utc)
-                decoded_read_buffer = read_buffer.decode()
-
-            if decoded_read_buffer:
-                return decoded_read_buffer.split("\r\n")
-            return []
-        except Exception:  # pylint: disable=broad-except
-            return []
-
-    def _initialize_socket(self) -> None:
-        sock = socket()
-        sock.settimeout(360)  # About a minute longer than PING/PONG
-        context = ssl.create_default_context()
-        context.minimum_version = ssl.TLSVersion.TLSv1_2
-
-        self.ssl_sock = context.wrap_socket(sock, server_hostname="irc.chat.twitch.tv")
-        self.ssl_sock.connect(("irc.chat.twitch.tv", 6697))
-        self.ssl_sock.settimeout(360)
+    async def _receive(self) -> str:
+        message = await self.protocol.readline()
+        self.last_read = asyncio.get_running_loop().time()
+        IRC_LAST_READ.set_to_current_time()
+        return message
+
+    async def _initialize_connection(self) -> None:
+        context: ssl.SSLContext | None = None
+        if self.use_tls:
+            context = self.ssl_context
+            if context is None:
+                context = ssl.create_default_context()
+                context.minimum_version = ssl.TLSVersion.TLSv1_2
+
+        async with asyncio.timeout(5):
+            (
+                self.transport,
+                self.protocol,
+            ) = await asyncio.get_running_loop().create_connection(
+                IRCLineProtocol, self.host, self.port, ssl=context
+            )
 
         self._send(f"PASS {self.oauth_token}")
         self._send(f"NICK {self.username}")
 
         self.logger.info("Authenticating as %s", self.username)
-        authenticated = False
-        authenticated_start = datetime.now(timezone.utc)
-        while not authenticated:
-            for message in self._receive(expect_disconnect=False):
-                self.logger.info(message)
-                if "welcome, glhf!" in message.lower():
-                    self.logger.info("Authenticated successfully!")
-                    authenticated = True
-                    break
-                if datetime.now(timezone.utc) - authenticated_start > timedelta(
-                    seconds=5
-                ):
-                    raise TimeoutError("Took longer than 5 seconds to authenticate.")
+        try:
+            async with asyncio.timeout(5):
+                while True:
+                    message = await self._receive()
+                    self.logger.info(message)
+                    if "welcome, glhf!" in message.lower():
+                        self.logger.info("Authenticated successfully!")
+                        break
+        except TimeoutError as e:
+            raise TimeoutError("Took longer than 5 seconds to authenticate.") from e
@@ -0,0 +1,98 @@
+"""
+Prometheus metrics of the bot, served over HTTP when `BOT_METRICS_PORT` is set.
+
+Covers the whole ingestion pipeline, from bytes read off IRC, through parsing and the
+current match, to writes applied to the database. How far behind the bot is reading can
+be had with `time() - saltyboy_bot_irc_last_read_timestamp_seconds`.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Most writes are applied within a few milliseconds, while writes spilled during an
+# outage can wait for minutes.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+# === IRC ===
+IRC_READ_BYTES = Counter("saltyboy_bot_irc_read_bytes_total", "Bytes read from IRC.")
+IRC_READ_LINES = Counter("saltyboy_bot_irc_read_lines_total", "Lines read from IRC.")
+IRC_DISCARDED_LINES = Counter(
+    "saltyboy_bot_irc_discarded_lines_total",
+    "Lines dropped for being too long to fit in the read buffer.",
+)
+IRC_LAST_READ = Gauge(
+    "saltyboy_bot_irc_last_read_timestamp_seconds",
+    "Unix time at which a line was last read from IRC.",
+)
+IRC_RECONNECTS = Counter(
+    "saltyboy_bot_irc_reconnects_total",
+    "Times the connection to IRC was lost and made again.",
+)
+
+# === Parsing ===
+WAIFU_MESSAGES = Counter(
+    "saltyboy_bot_waifu_messages_total",
+    "Messages from waifu4u, by the type they were parsed into. Messages matching none "
+    "of the patterns are counted as `Unrecognized`.",
+    ["type"],
+)
+PARSE_ERRORS = Counter(
+    "saltyboy_bot_parse_errors_total", "Lines which raised an error when parsed."
+)
+
+# === Current match ===
+MATCH_REJECTIONS = Counter(
+    "saltyboy_bot_match_rejections_total",
+    "Messages which could not move the current match along, by the update attempted "
+    "and why it was rejected.",
+    ["update", "reason"],
+)
+
+# === Database writes ===
+DB_WRITE_DURATION = Histogram(
+    "saltyboy_bot_db_write_duration_seconds",
+    "Time taken to apply a write to the database, by operation.",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_WRITE_LAG = Histogram(
+    "saltyboy_bot_db_write_lag_seconds",
+    "Time from a write being queued to it being applied, by operation. Includes time "
+    "spent spilled to disk.",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_WRITES = Counter(
+    "saltyboy_bot_db_writes_total",
+    "Writes attempted, by operation and result. `unavailable` writes are retried, "
+    "`failed` writes are dropped.",
+    ["operation", "result"],
+)
+DB_DROPPED_WRITES = Counter(
+    "saltyboy_bot_db_dropped_writes_total",
+    "Writes dropped because the write queue was full, by operation.",
+    ["operation"],
+)
+DB_SPILLED_WRITES = Counter(
+    "saltyboy_bot_db_spilled_writes_total",
+    "Writes spilled to disk while the database was unavailable.",
+)
+DB_WRITE_QUEUE_SIZE = Gauge(
+    "saltyboy_bot_db_write_queue_size", "Writes waiting in the queue to be applied."
+)
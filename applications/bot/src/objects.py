@@ -1,6 +1,9 @@
 import logging
 from dataclasses import dataclass
 from enum import Enum, unique
+from typing import Any
+
+from src.metrics import MATCH_REJECTIONS
 
 
 @unique
@@ -66,8 +69,44 @@ class Match:
 
         self.logger = logger
 
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "status": self.status.value,
+            "tier": self.tier,
+            "fighter_red_name": self.fighter_red_name,
+            "fighter_blue_name": self.fighter_blue_name,
+            "match_format": self.match_format.value,
+            "streak_red": self.streak_red,
+            "streak_blue": self.streak_blue,
+            "bet_red": self.bet_red,
+            "bet_blue": self.bet_blue,
+            "winner": self.winner,
+            "colour": self.colour,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], logger: logging.Logger) -> "Match":
+        match = cls(
+            OpenBetMessage(
+                fighter_red_name=data["fighter_red_name"],
+                fighter_blue_name=data["fighter_blue_name"],
+                tier=data["tier"],
+                match_format=MatchFormat(data["match_format"]),
+            ),
+            logger,
+        )
+        match.status = MatchStatus(data["status"])
+        match.streak_red = data["streak_red"]
+        match.streak_blue = data["streak_blue"]
+        match.bet_red = data["bet_red"]
+        match.bet_blue = data["bet_blue"]
+        match.winner = data["winner"]
+        match.colour = data["colour"]
+        return match
+
     def update_locked(self, waifu_message: LockedBetMessage) -> bool:
         if self.status != MatchStatus.OPEN:
+            MATCH_REJECTIONS.labels("locked", "status").inc()
             self.logger.warning(
                 "Could not update current match. Attempted to update to locked and "
                 "match status is not open. Waifu message: %s. Current match: %s.",
@@ -80,6 +119,7 @@ class Match:
             waifu_message.fighter_red_name != self.fighter_red_name
             or waifu_message.fighter_blue_name != self.fighter_blue_name
         ):
+            MATCH_REJECTIONS.labels("locked", "mismatch").inc()
             self.logger.warning(
                 "Could not update current match. Data mismatch. Waifu message: %s. "
                 "Current match: %s",
@@ -97,6 +137,7 @@ class Match:
 
     def update_winner(self, waifu_message: WinMessage) -> bool:
         if self.status != MatchStatus.LOCKED:
+            MATCH_REJECTIONS.labels("winner", "status").inc()
             self.logger.warning(
                 "Could not update current match. Attempted to update to locked and "
                 "match status is not open. Waifu message: %s. Current match: %s.",
@@ -109,6 +150,7 @@ class Match:
             self.fighter_red_name,
             self.fighter_blue_name,
         ]:
+            MATCH_REJECTIONS.labels("winner", "mismatch").inc()
             self.logger.warning(
                 "Could not update current match. Data mismatch. Waifu message: %s. "
                 "Current match: %s",
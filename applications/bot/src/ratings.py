@@ -0,0 +1,504 @@
+"""
+Recomputes the ratings of every fighter, and the ratings fighters had going into and
+coming out of every match, by replaying the whole match history.
+
+The bot only ever updates ratings one match at a time, this is what to reach for once
+the history or the rating rules change, eg. a bad match was fixed or the K factor was
+changed. Matches are replayed in the order they were played with the same rules as
+`Database.record_match`, so replaying an untouched history gives back the ratings
+already stored.
+
+The bot caches fighters, stop it while ratings are being written and start it again
+afterwards. Ratings are not written while the bot is running, a bot started while they
+are waits for them to be written before filling its cache.
+
+Usage:
+    poetry run python -m src.ratings --dry-run
+"""
+
+import io
+import logging
+import math
+import os
+import sys
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import psycopg2
+from dotenv import load_dotenv
+
+from src.database import Database
+
+
+def _get_copy_row_dtype(columns: list[tuple[str, str]]) -> np.dtype:
+    # Every column has a fixed size, so every row of a binary `COPY` has the same size:
+    # the number of columns, then the length and value of each column.
+    return np.dtype(
+        [("columns", ">i2")]
+        + [
+            field
+            for column, dtype in columns
+            for field in [(f"{column}_length", ">i4"), (column, dtype)]
+        ]
+    )
+
+
+# Timestamps are sent as microseconds since 2000-01-01.
+MATCH_COLUMNS = [
+    ("id", ">i4"),
+    ("date", ">i8"),
+    ("fighter_red", ">i4"),
+    ("fighter_blue", ">i4"),
+    ("red_won", ">i4"),
+    ("tier", ">i4"),
+    ("streak_red", ">i4"),
+    ("streak_blue", ">i4"),
+]
+MATCH_ROW_DTYPE = _get_copy_row_dtype(MATCH_COLUMNS)
+# The columns of `match_rating` after `match_id`.
+RATING_COLUMNS = [
+    "elo_before_red",
+    "elo_after_red",
+    "tier_elo_before_red",
+    "tier_elo_after_red",
+    "elo_before_blue",
+    "elo_after_blue",
+    "tier_elo_before_blue",
+    "tier_elo_after_blue",
+]
+MATCH_RATING_ROW_DTYPE = _get_copy_row_dtype(
+    [("match_id", ">i4")] + [(column, ">i4") for column in RATING_COLUMNS]
+)
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# The signature, the flags and the length of the header extension.
+COPY_HEADER_SIZE = len(COPY_SIGNATURE) + 4 + 4
+COPY_TRAILER_SIZE = 2
+
+
+@dataclass
+class MatchHistory:
+    """
+    Every match in the order it was played, a NumPy array per column. Fighters are
+    referred to by their index in `fighter_ids` and tiers by their character code.
+    """
+
+    match_ids: np.ndarray
+    fighter_ids: np.ndarray
+    fighter_red: np.ndarray
+    fighter_blue: np.ndarray
+    red_won: np.ndarray
+    tier: np.ndarray
+    streak_red: np.ndarray
+    streak_blue: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.fighter_red)
+
+
+@dataclass
+class FighterRatings:
+    """
+    The ratings of every fighter of a `MatchHistory` once all its matches were played,
+    indexed like `fighter_ids`.
+    """
+
+    fighter_ids: np.ndarray
+    tier: np.ndarray
+    prev_tier: np.ndarray
+    elo: np.ndarray
+    tier_elo: np.ndarray
+    best_streak: np.ndarray
+
+
+@dataclass
+class MatchRatings:
+    """
+    The ratings both fighters went into every match of a `MatchHistory` with and came
+    out of it with, indexed like the matches.
+    """
+
+    match_ids: np.ndarray
+    elo_before_red: np.ndarray
+    elo_after_red: np.ndarray
+    tier_elo_before_red: np.ndarray
+    tier_elo_after_red: np.ndarray
+    elo_before_blue: np.ndarray
+    elo_after_blue: np.ndarray
+    tier_elo_before_blue: np.ndarray
+    tier_elo_after_blue: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.match_ids)
+
+
+def load_match_history(cursor) -> MatchHistory:
+    buffer = io.BytesIO()
+    cursor.copy_expert(
+        """
+        COPY (
+            SELECT
+                id,
+                date,
+                fighter_red,
+                fighter_blue,
+                (winner = fighter_red)::int,
+                ascii(tier),
+                streak_red,
+                streak_blue
+            FROM
+                match
+        ) TO STDOUT WITH (FORMAT binary)
+        """,
+        buffer,
+    )
+    data = buffer.getbuffer()
+    if bytes(data[: len(COPY_SIGNATURE)]) != COPY_SIGNATURE:
+        raise ValueError("Unexpected binary COPY signature.")
+    extension_size = int.from_bytes(data[COPY_HEADER_SIZE - 4 : COPY_HEADER_SIZE])
+    rows = np.frombuffer(
+        data[COPY_HEADER_SIZE + extension_size : len(data) - COPY_TRAILER_SIZE],
+        dtype=MATCH_ROW_DTYPE,
+    )
+    # Sorting here is quicker than having PostgreSQL do it.
+    order = np.lexsort((rows["id"], rows["date"]))
+
+    # Fighter IDs come from a sequence, a lookup table maps them to indexes quicker
+    # than sorting them would.
+    ids = np.concatenate([rows["fighter_red"][order], rows["fighter_blue"][order]])
+    has_matches = np.zeros(int(np.max(ids, initial=0)) + 1, dtype=bool)
+    has_matches[ids] = True
+    fighters = (np.cumsum(has_matches) - 1)[ids]
+    return MatchHistory(
+        match_ids=rows["id"][order].astype(np.int64),
+        fighter_ids=np.flatnonzero(has_matches),
+        fighter_red=fighters[: len(rows)],
+        fighter_blue=fighters[len(rows) :],
+        red_won=rows["red_won"][order].astype(np.float64),
+        tier=rows["tier"][order].astype(np.int64),
+        streak_red=rows["streak_red"][order].astype(np.int64),
+        streak_blue=rows["streak_blue"][order].astype(np.int64),
+    )
+
+
+def recompute_ratings(  # pylint: disable=too-many-locals
+    history: MatchHistory,
+    default_elo: int = Database.DEFAULT_ELO,
+    k_factor: int = Database.ELO_K_FACTOR,
+) -> tuple[FighterRatings, MatchRatings]:
+    tier, best_streak = _get_initial_fighters(history)
+    prev_tier = tier.copy()
+    elo = np.full(len(history.fighter_ids), default_elo, dtype=np.int64)
+    tier_elo = elo.copy()
+    match_ratings = MatchRatings(
+        history.match_ids,
+        *(np.empty(len(history), dtype=np.int32) for _ in RATING_COLUMNS),
+    )
+
+    transform = _get_elo_transform(default_elo, k_factor)
+
+    def calculate_elo(
+        fighter_elo: np.ndarray, opponent_elo: np.ndarray, won: np.ndarray
+    ) -> np.ndarray:
+        transformed_elo = transform(fighter_elo)
+        expected = transformed_elo / (transformed_elo + transform(opponent_elo))
+        return (fighter_elo + k_factor * (won - expected)).astype(np.int64)
+
+    for matches in _get_independent_matches(history):
+        red = history.fighter_red[matches]
+        blue = history.fighter_blue[matches]
+        match_tier = history.tier[matches]
+        red_won = history.red_won[matches]
+        blue_won = 1 - red_won
+
+        # Both fighters are updated from the ratings they had going into the match,
+        # tier elo resets for a fighter that changed tiers.
+        red_elo, blue_elo = elo[red], elo[blue]
+        red_tier_elo, blue_tier_elo = tier_elo[red], tier_elo[blue]
+        red_tier, blue_tier = tier[red], tier[blue]
+        red_best_streak = np.maximum(history.streak_red[matches], best_streak[red])
+        blue_best_streak = np.maximum(history.streak_blue[matches], best_streak[blue])
+        red_elo_after = calculate_elo(red_elo, blue_elo, red_won)
+        red_tier_elo_after = calculate_elo(
+            np.where(red_tier == match_tier, red_tier_elo, default_elo),
+            blue_tier_elo,
+            red_won,
+        )
+        blue_elo_after = calculate_elo(blue_elo, red_elo, blue_won)
+        blue_tier_elo_after = calculate_elo(
+            np.where(blue_tier == match_tier, blue_tier_elo, default_elo),
+            red_tier_elo,
+            blue_won,
+        )
+
+        # Red is written first, blue wins should a fighter somehow be on both sides.
+        elo[red] = red_elo_after
+        tier_elo[red] = red_tier_elo_after
+        prev_tier[red] = red_tier
+        tier[red] = match_tier
+        best_streak[red] = red_best_streak
+
+        elo[blue] = blue_elo_after
+        tier_elo[blue] = blue_tier_elo_after
+        prev_tier[blue] = blue_tier
+        tier[blue] = match_tier
+        best_streak[blue] = blue_best_streak
+
+        match_ratings.elo_before_red[matches] = red_elo
+        match_ratings.elo_after_red[matches] = red_elo_after
+        match_ratings.tier_elo_before_red[matches] = red_tier_elo
+        match_ratings.tier_elo_after_red[matches] = red_tier_elo_after
+        match_ratings.elo_before_blue[matches] = blue_elo
+        match_ratings.elo_after_blue[matches] = blue_elo_after
+        match_ratings.tier_elo_before_blue[matches] = blue_tier_elo
+        match_ratings.tier_elo_after_blue[matches] = blue_tier_elo_after
+
+    fighter_ratings = FighterRatings(
+        fighter_ids=history.fighter_ids,
+        tier=tier,
+        prev_tier=prev_tier,
+        elo=elo,
+        tier_elo=tier_elo,
+        best_streak=best_streak,
+    )
+    return fighter_ratings, match_ratings
+
+
+def write_fighter_ratings(cursor, ratings: FighterRatings) -> int:
+    """
+    Returns the number of fighters whose ratings changed.
+    """
+    cursor.execute(
+        """
+        CREATE TEMPORARY TABLE fighter_rating (
+            id integer PRIMARY KEY,
+            tier varchar(1) NOT NULL,
+            prev_tier varchar(1) NOT NULL,
+            elo integer NOT NULL,
+            tier_elo integer NOT NULL,
+            best_streak integer NOT NULL
+        ) ON COMMIT DROP
+        """
+    )
+    rows = zip(
+        ratings.fighter_ids.tolist(),
+        ratings.tier.tolist(),
+        ratings.prev_tier.tolist(),
+        ratings.elo.tolist(),
+        ratings.tier_elo.tolist(),
+        ratings.best_streak.tolist(),
+    )
+    cursor.copy_expert(
+        "COPY fighter_rating FROM STDIN",
+        io.StringIO(
+            "".join(
+                f"{fighter_id}\t{chr(tier)}\t{chr(prev_tier)}\t{elo}\t{tier_elo}\t"
+                f"{best_streak}\n"
+                for fighter_id, tier, prev_tier, elo, tier_elo, best_streak in rows
+            )
+        ),
+    )
+    cursor.execute(
+        """
+        UPDATE
+            fighter
+        SET
+            tier = fighter_rating.tier,
+            prev_tier = fighter_rating.prev_tier,
+            elo = fighter_rating.elo,
+            tier_elo = fighter_rating.tier_elo,
+            best_streak = fighter_rating.best_streak
+        FROM
+            fighter_rating
+        WHERE
+            fighter.id = fighter_rating.id
+            AND (
+                fighter.tier,
+                fighter.prev_tier,
+                fighter.elo,
+                fighter.tier_elo,
+                fighter.best_streak
+            ) IS DISTINCT FROM (
+                fighter_rating.tier,
+                fighter_rating.prev_tier,
+                fighter_rating.elo,
+                fighter_rating.tier_elo,
+                fighter_rating.best_streak
+            )
+        """
+    )
+    return cursor.rowcount
+
+
+def write_match_ratings(cursor, match_ratings: MatchRatings) -> None:
+    """
+    Replaces the ratings of every match.
+    """
+    rows = np.empty(len(match_ratings), dtype=MATCH_RATING_ROW_DTYPE)
+    rows["columns"] = len(RATING_COLUMNS) + 1
+    rows["match_id_length"] = 4
+    rows["match_id"] = match_ratings.match_ids
+    for column in RATING_COLUMNS:
+        rows[f"{column}_length"] = 4
+        rows[column] = getattr(match_ratings, column)
+
+    buffer = io.BytesIO()
+    # No flags and no header extension, the rows then the trailer.
+    buffer.write(COPY_SIGNATURE + bytes(8))
+    buffer.write(rows.tobytes())
+    buffer.write((-1).to_bytes(COPY_TRAILER_SIZE, signed=True))
+    buffer.seek(0)
+
+    cursor.execute("TRUNCATE match_rating")
+    cursor.copy_expert(
+        f"""
+        COPY match_rating (match_id, {", ".join(RATING_COLUMNS)})
+        FROM STDIN WITH (FORMAT binary)
+        """,
+        buffer,
+    )
+
+
+def lock_fighter_cache(cursor) -> bool:
+    """
+    Returns `False` if a bot caching fighters is running. Otherwise no bot may fill its
+    cache until the transaction ends.
+    """
+    cursor.execute(
+        "SELECT pg_try_advisory_xact_lock(%(key)s)",
+        {"key": Database.FIGHTER_CACHE_LOCK},
+    )
+    (locked,) = cursor.fetchone()
+    return locked
+
+
+def _get_initial_fighters(history: MatchHistory) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the tier and best streak of every fighter as they were created, from the
+    first match they were in.
+    """
+    # Blue comes first, a fighter on both sides of its first match is created with
+    # blue's streak.
+    tiers = np.concatenate([history.tier, history.tier])
+    streaks = np.concatenate([history.streak_blue, history.streak_red])
+    order = np.argsort(np.tile(np.arange(len(history)), 2), kind="stable")
+    _, first_matches = np.unique(
+        np.concatenate([history.fighter_blue, history.fighter_red])[order],
+        return_index=True,
+    )
+    first_matches = order[first_matches]
+    return tiers[first_matches], streaks[first_matches]
+
+
+def _get_independent_matches(history: MatchHistory) -> list[np.ndarray]:
+    """
+    Splits the matches into batches which can be replayed all at once. A match is in
+    the batch right after the last batch either of its fighters was in, so no fighter
+    is ever in a batch twice and every fighter's matches are replayed in order.
+    """
+    last_batches = [0] * len(history.fighter_ids)
+    batches = []
+    for red, blue in zip(history.fighter_red.tolist(), history.fighter_blue.tolist()):
+        batch = last_batches[red]
+        if last_batches[blue] > batch:
+            batch = last_batches[blue]
+        batch += 1
+        last_batches[red] = last_batches[blue] = batch
+        batches.append(batch)
+
+    batch_of_match = np.array(batches, dtype=np.int64)
+    order = np.argsort(batch_of_match, kind="stable")
+    return np.split(order, np.flatnonzero(np.diff(batch_of_match[order])) + 1)
+
+
+def _get_elo_transform(
+    default_elo: int, k_factor: int
+) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    `math.pow(10, rating / 400)` is what `Database._calculate_elo` uses, looking its
+    results up rather than using `np.power` keeps every rating identical to the bot's,
+    bit for bit. The table only covers the ratings seen so far, it grows as ratings
+    drift past it.
+    """
+    lowest_elo = default_elo
+    transformed = np.array([math.pow(10, default_elo / 400)])
+
+    def transform(ratings: np.ndarray) -> np.ndarray:
+        nonlocal lowest_elo, transformed
+        highest_elo = lowest_elo + len(transformed) - 1
+        low = int(np.min(ratings, initial=lowest_elo))
+        high = int(np.max(ratings, initial=highest_elo))
+        if low < lowest_elo or high > highest_elo:
+            # Room for another hundred matches either way, rather than growing it a
+            # little at a time.
+            lowest_elo = min(low, lowest_elo) - 100 * k_factor
+            highest_elo = max(high, highest_elo) + 100 * k_factor
+            transformed = np.array(
+                [
+                    math.pow(10, rating / 400)
+                    for rating in range(lowest_elo, highest_elo + 1)
+                ]
+            )
+        return transformed[ratings - lowest_elo]
+
+    return transform
+
+
+def main() -> None:
+    arg_parser = ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report how many fighters would change, nothing is written.",
+    )
+    arguments = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("ratings")
+
+    if os.environ.get("PRODUCTION") is None:
+        load_dotenv(Path(__file__).parent.parent.parent.parent / ".env")
+
+    connection = psycopg2.connect(
+        dbname=os.environ["POSTGRES_DB"],
+        user=os.environ["POSTGRES_USER"],
+        password=os.environ["POSTGRES_PASSWORD"],
+        host=os.environ["POSTGRES_HOST"],
+        port=int(os.environ["POSTGRES_PORT"]),
+    )
+    try:
+        with connection, connection.cursor() as cursor:
+            # A running bot would write the ratings it has cached back over the new ones.
+            # A dry run writes nothing, the bot can be left running.
+            if not arguments.dry_run and not lock_fighter_cache(cursor):
+                logger.error(
+                    "The bot is running and caches fighters. Stop it before "
+                    "recomputing ratings."
+                )
+                sys.exit(1)
+
+            # Nothing may be recorded between reading the history and writing it back.
+            cursor.execute(
+                "LOCK TABLE match, fighter, match_rating IN SHARE ROW EXCLUSIVE MODE"
+            )
+            history = load_match_history(cursor)
+            logger.info("Replaying %s matches.", len(history))
+            ratings, match_ratings = recompute_ratings(history)
+            changed = write_fighter_ratings(cursor, ratings)
+            write_match_ratings(cursor, match_ratings)
+            if arguments.dry_run:
+                connection.rollback()
+            logger.info(
+                "%s of %s fighters %s.",
+                changed,
+                len(ratings.fighter_ids),
+                "would change" if arguments.dry_run else "changed",
+            )
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
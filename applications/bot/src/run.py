@@ -1,10 +1,15 @@
+import asyncio
+import logging
 import os
+import tempfile
 import time
 from dataclasses import asdict
 from datetime import datetime, timedelta, timezone
 from multiprocessing import Process, Queue
 from pathlib import Path
 
+from prometheus_client import start_http_server
+
 from src.app_logging import (
     configure_process_logger,
     get_bot_logger,
@@ -12,7 +17,8 @@ from src.app_logging import (
     run_listener,
 )
 from src.database import Database
-from src.irc import TwitchBot
+from src.irc import ReturnMessages, TwitchBot
+from src.metrics import MATCH_REJECTIONS
 from src.objects import (
     LockedBetMessage,
     Match,
@@ -21,10 +27,14 @@ from src.objects import (
     OpenBetMessage,
     WinMessage,
 )
+from src.writer import DatabaseWriter
 
 
 class BotProcess(Process):
-    def __init__(
+    # The watchdog restarts the bot when its heartbeat is over two minutes old.
+    HEARTBEAT_INTERVAL = 30
+
+    def __init__(  # pylint: disable=too-many-locals
         self,
         postgres_db: str,
         postgres_user: str,
@@ -33,6 +43,13 @@ class BotProcess(Process):
         postgres_port: int,
         twitch_username: str,
         twitch_oauth_token: str,
+        twitch_irc_host: str,
+        twitch_irc_port: int,
+        twitch_irc_tls: bool,
+        fighter_cache_size: int,
+        spill_path: Path,
+        metrics_port: int | None,
+        metrics_addr: str,
         queue: Queue,
     ) -> None:
         super().__init__(daemon=True)
@@ -45,6 +62,14 @@ class BotProcess(Process):
 
         self.twitch_username = twitch_username
         self.twitch_oauth_token = twitch_oauth_token
+        self.twitch_irc_host = twitch_irc_host
+        self.twitch_irc_port = twitch_irc_port
+        self.twitch_irc_tls = twitch_irc_tls
+
+        self.fighter_cache_size = fighter_cache_size
+        self.spill_path = spill_path
+        self.metrics_port = metrics_port
+        self.metrics_addr = metrics_addr
 
         self.queue = queue
 
@@ -53,6 +78,21 @@ class BotProcess(Process):
         bot_logger = get_bot_logger()
         bot_logger.info("Bot started")
 
+        if self.metrics_port is not None:
+            try:
+                start_http_server(self.metrics_port, addr=self.metrics_addr)
+                bot_logger.info(
+                    "Serving metrics on %s:%s", self.metrics_addr, self.metrics_port
+                )
+            except OSError:
+                # Metrics are not worth failing to record matches over.
+                bot_logger.warning(
+                    "Could not serve metrics on %s:%s.",
+                    self.metrics_addr,
+                    self.metrics_port,
+                    exc_info=True,
+                )
+
         database = Database(
             dbname=self.postgres_db,
             user=self.postgres_user,
@@ -60,55 +100,107 @@ class BotProcess(Process):
             host=self.postgres_host,
             port=self.postgres_port,
             logger=bot_logger,
+            fighter_cache_size=self.fighter_cache_size,
         )
+        # The cache lives and dies with this process, a restart by the watchdog always
+        # starts from what is in the database.
+        database.warm_fighter_cache()
 
-        irc_bot = TwitchBot(self.twitch_username, self.twitch_oauth_token, bot_logger)
+        # Writes happen on their own thread, reading from IRC never waits on them.
+        database_writer = DatabaseWriter(database, self.spill_path, bot_logger)
+        database_writer.start()
 
-        current_match: Match | None = None
-        for message in irc_bot.listen():
-            if message is None:
-                bot_logger.debug("Updating heartbeat.")
-                database.update_bot_heartbeat()
-                continue
+        asyncio.run(self._listen(database_writer, bot_logger))
 
-            if isinstance(message, OpenBetMessage):
-                bot_logger.info(
-                    "New match. %s VS. %s. Tier: %s. Format: %s.",
-                    message.fighter_red_name,
-                    message.fighter_blue_name,
-                    message.tier,
-                    message.match_format.value,
+    async def _listen(
+        self, database_writer: DatabaseWriter, bot_logger: logging.Logger
+    ) -> None:
+        irc_bot = TwitchBot(
+            self.twitch_username,
+            self.twitch_oauth_token,
+            bot_logger,
+            host=self.twitch_irc_host,
+            port=self.twitch_irc_port,
+            use_tls=self.twitch_irc_tls,
+        )
+        heartbeat = asyncio.create_task(self._heartbeat(database_writer, bot_logger))
+
+        current_match: Match | None = None
+        try:
+            async for message in irc_bot.listen():
+                current_match = handle_message(
+                    message, current_match, database_writer, bot_logger
                 )
-                database.update_current_match(**asdict(message))
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(
+        self, database_writer: DatabaseWriter, bot_logger: logging.Logger
+    ) -> None:
+        # Runs on the same event loop as the IRC client, should the loop ever get stuck
+        # the heartbeat stops and the watchdog restarts the bot.
+        while True:
+            bot_logger.debug("Updating heartbeat.")
+            database_writer.update_bot_heartbeat()
+            await asyncio.sleep(self.HEARTBEAT_INTERVAL)
+
+
+def handle_message(
+    message: ReturnMessages,
+    current_match: Match | None,
+    database_writer: DatabaseWriter,
+    bot_logger: logging.Logger,
+) -> Match | None:
+    """
+    Moves the current match along with a message read from IRC and queues the writes
+    it calls for. Returns what is now the current match.
+    """
+    if isinstance(message, OpenBetMessage):
+        bot_logger.info(
+            "New match. %s VS. %s. Tier: %s. Format: %s.",
+            message.fighter_red_name,
+            message.fighter_blue_name,
+            message.tier,
+            message.match_format.value,
+        )
+        database_writer.update_current_match(**asdict(message))
+
+        if message.match_format != MatchFormat.EXHIBITION:
+            return Match(message, bot_logger)
+        return None
 
-                if message.match_format != MatchFormat.EXHIBITION:
-                    current_match = Match(message, bot_logger)
-                else:
-                    current_match = None
-            elif isinstance(message, OpenBetExhibitionMessage):
+    if isinstance(message, OpenBetExhibitionMessage):
+        bot_logger.info(
+            "New match. %s VS. %s. Format: exhibition",
+            message.fighter_red_name,
+            message.fighter_blue_name,
+        )
+        database_writer.update_current_match(
+            **asdict(message), match_format=MatchFormat.EXHIBITION
+        )
+        return None
+
+    if current_match:
+        if isinstance(message, LockedBetMessage):
+            if current_match.update_locked(message) is True:
                 bot_logger.info(
-                    "New match. %s VS. %s. Format: exhibition",
+                    "Bets locked. %s ($%s). %s ($%s).",
                     message.fighter_red_name,
+                    f"{message.bet_red:,}",
                     message.fighter_blue_name,
+                    f"{message.bet_blue:,}",
                 )
-                database.update_current_match(
-                    **asdict(message), match_format=MatchFormat.EXHIBITION
-                )
-                current_match = None
-            elif current_match:
-                if isinstance(message, LockedBetMessage):
-                    if current_match.update_locked(message) is True:
-                        bot_logger.info(
-                            "Bets locked. %s ($%s). %s ($%s).",
-                            message.fighter_red_name,
-                            f"{message.bet_red:,}",
-                            message.fighter_blue_name,
-                            f"{message.bet_blue:,}",
-                        )
-                elif isinstance(message, WinMessage):
-                    if current_match.update_winner(message) is True:
-                        bot_logger.info("Winner: %s.", message.winner_name)
-                        database.record_match(current_match)
+                database_writer.notify_bets_locked(current_match)
+        elif isinstance(message, WinMessage):
+            if current_match.update_winner(message) is True:
+                bot_logger.info("Winner: %s.", message.winner_name)
+                database_writer.record_match(current_match)
+    elif isinstance(message, LockedBetMessage):
+        MATCH_REJECTIONS.labels("locked", "no_match").inc()
+    elif isinstance(message, WinMessage):
+        MATCH_REJECTIONS.labels("winner", "no_match").inc()
+
+    return current_match
 
 
 def run(log_path: Path | None) -> None:
@@ -215,6 +307,27 @@ def new_bot_process(queue: Queue) -> BotProcess:
         postgres_port=int(os.environ["POSTGRES_PORT"]),
         twitch_username=os.environ["TWITCH_USERNAME"],
         twitch_oauth_token=os.environ["TWITCH_OAUTH_TOKEN"],
+        twitch_irc_host=os.environ.get("TWITCH_IRC_HOST", TwitchBot.HOST),
+        twitch_irc_port=int(os.environ.get("TWITCH_IRC_PORT", TwitchBot.PORT)),
+        twitch_irc_tls=os.environ.get("TWITCH_IRC_TLS", "true").lower() != "false",
+        fighter_cache_size=int(
+            os.environ.get(
+                "BOT_FIGHTER_CACHE_SIZE", Database.DEFAULT_FIGHTER_CACHE_SIZE
+            )
+        ),
+        spill_path=Path(
+            os.environ.get(
+                "BOT_SPILL_PATH",
+                Path(tempfile.gettempdir()) / "saltyboy" / "pending_writes.jsonl",
+            )
+        ),
+        metrics_port=(
+            int(os.environ["BOT_METRICS_PORT"])
+            if os.environ.get("BOT_METRICS_PORT")
+            else None
+        ),
+        # Only the host itself can reach the metrics unless told otherwise.
+        metrics_addr=os.environ.get("BOT_METRICS_ADDR", "127.0.0.1"),
         queue=queue,
     )
     bot_process.start()
@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import psycopg2
+
+from src.database import Database
+from src.metrics import (
+    DB_DROPPED_WRITES,
+    DB_SPILLED_WRITES,
+    DB_WRITE_DURATION,
+    DB_WRITE_LAG,
+    DB_WRITE_QUEUE_SIZE,
+    DB_WRITES,
+)
+from src.objects import Match, MatchFormat
+
+
+@dataclass
+class PendingWrite:
+    operation: str
+    arguments: dict[str, Any]
+    # Unix time, kept when spilled so replayed writes report how late they were applied.
+    queued_at: float = field(default_factory=time.time)
+
+
+class DatabaseWriter(threading.Thread):
+    """
+    Applies database writes on its own thread so that reading from IRC never waits on
+    PostgreSQL.
+
+    Writes are queued in the order they are made. Should PostgreSQL become unreachable
+    the failed write, and every write after it, is appended to a spill file on disk.
+    Once PostgreSQL is reachable again the spill file is replayed in order before any
+    new writes are applied. The spill file outlives the process, a bot restarted by the
+    watchdog picks up where the previous one left off.
+
+    Heartbeats are never spilled, a heartbeat is only meaningful at the time it is
+    written.
+
+    Writes are applied at least once. A write whose commit went through but was never
+    acknowledged is applied again, matches carry a write key so they are still only
+    recorded once and every other write is safe to repeat.
+    """
+
+    RETRY_BACKOFF_MAX = 60
+    HEARTBEAT = "update_bot_heartbeat"
+
+    def __init__(
+        self,
+        database: Database,
+        spill_path: Path,
+        logger: logging.Logger,
+        max_queued_writes: int = 1000,
+    ) -> None:
+        super().__init__(name="database-writer", daemon=True)
+        self.database = database
+        self.spill_path = spill_path
+        self.logger = logger
+        self.queue: queue.Queue[PendingWrite] = queue.Queue(max_queued_writes)
+        DB_WRITE_QUEUE_SIZE.set_function(self.queue.qsize)
+
+    def update_current_match(
+        self,
+        fighter_red_name: str,
+        fighter_blue_name: str,
+        match_format: MatchFormat,
+        tier: str | None = None,
+    ) -> None:
+        self._put(
+            "update_current_match",
+            fighter_red_name=fighter_red_name,
+            fighter_blue_name=fighter_blue_name,
+            match_format=match_format.value,
+            tier=tier,
+            updated_at=datetime.now(timezone.utc).isoformat(),
+        )
+
+    def notify_bets_locked(self, match: Match) -> None:
+        self._put("notify_bets_locked", match=match.to_dict())
+
+    def record_match(self, match: Match) -> None:
+        self._put(
+            "record_match",
+            match=match.to_dict(),
+            now=datetime.now(timezone.utc).isoformat(),
+            write_key=str(uuid.uuid4()),
+        )
+
+    def update_bot_heartbeat(self) -> None:
+        self._put(self.HEARTBEAT)
+
+    def run(self) -> None:
+        backoff = 1
+        while True:
+            if self.spill_path.exists():
+                self._spill_queued()
+                if self._replay():
+                    backoff = 1
+                else:
+                    self.logger.warning(
+                        "Database is unavailable. Retrying spilled writes in %s "
+                        "seconds.",
+                        backoff,
+                    )
+                    self._spill_until(time.monotonic() + backoff)
+                    backoff = min(backoff * 2, self.RETRY_BACKOFF_MAX)
+                continue
+
+            pending_write = self.queue.get()
+            if not self._apply(pending_write):
+                self._spill([pending_write])
+
+    def _put(self, operation: str, **arguments: Any) -> None:
+        try:
+            self.queue.put_nowait(PendingWrite(operation, arguments))
+        except queue.Full:
+            DB_DROPPED_WRITES.labels(operation).inc()
+            self.logger.error(
+                "Database write queue is full. Dropping %s: %s", operation, arguments
+            )
+
+    def _apply(self, pending_write: PendingWrite) -> bool:
+        """
+        Returns `False` if the write could not be applied because the connection to the
+        database was lost and should be retried later. Any other failure, eg. a
+        cancelled statement or a serialization failure, is logged and the write is
+        dropped, retrying it would only fail again.
+        """
+        arguments = dict(pending_write.arguments)
+        if "match" in arguments:
+            arguments["match"] = Match.from_dict(arguments["match"], self.logger)
+        if "match_format" in arguments:
+            arguments["match_format"] = MatchFormat(arguments["match_format"])
+        for key in ["now", "updated_at"]:
+            if key in arguments:
+                arguments[key] = datetime.fromisoformat(arguments[key])
+
+        operation = pending_write.operation
+        try:
+            with DB_WRITE_DURATION.labels(operation).time():
+                getattr(self.database, operation)(**arguments)
+        except Exception as e:
+            if self._is_unavailable(e):
+                DB_WRITES.labels(operation, "unavailable").inc()
+                self.logger.warning(
+                    "Lost connection to the database during %s.",
+                    operation,
+                    exc_info=True,
+                )
+                return False
+
+            DB_WRITES.labels(operation, "failed").inc()
+            self.logger.error(
+                "Failed to apply %s. Dropping it: %s",
+                operation,
+                pending_write.arguments,
+                exc_info=True,
+            )
+            try:
+                self.database.connection.rollback()
+            except psycopg2.Error:
+                pass
+        else:
+            DB_WRITES.labels(operation, "applied").inc()
+            DB_WRITE_LAG.labels(operation).observe(
+                time.time() - pending_write.queued_at
+            )
+        return True
+
+    def _is_unavailable(self, error: Exception) -> bool:
+        # Only a lost connection is worth retrying. Other operational errors, such as a
+        # cancelled statement, leave the connection open and would fail again.
+        if isinstance(error, psycopg2.InterfaceError):
+            return True
+        return (
+            isinstance(error, psycopg2.OperationalError)
+            and self.database.connection.closed != 0
+        )
+
+    def _spill(self, pending_writes: list[PendingWrite]) -> None:
+        pending_writes = [
+            pending_write
+            for pending_write in pending_writes
+            if pending_write.operation != self.HEARTBEAT
+        ]
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        if not pending_writes:
+            # Still mark the database as unavailable so later writes keep their order.
+            self.spill_path.touch()
+            return
+
+        with self.spill_path.open("a", encoding="utf-8") as spill_file:
+            for pending_write in pending_writes:
+                spill_file.write(json.dumps(asdict(pending_write)) + "\n")
+            spill_file.flush()
+            os.fsync(spill_file.fileno())
+        DB_SPILLED_WRITES.inc(len(pending_writes))
+        self.logger.info(
+            "Spilled %s writes to %s.", len(pending_writes), self.spill_path
+        )
+
+    def _spill_queued(self) -> None:
+        pending_writes: list[PendingWrite] = []
+        while True:
+            try:
+                pending_writes.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self._spill(pending_writes)
+
+    def _spill_until(self, deadline: float) -> None:
+        # Keep spilling while waiting to retry, otherwise the queue could fill up.
+        while (timeout := deadline - time.monotonic()) > 0:
+            try:
+                self._spill([self.queue.get(timeout=timeout)])
+            except queue.Empty:
+                break
+
+    def _replay(self) -> bool:
+        if self.database.connection.closed:
+            try:
+                self.database.reconnect()
+            except psycopg2.OperationalError:
+                return False
+
+        lines = self.spill_path.read_text(encoding="utf-8").splitlines()
+        self.logger.info("Replaying %s spilled writes.", len(lines))
+        for i, line in enumerate(lines):
+            try:
+                pending_write = PendingWrite(**json.loads(line))
+            except (ValueError, TypeError):
+                # Most likely the process was terminated half way through a write.
+                self.logger.error("Skipping malformed spilled write: %s", line)
+                continue
+
+            if not self._apply(pending_write):
+                self._rewrite_spill_file(lines[i:])
+                return False
+
+        self.spill_path.unlink()
+        self.logger.info("Replayed all spilled writes.")
+        return True
+
+    def _rewrite_spill_file(self, lines: list[str]) -> None:
+        # Replaced atomically so a crash never loses writes that were not replayed.
+        tmp_path = self.spill_path.with_suffix(".tmp")
+        tmp_path.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+        os.replace(tmp_path, self.spill_path)
@@ -0,0 +1,144 @@
+"""
+Checks `IRCLineProtocol` frames the stream into lines however it is split across reads,
+drops lines too long for its buffer and stops reading while too many lines are queued.
+"""
+
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from src.irc import IRCLineProtocol, RemoteSocketDisconnect
+
+CHAT = (
+    "PING :tmi.twitch.tv\r\n"
+    ":waifu4u!waifu4u@waifu4u.tmi.twitch.tv PRIVMSG #saltybet :Bets are OPEN for "
+    "Ryu vs Kèn ☆! (A Tier) (matchmaking) www.saltybet.com\r\n"
+    ":viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #saltybet :🐟 go red\r\n"
+    "\r\n"
+    "no carriage return\n"
+).encode()
+CHAT_LINES = [
+    "PING :tmi.twitch.tv",
+    (
+        ":waifu4u!waifu4u@waifu4u.tmi.twitch.tv PRIVMSG #saltybet :Bets are OPEN for "
+        "Ryu vs Kèn ☆! (A Tier) (matchmaking) www.saltybet.com"
+    ),
+    ":viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #saltybet :🐟 go red",
+    "",
+    "no carriage return",
+]
+
+
+class FakeTransport:
+    def __init__(self) -> None:
+        self.paused = False
+        self.resumes = 0
+
+    def pause_reading(self) -> None:
+        self.paused = True
+
+    def resume_reading(self) -> None:
+        self.paused = False
+        self.resumes += 1
+
+
+@pytest.fixture(name="transport")
+def fixture_transport() -> FakeTransport:
+    return FakeTransport()
+
+
+@pytest.fixture(name="protocol")
+def fixture_protocol(transport: FakeTransport) -> IRCLineProtocol:
+    protocol = IRCLineProtocol()
+    # Only `pause_reading` and `resume_reading` are ever called.
+    protocol.transport = transport  # type: ignore[assignment]
+    return protocol
+
+
+def feed(protocol: IRCLineProtocol, data: bytes, read_size: int) -> None:
+    # What the event loop does with each read from the socket.
+    while data:
+        buffer = protocol.get_buffer(-1)
+        nbytes = min(len(buffer), len(data), read_size)
+        buffer[:nbytes] = data[:nbytes]
+        protocol.buffer_updated(nbytes)
+        data = data[nbytes:]
+
+
+def discarded_lines() -> float:
+    return REGISTRY.get_sample_value("saltyboy_bot_irc_discarded_lines_total") or 0.0
+
+
+def read_lines(protocol: IRCLineProtocol, count: int) -> list[str]:
+    async def read() -> list[str]:
+        return [await protocol.readline() for _ in range(count)]
+
+    return asyncio.run(read())
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64, len(CHAT)])
+def test_lines_split_across_reads(protocol, read_size) -> None:
+    # Small reads split lines, `\r\n` and multibyte characters in every possible place.
+    feed(protocol, CHAT + b"incomplete", read_size)
+    assert read_lines(protocol, len(CHAT_LINES)) == CHAT_LINES
+    # The incomplete line is kept until the rest of it arrives.
+    feed(protocol, b" line\r\n", read_size)
+    assert read_lines(protocol, 1) == ["incomplete line"]
+
+
+def test_partial_lines_survive_compaction(protocol) -> None:
+    # Well over a buffer's worth of lines, partial lines are moved to the front of the
+    # buffer over and over again.
+    lines = [f"{i:05} " + "☆" * (i % 300) for i in range(500)]
+    data = "".join(f"{line}\r\n" for line in lines).encode()
+    assert len(data) > 3 * IRCLineProtocol.BUFFER_SIZE
+    feed(protocol, data, 1000)
+    assert read_lines(protocol, len(lines)) == lines
+
+
+def test_oversized_line_is_discarded(protocol) -> None:
+    discarded_before = discarded_lines()
+    oversized = b"x" * (3 * IRCLineProtocol.BUFFER_SIZE)
+    feed(protocol, b"before\r\n" + oversized + b"\r\nafter\r\n", 4096)
+
+    assert read_lines(protocol, 2) == ["before", "after"]
+    assert discarded_lines() == discarded_before + 1
+
+
+def test_pauses_reading_until_queued_lines_drain(protocol, transport) -> None:
+    feed(protocol, b"line\r\n" * (IRCLineProtocol.MAX_QUEUED_LINES - 1), 4096)
+    assert not transport.paused
+
+    feed(protocol, b"line\r\n", 4096)
+    assert transport.paused
+
+    # Reading resumes once no more than half of the lines are left.
+    read_lines(protocol, IRCLineProtocol.MAX_QUEUED_LINES // 2)
+    assert transport.paused
+    read_lines(protocol, 1)
+    assert not transport.paused
+    assert transport.resumes == 1
+
+    read_lines(protocol, IRCLineProtocol.MAX_QUEUED_LINES // 2 - 1)
+    assert transport.resumes == 1
+
+
+def test_connection_lost_after_queued_lines(protocol) -> None:
+    feed(protocol, b"last\r\npartial", 4096)
+    protocol.connection_lost(None)
+
+    assert read_lines(protocol, 1) == ["last"]
+    with pytest.raises(RemoteSocketDisconnect):
+        read_lines(protocol, 1)
+
+
+def test_connection_lost_wakes_up_reader(protocol) -> None:
+    async def read_then_lose_connection() -> None:
+        reader = asyncio.create_task(protocol.readline())
+        await asyncio.sleep(0)
+        protocol.connection_lost(None)
+        await reader
+
+    with pytest.raises(RemoteSocketDisconnect):
+        asyncio.run(read_then_lose_connection())
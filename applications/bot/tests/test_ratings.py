@@ -0,0 +1,169 @@
+"""
+Checks replaying a match history with NumPy gives the ratings the bot records one match
+at a time, bit for bit.
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from src.database import Database
+from src.fighter_cache import CachedFighter
+from src.ratings import MatchHistory, recompute_ratings
+
+TIERS = [ord(tier) for tier in "SABPX"]
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def random_history(seed: int, fighters: int, matches: int) -> MatchHistory:
+    # Fighters mostly stay in their tier, now and then one moves tiers and its tier elo
+    # starts over.
+    rng = np.random.default_rng(seed)
+    fighter_tier = rng.choice(TIERS, fighters)
+    fighter_red = np.empty(matches, dtype=np.int64)
+    fighter_blue = np.empty(matches, dtype=np.int64)
+    tier = np.empty(matches, dtype=np.int64)
+    for i in range(matches):
+        red, blue = rng.choice(fighters, 2, replace=False)
+        if rng.random() < 0.1:
+            fighter_tier[red] = rng.choice(TIERS)
+        fighter_red[i], fighter_blue[i] = red, blue
+        tier[i] = fighter_tier[red]
+    return MatchHistory(
+        match_ids=np.arange(1, matches + 1, dtype=np.int64),
+        fighter_ids=np.arange(fighters, dtype=np.int64) * 3 + 7,
+        fighter_red=fighter_red,
+        fighter_blue=fighter_blue,
+        red_won=rng.integers(0, 2, matches).astype(np.float64),
+        tier=tier,
+        streak_red=rng.integers(-20, 40, matches),
+        streak_blue=rng.integers(-20, 40, matches),
+    )
+
+
+def record_matches(
+    history: MatchHistory,
+) -> tuple[dict[int, tuple], list[tuple[int, ...]]]:
+    """
+    Replays the history the way `Database.record_match` does, returns the tier,
+    previous tier and ratings of every fighter by index and the ratings of every match.
+    """
+    # Only the rating rules are used, no connection is made.
+    database = Database.__new__(Database)
+    fighters: dict[int, CachedFighter] = {}
+    prev_tiers: dict[int, str] = {}
+    match_ratings: list[tuple[int, ...]] = []
+    for i in range(len(history)):
+        tier = chr(history.tier[i])
+        sides = [
+            (int(history.fighter_red[i]), int(history.streak_red[i])),
+            (int(history.fighter_blue[i]), int(history.streak_blue[i])),
+        ]
+        for fighter_index, streak in sides:
+            if fighter_index not in fighters:
+                fighters[fighter_index] = CachedFighter(
+                    id=fighter_index,
+                    name=str(fighter_index),
+                    tier=tier,
+                    elo=Database.DEFAULT_ELO,
+                    tier_elo=Database.DEFAULT_ELO,
+                    best_streak=streak,
+                )
+                prev_tiers[fighter_index] = tier
+
+        (red, streak_red), (blue, streak_blue) = sides
+        red_won = bool(history.red_won[i])
+        before = (fighters[red], fighters[blue])
+        updates = [
+            database._get_updated_fighter(  # pylint: disable=protected-access
+                fighter, tier, streak, opponent.elo, opponent.tier_elo, won, NOW
+            )
+            for fighter, opponent, streak, won in [
+                (before[0], before[1], streak_red, red_won),
+                (before[1], before[0], streak_blue, not red_won),
+            ]
+        ]
+        for fighter, update in zip(before, updates):
+            fighters[fighter.id] = CachedFighter(
+                id=fighter.id,
+                name=fighter.name,
+                tier=update["tier"],
+                elo=update["elo"],
+                tier_elo=update["tier_elo"],
+                best_streak=update["best_streak"],
+            )
+            prev_tiers[fighter.id] = update["prev_tier"]
+        match_ratings.append(
+            (
+                before[0].elo,
+                updates[0]["elo"],
+                before[0].tier_elo,
+                updates[0]["tier_elo"],
+                before[1].elo,
+                updates[1]["elo"],
+                before[1].tier_elo,
+                updates[1]["tier_elo"],
+            )
+        )
+    return {
+        fighter.id: (
+            fighter.tier,
+            prev_tiers[fighter.id],
+            fighter.elo,
+            fighter.tier_elo,
+            fighter.best_streak,
+        )
+        for fighter in fighters.values()
+    }, match_ratings
+
+
+@pytest.mark.parametrize(
+    "seed, fighters, matches", [(1, 2, 50), (2, 12, 2000), (3, 400, 5000)]
+)
+def test_recompute_matches_bot_ratings(seed, fighters, matches) -> None:
+    assert_recompute_matches_bot(random_history(seed, fighters, matches))
+
+
+def assert_recompute_matches_bot(history: MatchHistory) -> None:
+    fighter_ratings, match_ratings = recompute_ratings(history)
+    recorded_fighters, recorded_match_ratings = record_matches(history)
+
+    assert (
+        list(
+            zip(
+                match_ratings.elo_before_red.tolist(),
+                match_ratings.elo_after_red.tolist(),
+                match_ratings.tier_elo_before_red.tolist(),
+                match_ratings.tier_elo_after_red.tolist(),
+                match_ratings.elo_before_blue.tolist(),
+                match_ratings.elo_after_blue.tolist(),
+                match_ratings.tier_elo_before_blue.tolist(),
+                match_ratings.tier_elo_after_blue.tolist(),
+            )
+        )
+        == recorded_match_ratings
+    )
+    assert match_ratings.match_ids.tolist() == history.match_ids.tolist()
+
+    assert {
+        fighter: (
+            chr(fighter_ratings.tier[fighter]),
+            chr(fighter_ratings.prev_tier[fighter]),
+            int(fighter_ratings.elo[fighter]),
+            int(fighter_ratings.tier_elo[fighter]),
+            int(fighter_ratings.best_streak[fighter]),
+        )
+        for fighter in range(len(fighter_ratings.fighter_ids))
+    } == recorded_fighters
+
+
+def test_recompute_fighter_with_thousands_of_matches() -> None:
+    # A veteran winning nearly every one of its thousands of matches, its rating drifts
+    # far from the default.
+    history = random_history(4, 50, 5000)
+    rng = np.random.default_rng(4)
+    history.fighter_red[:] = 0
+    history.fighter_blue[:] = rng.integers(1, 50, len(history))
+    history.red_won[:] = rng.random(len(history)) < 0.95
+    assert_recompute_matches_bot(history)
@@ -0,0 +1,232 @@
+"""
+Checks writes made while the database is unreachable are spilled, bar heartbeats, and
+replayed in the order they were made, and which failures count as the database being
+unreachable.
+"""
+
+import functools
+import json
+import logging
+from pathlib import Path
+from typing import Any, cast
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+from src.database import Database
+from src.objects import Match, MatchFormat
+from src.writer import DatabaseWriter
+
+LOGGER = logging.getLogger("test")
+
+MATCH = {
+    "status": "done",
+    "tier": "A",
+    "fighter_red_name": "Red",
+    "fighter_blue_name": "Blue",
+    "match_format": "matchmaking",
+    "streak_red": 3,
+    "streak_blue": -2,
+    "bet_red": 1000,
+    "bet_blue": 2500,
+    "winner": "Blue",
+    "colour": "Blue",
+}
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.closed = 0
+
+    def rollback(self) -> None:
+        pass
+
+
+class FakeDatabase:
+    """
+    Stands in for `Database`, every write is recorded rather than applied. While
+    `error` is set writes raise it instead, after `fail_after` more writes succeed. Like
+    psycopg2 the connection is marked closed when a write loses it.
+    """
+
+    def __init__(self) -> None:
+        self.connection = FakeConnection()
+        self.applied: list[tuple[str, dict[str, Any]]] = []
+        self.error: Exception | None = None
+        self.loses_connection = False
+        self.fail_after = 0
+
+    def reconnect(self) -> None:
+        self.connection.closed = 0
+
+    def __getattr__(self, operation: str):
+        return functools.partial(self._write, operation)
+
+    def _write(self, operation: str, **arguments: Any) -> None:
+        if self.error is not None:
+            if self.fail_after <= 0:
+                if self.loses_connection:
+                    self.connection.closed = 2
+                raise self.error
+            self.fail_after -= 1
+        self.applied.append((operation, arguments))
+
+
+@pytest.fixture(name="database")
+def fixture_database() -> FakeDatabase:
+    return FakeDatabase()
+
+
+@pytest.fixture(name="writer")
+def fixture_writer(database: FakeDatabase, tmp_path: Path) -> DatabaseWriter:
+    # Not started, tests drive the writer one step at a time.
+    return DatabaseWriter(
+        cast(Database, database), tmp_path / "pending_writes.jsonl", LOGGER
+    )
+
+
+def lose_connection(database: FakeDatabase) -> None:
+    database.error = psycopg2.OperationalError("server closed the connection")
+    database.loses_connection = True
+
+
+def queue_writes(writer: DatabaseWriter, name: str) -> None:
+    # A match from open to recorded, with heartbeats in between.
+    match = Match.from_dict({**MATCH, "fighter_red_name": name}, LOGGER)
+    writer.update_current_match(name, "Blue", MatchFormat.MATCHMAKING, "A")
+    writer.update_bot_heartbeat()
+    writer.notify_bets_locked(match)
+    writer.record_match(match)
+    writer.update_bot_heartbeat()
+
+
+def apply_queued(writer: DatabaseWriter) -> None:
+    # What `run` does with every queued write while the database is reachable.
+    while not writer.queue.empty():
+        pending_write = writer.queue.get_nowait()
+        if not writer._apply(pending_write):  # pylint: disable=protected-access
+            writer._spill([pending_write])  # pylint: disable=protected-access
+        if writer.spill_path.exists():
+            writer._spill_queued()  # pylint: disable=protected-access
+
+
+def spilled_writes(writer: DatabaseWriter) -> list[dict[str, Any]]:
+    return [
+        json.loads(line)
+        for line in writer.spill_path.read_text(encoding="utf-8").splitlines()
+    ]
+
+
+def applied_summary(database: FakeDatabase) -> list[tuple[str, str | None]]:
+    summary = []
+    for operation, arguments in database.applied:
+        if "match" in arguments:
+            name = arguments["match"].fighter_red_name
+        else:
+            name = arguments.get("fighter_red_name")
+        summary.append((operation, name))
+    return summary
+
+
+def test_spills_writes_in_order_without_heartbeats(writer, database) -> None:
+    lose_connection(database)
+    queue_writes(writer, "First")
+    queue_writes(writer, "Second")
+    apply_queued(writer)
+
+    assert database.applied == []
+    assert [
+        (spilled["operation"], spilled["arguments"].get("fighter_red_name"))
+        for spilled in spilled_writes(writer)
+    ] == [
+        ("update_current_match", "First"),
+        ("notify_bets_locked", None),
+        ("record_match", None),
+        ("update_current_match", "Second"),
+        ("notify_bets_locked", None),
+        ("record_match", None),
+    ]
+
+
+def test_replays_spilled_writes_before_new_ones(writer, database) -> None:
+    lose_connection(database)
+    queue_writes(writer, "First")
+    apply_queued(writer)
+    record_match = spilled_writes(writer)[-1]
+
+    # Writes made while the database comes back are spilled behind the others.
+    queue_writes(writer, "Second")
+    database.error = None
+    writer._spill_queued()  # pylint: disable=protected-access
+    assert writer._replay()  # pylint: disable=protected-access
+
+    assert not writer.spill_path.exists()
+    assert applied_summary(database) == [
+        ("update_current_match", "First"),
+        ("notify_bets_locked", "First"),
+        ("record_match", "First"),
+        ("update_current_match", "Second"),
+        ("notify_bets_locked", "Second"),
+        ("record_match", "Second"),
+    ]
+    # The replayed match keeps the key it was queued with, should it have been
+    # recorded before the connection was lost it is not recorded again.
+    assert database.applied[2][1]["write_key"] == record_match["arguments"]["write_key"]
+    assert database.applied[2][1]["write_key"] != database.applied[5][1]["write_key"]
+
+
+def test_replay_keeps_writes_after_lost_connection(writer, database) -> None:
+    lose_connection(database)
+    queue_writes(writer, "First")
+    apply_queued(writer)
+    lines = writer.spill_path.read_text(encoding="utf-8").splitlines()
+
+    database.fail_after = 1
+    assert not writer._replay()  # pylint: disable=protected-access
+
+    assert applied_summary(database) == [("update_current_match", "First")]
+    assert writer.spill_path.read_text(encoding="utf-8").splitlines() == lines[1:]
+
+
+def test_replay_skips_malformed_writes(writer, database) -> None:
+    writer.spill_path.write_text(
+        '{"operation": "update_bot_heart\n'
+        + json.dumps(
+            {
+                "operation": "notify_bets_locked",
+                "arguments": {"match": MATCH},
+                "queued_at": 0,
+            }
+        )
+        + "\n",
+        encoding="utf-8",
+    )
+    assert writer._replay()  # pylint: disable=protected-access
+    assert applied_summary(database) == [("notify_bets_locked", "Red")]
+
+
+@pytest.mark.parametrize(
+    "error, closed, unavailable",
+    [
+        (psycopg2.InterfaceError("connection already closed"), 1, True),
+        (psycopg2.OperationalError("server closed the connection"), 2, True),
+        (psycopg2.OperationalError("could not serialize access"), 0, False),
+        (psycopg2.extensions.QueryCanceledError("statement timeout"), 0, False),
+        (psycopg2.extensions.TransactionRollbackError("deadlock detected"), 0, False),
+        (psycopg2.IntegrityError("violates foreign key constraint"), 0, False),
+        (ValueError("unexpected"), 0, False),
+    ],
+)
+def test_only_lost_connections_are_retried(
+    writer, database, error, closed, unavailable
+) -> None:
+    database.connection.closed = closed
+    database.error = error
+    writer.update_current_match("Red", "Blue", MatchFormat.MATCHMAKING, "A")
+    apply_queued(writer)
+
+    # Writes which failed for any other reason are dropped rather than hold up the
+    # writes behind them forever.
+    assert writer.spill_path.exists() is unavailable
+    assert database.applied == []
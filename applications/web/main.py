@@ -66,6 +66,7 @@ if __name__ == "__main__":
 
     if os.environ.get("PRODUCTION") is not None:
         from paste.translogger import TransLogger
+        from prometheus_client import start_http_server
         from waitress import serve
         from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -76,11 +77,28 @@ if __name__ == "__main__":
         app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
         app.debug = False
 
+        # Metrics are kept off the public port, by default only the host itself can
+        # reach them.
+        if (metrics_port := os.environ.get("WEB_METRICS_PORT")) is not None:
+            metrics_addr = os.environ.get("WEB_METRICS_ADDR", "127.0.0.1")
+            try:
+                start_http_server(int(metrics_port), addr=metrics_addr)
+                logging.info("Serving metrics on %s:%s", metrics_addr, metrics_port)
+            except OSError:
+                # Metrics are not worth failing to serve the API over.
+                logging.warning(
+                    "Could not serve metrics on %s:%s.",
+                    metrics_addr,
+                    metrics_port,
+                    exc_info=True,
+                )
+
         serve(
             TransLogger(app, setup_console_handler=False),
             host="0.0.0.0",
             port=5000,
             url_scheme="https",
+            threads=int(os.environ.get("WEB_THREADS", "48")),
         )
     else:
         logging.info("Running in development mode")
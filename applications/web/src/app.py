@@ -1,29 +1,66 @@
+import logging
 import os
+import queue
+import threading
+import time
 from pathlib import Path
+from typing import Any, Iterator
 
-import psycopg2
+from flask import Response, g, request
 from flask.helpers import send_file
 from flask.json import jsonify
 from flask_openapi3 import Info, OpenAPI, Tag
+from prometheus_client import REGISTRY
+from psycopg2.extensions import QueryCanceledError
 
 from src.biz import (
-    get_current_match_info,
-    get_fighter_by_id,
-    get_match_by_id,
+    export_fighters,
+    export_matches,
+    get_current_match_snapshot,
+    get_fighter_json,
+    get_fighter_rank_json,
+    get_fighter_stats,
+    get_fighters_json,
+    get_leaderboard,
+    get_match_json,
+    get_matches_json,
     list_fighters,
     list_matches,
+    on_match_event,
+    search_fighters,
 )
+from src.events import EventBroadcaster, EventListener, TooManySubscribers
+from src.metrics import REQUEST_DURATION, REQUESTS, RESPONSE_SIZE, PoolCollector
+from src.pool import ConnectionPool, PoolTimeout
 from src.schemas import (
+    BatchFighterQuery,
+    BatchFighterResponse,
+    BatchMatchQuery,
+    BatchMatchResponse,
+    CurrentMatchInfoQuery,
     CurrentMatchInfoResponse,
+    ExportFighterQuery,
+    ExportMatchQuery,
+    ExportQuery,
     FighterModel,
+    FighterRankQuery,
+    FighterStatsModel,
+    FighterStatsQuery,
     IdPath,
+    LeaderboardFighterModel,
+    LeaderboardQuery,
+    LeaderboardResponse,
     ListFighterQuery,
     ListFighterResponse,
     ListMatchQuery,
     ListMatchResponse,
     MatchModel,
+    SearchFighterQuery,
+    SearchFighterResponse,
 )
 
+logger = logging.getLogger(__name__)
+
 info = Info(
     title="SaltyBoy API",
     version="2.1.0",
@@ -36,6 +73,8 @@ bear in mind the following:
 - Do not abuse the API. By this I mean feel free to scrape in short high bursts but 
     don't spam the API with something in a constant `while` loop for example. After all 
     this runs on a very cheap Vultr instance :)
+- If you want all fighters or matches use the `GET /api/export/` endpoints, a single
+    request streams the whole table rather than thousands of paginated ones.
 - If you want new endpoints or a Database dump please ping me on 
     [Github](https://github.com/FranciscoAT/saltyboy). I'm more than happy to review MRs
     for new features and provide PostgreSQL DB dumps.
@@ -47,15 +86,52 @@ bear in mind the following:
 )
 app = OpenAPI(__name__, info=info)
 
-pg_pool = psycopg2.pool.ThreadedConnectionPool(
+pg_connection_kwargs: dict[str, Any] = {
+    "user": os.environ["POSTGRES_USER"],
+    "password": os.environ["POSTGRES_PASSWORD"],
+    "host": os.environ["POSTGRES_HOST"],
+    "port": int(os.environ["POSTGRES_PORT"]),
+    "database": os.environ["POSTGRES_DB"],
+}
+
+# Requests wait for a connection to free up rather than failing outright when every
+# connection is in use, and queries taking too long are cancelled.
+pg_pool = ConnectionPool(
     1,
     20,
-    user=os.environ["POSTGRES_USER"],
-    password=os.environ["POSTGRES_PASSWORD"],
-    host=os.environ["POSTGRES_HOST"],
-    port=int(os.environ["POSTGRES_PORT"]),
-    database=os.environ["POSTGRES_DB"],
+    checkout_timeout=float(os.environ.get("WEB_POOL_TIMEOUT", "5")),
+    statement_timeout=float(os.environ.get("WEB_STATEMENT_TIMEOUT", "10")),
+    **pg_connection_kwargs,
+)
+REGISTRY.register(PoolCollector(pg_pool))
+
+# Every running export holds onto a database connection and a server thread for as long
+# as it takes the client to download it.
+max_exports = int(os.environ.get("WEB_MAX_EXPORTS", "4"))
+export_slots = threading.BoundedSemaphore(max_exports)
+
+# Waitress serves every request from a fixed pool of threads, and every open event
+# stream holds onto one of them for as long as the client stays connected. Streams are
+# capped so that at least `RESERVED_THREADS` are always left over for every other
+# request, whatever `WEB_MAX_EVENT_STREAMS` is set to.
+RESERVED_THREADS = 8
+web_threads = int(os.environ.get("WEB_THREADS", "48"))
+max_event_streams = int(os.environ.get("WEB_MAX_EVENT_STREAMS", "32"))
+available_threads = max(web_threads - max_exports - RESERVED_THREADS, 0)
+if max_event_streams > available_threads:
+    logger.warning(
+        "WEB_MAX_EVENT_STREAMS=%s leaves too few of the %s server threads for other "
+        "requests, limiting event streams to %s.",
+        max_event_streams,
+        web_threads,
+        available_threads,
+    )
+    max_event_streams = available_threads
+event_broadcaster = EventBroadcaster(max_subscribers=max_event_streams)
+event_listener = EventListener(
+    event_broadcaster, on_event=[on_match_event], **pg_connection_kwargs
 )
+event_listener.start()
 
 fighter_tag = Tag(name="Fighter", description="Fighters recorded by SaltyBoy.")
 match_tag = Tag(
@@ -65,6 +141,10 @@ match_tag = Tag(
         "recorded. Exhibition matches are not."
     ),
 )
+export_tag = Tag(
+    name="Export",
+    description="Whole tables of SaltyBoy, optionally filtered, in a single download.",
+)
 current_match_tag = Tag(
     name="Current Match",
     description=(
@@ -76,6 +156,36 @@ current_match_tag = Tag(
 public_path = Path(__file__).parent.parent
 
 
+# === Metrics ===
+@app.before_request
+def start_request_timer() -> None:
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response: Response) -> Response:
+    # Labelled by route rather than path, so every ID does not get series of its own.
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUESTS.labels(route, request.method, response.status_code).inc()
+    if (started := g.get("request_started")) is not None:
+        REQUEST_DURATION.labels(route, request.method).observe(
+            time.perf_counter() - started
+        )
+    if not response.is_streamed and response.content_length is not None:
+        RESPONSE_SIZE.labels(route).observe(response.content_length)
+    return response
+
+
+@app.errorhandler(PoolTimeout)
+def pool_timeout_error(e: PoolTimeout):
+    return "Too many requests in flight, please try again later.", 503
+
+
+@app.errorhandler(QueryCanceledError)
+def query_canceled_error(e: QueryCanceledError):
+    return "Request took too long, try narrowing it down.", 503
+
+
 # === Web Endpoints ===
 @app.route("/", methods=["GET"])
 def file_index_request():
@@ -121,8 +231,14 @@ def api_list_fighters(query: ListFighterQuery):
     that the real tier of the fighter may not be reflected in SaltyBoy until it sees the
     fighter again. At which point the tier of the fighter is updated, and the Tier ELO
     is also reset as per the above section.
+
+    **Pagination**
+
+    Results are ordered by ID unless `order_by` says otherwise. When scraping prefer
+    following `next_cursor` through the `cursor` query parameter over incrementing
+    `page`, deep pages are then just as fast as the first one.
     """
-    return jsonify(list_fighters(pg_pool, query).model_dump())
+    return Response(list_fighters(pg_pool, query), mimetype="application/json")
 
 
 @app.get(
@@ -136,11 +252,105 @@ def api_get_fighter(path: IdPath):
     """
     Get a specific Fighter by ID.
 
-    **Note**: If you want to scrape the database I would recommend using the
-    `GET /api/fighter/` pagination endpoint instead.
+    **Note**: If you want many fighters use `GET /api/fighter/batch/`, and if you want
+    to scrape the database I would recommend using the `GET /api/export/fighter/`
+    endpoint instead.
     """
-    if fighter := get_fighter_by_id(pg_pool, path.id_):
-        return jsonify(fighter.model_dump())
+    if fighter := get_fighter_json(pg_pool, path.id_):
+        return Response(fighter, mimetype="application/json")
+    return "Fighter not found", 404
+
+
+@app.get(
+    "/api/fighter/batch/",
+    summary="Get fighters in batch",
+    responses={200: BatchFighterResponse},
+    tags=[fighter_tag],
+    strict_slashes=False,
+)
+def api_get_fighters(query: BatchFighterQuery):
+    """
+    Get many Fighters at once by ID, by name, or both.
+
+    Fighters are returned keyed by the requested IDs and names, those which were not
+    found are `null`. Up to 500 IDs and 500 names can be asked for in a single request,
+    prefer this over getting fighters one at a time.
+    """
+    return Response(get_fighters_json(pg_pool, query), mimetype="application/json")
+
+
+@app.get(
+    "/api/fighter/search/",
+    summary="Search fighters",
+    responses={200: SearchFighterResponse},
+    tags=[fighter_tag],
+    strict_slashes=False,
+)
+def api_search_fighters(query: SearchFighterQuery):
+    """
+    Search Fighters by name, ignoring case.
+
+    By default fighters with a name similar to `name` are returned, best match first,
+    so misspelt names are still found. Use `mode=prefix` for fighters whose name starts
+    with `name`, eg. to autocomplete, or `mode=exact` for the whole name.
+    """
+    return Response(search_fighters(pg_pool, query), mimetype="application/json")
+
+
+@app.get(
+    "/api/fighter/leaderboard/",
+    summary="Get fighter leaderboard",
+    responses={200: LeaderboardResponse},
+    tags=[fighter_tag],
+    strict_slashes=False,
+)
+def api_get_leaderboard(query: LeaderboardQuery):
+    """
+    Ranks Fighters from the highest rated down, with their rank and percentile.
+
+    Fighters of a `tier` are ranked by their Tier ELO against the rest of the tier,
+    otherwise every fighter is ranked by ELO. Fighters rated the same share a rank.
+    """
+    return Response(get_leaderboard(pg_pool, query), mimetype="application/json")
+
+
+@app.get(
+    "/api/fighter/<int:id_>/rank/",
+    summary="Get fighter rank",
+    responses={200: LeaderboardFighterModel},
+    tags=[fighter_tag],
+    strict_slashes=False,
+)
+def api_get_fighter_rank(path: IdPath, query: FighterRankQuery):
+    """
+    Get the leaderboard rank and percentile of a specific Fighter by ID.
+
+    The fighter is ranked by its Tier ELO against the rest of its tier, or by ELO
+    against every fighter with `overall`, as `GET /api/fighter/leaderboard/` would rank
+    it. This is much cheaper than paging through the leaderboard to find it.
+    """
+    if fighter := get_fighter_rank_json(pg_pool, path.id_, query):
+        return Response(fighter, mimetype="application/json")
+    return "Fighter not found", 404
+
+
+@app.get(
+    "/api/fighter/<int:id_>/stats/",
+    summary="Get fighter stats",
+    responses={200: FighterStatsModel},
+    tags=[fighter_tag],
+    strict_slashes=False,
+)
+def api_get_fighter_stats(path: IdPath, query: FighterStatsQuery):
+    """
+    Get aggregated statistics of a specific Fighter by ID.
+
+    Includes the overall record, the record within a tier, optionally the head to head
+    record against another fighter, betting averages, and the most recent matches. This
+    is much cheaper than fetching every match of the fighter and aggregating them.
+    """
+    if stats := get_fighter_stats(pg_pool, path.id_, query):
+        return jsonify(stats.model_dump())
     return "Fighter not found", 404
 
 
@@ -159,8 +369,30 @@ def api_list_matches(query: ListMatchQuery):
     The `fighter`, `fighter_blue`, `fighter_red`, and `winner` query parameters are the
     ID of the associated Fighter in the database. In order to map the name of a fighter
     to an ID use the `GET /api/fighter/` endpoint.
+
+    Results are ordered by ID. When scraping prefer following `next_cursor` through the
+    `cursor` query parameter over incrementing `page`, deep pages are then just as fast
+    as the first one.
     """
-    return jsonify(list_matches(pg_pool, query).model_dump())
+    return Response(list_matches(pg_pool, query), mimetype="application/json")
+
+
+@app.get(
+    "/api/match/batch/",
+    summary="Get matches in batch",
+    responses={200: BatchMatchResponse},
+    tags=[match_tag],
+    strict_slashes=False,
+)
+def api_get_matches(query: BatchMatchQuery):
+    """
+    Get many Matches at once by ID.
+
+    Matches are returned keyed by the requested IDs, those which were not found are
+    `null`. Up to 500 IDs can be asked for in a single request, prefer this over
+    getting matches one at a time.
+    """
+    return Response(get_matches_json(pg_pool, query), mimetype="application/json")
 
 
 @app.get(
@@ -174,14 +406,74 @@ def api_get_match(path: IdPath):
     """
     Get a specific Match by ID.
 
-    **Note**: If you want to scrape the database I would recommend using the
-    `GET /api/match/` pagination endpoint instead.
+    **Note**: If you want many matches use `GET /api/match/batch/`, and if you want
+    to scrape the database I would recommend using the `GET /api/export/match/`
+    endpoint instead.
     """
-    if match_ := get_match_by_id(pg_pool, path.id_):
-        return jsonify(match_.model_dump())
+    if match_ := get_match_json(pg_pool, path.id_):
+        return Response(match_, mimetype="application/json")
     return "Match not found", 404
 
 
+# Exports
+def export_response(
+    name: str, query: ExportQuery, export: Iterator[bytes]
+) -> Response | tuple[str, int]:
+    # Exports are generators, nothing is read from the database until the response is
+    # iterated over. The slot is released once the response is closed.
+    if not export_slots.acquire(blocking=False):  # pylint: disable=consider-using-with
+        return "Too many exports running, please try again later.", 503
+
+    response = Response(
+        export,
+        mimetype="application/gzip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{query.format}.gz"'
+        },
+    )
+    # Called once the response is done with, whether or not it was fully sent.
+    response.call_on_close(export_slots.release)
+    return response
+
+
+@app.get(
+    "/api/export/fighter/",
+    summary="Export Fighters",
+    tags=[export_tag],
+    strict_slashes=False,
+)
+def api_export_fighters(query: ExportFighterQuery):
+    """
+    Export every Fighter, optionally filtered, as a gzip compressed file.
+
+    Takes the same filters as `GET /api/fighter/`. Fighters are ordered by ID and are in
+    the same shape as its `results`, either one JSON object per line or as CSV rows.
+    The file is streamed as it is read from the database, so downloading starts
+    straight away. Only a few exports can run at once, a `503` is returned when the
+    limit is reached.
+    """
+    return export_response("fighter", query, export_fighters(pg_pool, query))
+
+
+@app.get(
+    "/api/export/match/",
+    summary="Export Matches",
+    tags=[export_tag],
+    strict_slashes=False,
+)
+def api_export_matches(query: ExportMatchQuery):
+    """
+    Export every Match, optionally filtered, as a gzip compressed file.
+
+    Takes the same filters as `GET /api/match/`. Matches are ordered by ID and are in
+    the same shape as its `results`, either one JSON object per line or as CSV rows.
+    The file is streamed as it is read from the database, so downloading starts
+    straight away. Only a few exports can run at once, a `503` is returned when the
+    limit is reached.
+    """
+    return export_response("match", query, export_matches(pg_pool, query))
+
+
 # Current Match Info
 @app.get(
     "/api/current_match_info/",
@@ -190,7 +482,7 @@ def api_get_match(path: IdPath):
     responses={200: CurrentMatchInfoResponse},
     strict_slashes=False,
 )
-def api_current_match_info():
+def api_current_match_info(query: CurrentMatchInfoQuery):
     """
     Returns the details of the current match from SaltyBet.
 
@@ -207,6 +499,11 @@ def api_current_match_info():
         found in the `GET /api/fighter/` endpoints. However, in them will be a new field
         `matches` which will list **all** matches in the database associated with the
         `fighter_red` or `fighter_blue` Fighter of the current match.
+    - Setting `stats` replaces `matches` with a compact `stats` field, the same as in
+        `GET /api/fighter/{id_}/stats/`. The tier record is for the tier of the current
+        match and the head to head record is against the opposing fighter. `matches`
+        is then only included when `include_matches` is also set. This is strongly
+        recommended for veteran fighters with thousands of matches.
     - `match_format` contains the format of the current match. Important to note that if
         the match format is exhibition then it is always the case that
         `fighter_blue_info` and `fighter_red_info` will have `null` values, as SaltyBoy
@@ -223,7 +520,65 @@ def api_current_match_info():
         - The upstream bot that scrapes Twitch chat ran into an unrecoverable error.
             Although worth noting that this does not happen much if at all anymore.
         - Waif4U bot goes down in Twitch chat. Also an extremely rare occurrence.
+    - Responses carry an `ETag` which only changes when the current match does. When
+        polling send it back in an `If-None-Match` header and a `304 Not Modified`
+        without a body will be returned until a new match starts.
+    """
+    snapshot = get_current_match_snapshot(pg_pool, query)
+    response = Response(snapshot.body, mimetype="application/json")
+    response.set_etag(snapshot.etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+@app.get(
+    "/api/current_match_info/stream/",
+    summary="Current Match Events",
+    tags=[current_match_tag],
+    strict_slashes=False,
+)
+def api_current_match_events():
+    """
+    Stream of current match events as
+    [Server-Sent Events](https://developer.mozilla.org/en-US/docs/Web/API/Server-sent_events).
+
+    Instead of polling `GET /api/current_match_info/` subscribe to this endpoint, for
+    example with an `EventSource`, and an event is pushed as soon as the bot sees it:
+
+    - `open`: Bets are open for a new match. Data contains `fighter_red`,
+        `fighter_blue`, `tier`, `match_format` and `updated_at`. This is the moment to
+        fetch `GET /api/current_match_info/`.
+    - `locked`: Bets are locked. Data contains the fighter names, `bet_red`,
+        `bet_blue`, `streak_red` and `streak_blue`.
+    - `winner`: The match was recorded. Data contains `match_id`, the fighter names,
+        `winner` and `colour`.
+
+    A comment is sent every 15 seconds to keep the connection alive. Every open stream
+    holds onto a server thread, so the number of concurrent streams is a hard limit well
+    below the number of server threads. When the limit is reached a `503` is returned
+    and clients should fall back to polling.
     """
-    if current_match_info := get_current_match_info(pg_pool):
-        return jsonify(current_match_info.model_dump())
-    return jsonify({})
+    try:
+        subscriber = event_broadcaster.subscribe()
+    except TooManySubscribers:
+        return "Too many event streams open, please poll instead.", 503
+
+    def stream():
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event, data = subscriber.get(timeout=15)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event}\ndata: {data}\n\n"
+
+    response = Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # The server closes the response however it ends, including when the client is gone
+    # before the stream was ever iterated, which a `finally` in `stream` would miss.
+    response.call_on_close(lambda: event_broadcaster.unsubscribe(subscriber))
+    return response
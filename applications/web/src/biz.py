@@ -1,112 +1,596 @@
-from typing import Callable, TypeVar
+import csv
+import io
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Iterator, TypeVar
 
-from psycopg2.extras import DictCursor
-from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import DictCursor, DictRow
+from pydantic import BaseModel
 
+from src.cache import Snapshot, SnapshotCache, TTLCache
 from src.database import (
-    db_fighter_count,
+    db_estimate_fighter_count,
+    db_estimate_match_count,
+    db_export_fighters,
+    db_export_matches,
     db_get_current_match,
+    db_get_current_match_updated_at,
     db_get_fighter_by_id,
-    db_get_match_by_id,
-    db_get_match_count,
+    db_get_fighter_by_name,
+    db_get_fighter_json,
+    db_get_fighter_rank_json,
+    db_get_fighter_stats,
+    db_get_fighters_json,
+    db_get_head_to_head,
+    db_get_latest_match_id,
+    db_get_leaderboard,
+    db_get_match_json,
+    db_get_matches_json,
+    db_list_fighter_matches,
     db_list_fighters,
     db_list_matches,
+    db_search_fighters,
 )
+from src.pool import ConnectionPool
 from src.schemas import (
+    BatchFighterQuery,
+    BatchMatchQuery,
+    CountMode,
+    CurrentMatchInfoQuery,
     CurrentMatchInfoResponse,
+    ExportFighterQuery,
+    ExportFormat,
+    ExportMatchQuery,
     ExtendedFighterModel,
     FighterModel,
+    FighterRankQuery,
+    FighterStatsModel,
+    FighterStatsQuery,
+    LeaderboardFighterModel,
+    LeaderboardQuery,
     ListFighterQuery,
-    ListFighterResponse,
     ListMatchQuery,
-    ListMatchResponse,
     MatchModel,
+    PaginationQuery,
+    RecordModel,
+    SearchFighterModel,
+    SearchFighterQuery,
+    Tier,
+    encode_cursor,
 )
 
 RT = TypeVar("RT")
 
+# Exact counts keyed by the table and filters used. Fighters only ever change when a
+# match is recorded so the latest match ID is used to invalidate all entries as soon as
+# the bot records a new match.
+count_cache: TTLCache[int] = TTLCache(ttl=300)
 
-def pg_cursor(func: Callable[..., RT]):
-    def inner(pg_pool: ThreadedConnectionPool, *args, **kwargs) -> RT:
-        pg_connection = pg_pool.getconn()
-        pg_cursor_ = pg_connection.cursor(cursor_factory=DictCursor)
-        try:
-            response = func(pg_cursor_, *args, **kwargs)
-        finally:
-            pg_cursor_.close()
-            pg_pool.putconn(pg_connection)
+# Serialized current match responses. These are rebuilt only when the bot writes a new
+# current match, every poller in between is served the same prebuilt body.
+current_match_snapshots = SnapshotCache(check_interval=2)
+
+# Rows fetched from the database at a time when exporting. Memory use is bounded by a
+# single batch however large the export is.
+EXPORT_BATCH_SIZE = 5000
 
-        return response
+
+def pg_cursor(func: Callable[..., RT]):
+    # The connection is handed back as soon as `func` returns, anything which does not
+    # need the database, eg. building response models, belongs outside of `func`.
+    def inner(pg_pool: ConnectionPool, *args, **kwargs) -> RT:
+        with (
+            pg_pool.connection() as pg_connection,
+            pg_connection.cursor(cursor_factory=DictCursor) as pg_cursor_,
+        ):
+            return func(pg_cursor_, *args, **kwargs)
 
     return inner
 
 
+def get_json_fields(model: type[BaseModel]) -> dict[str, Any]:
+    return {name: field.annotation for name, field in model.model_fields.items()}
+
+
+# Responses are rendered as JSON by Postgres, the models only document them.
+FIGHTER_JSON_FIELDS = get_json_fields(FighterModel)
+MATCH_JSON_FIELDS = get_json_fields(MatchModel)
+SEARCH_FIGHTER_JSON_FIELDS = get_json_fields(SearchFighterModel)
+LEADERBOARD_JSON_FIELDS = get_json_fields(LeaderboardFighterModel)
+
+
+def render_page(
+    query_args: PaginationQuery, count: int | None, db_page: DictRow
+) -> bytes:
+    # Keys are written in sorted order, as `jsonify` would. A short page means we've hit
+    # the end of the results.
+    next_cursor = (
+        encode_cursor(*db_page["last_key"])
+        if db_page["length"] == query_args.page_size
+        else None
+    )
+    return (
+        f'{{"count":{json.dumps(count)},"next_cursor":{json.dumps(next_cursor)},'
+        f'"page":{query_args.page},"page_size":{query_args.page_size},'
+        f'"results":{db_page["results"]}}}\n'
+    ).encode()
+
+
+def render_json_object(values: dict[str, str | None]) -> str:
+    # Values are already rendered as JSON, `None` stands in for `null`. Keys are written
+    # in sorted order, as `jsonify` would.
+    items = ",".join(
+        f"{json.dumps(key)}:{'null' if value is None else value}"
+        for key, value in sorted(values.items())
+    )
+    return f"{{{items}}}"
+
+
+def list_page(
+    cursor,
+    table: str,
+    list_func: Callable[..., DictRow],
+    estimate_func: Callable[..., int],
+    query_args: PaginationQuery,
+    fields: dict[str, type],
+    **list_kwargs,
+) -> bytes:
+    dumped_args = query_args.model_dump(exclude={"cursor", "count_mode"})
+
+    def fetch_page(count: bool = False) -> DictRow:
+        return list_func(
+            cursor,
+            fields,
+            **dumped_args,
+            **list_kwargs,
+            after_id=query_args.after_id,
+            count=count,
+        )
+
+    if query_args.count_mode == CountMode.NONE:
+        return render_page(query_args, None, fetch_page())
+
+    if query_args.count_mode == CountMode.ESTIMATE:
+        return render_page(
+            query_args, estimate_func(cursor, **dumped_args), fetch_page()
+        )
+
+    # The order of the results does not change how many there are.
+    cache_key = (
+        table,
+        tuple(
+            sorted(
+                (key, value)
+                for key, value in dumped_args.items()
+                if value is not None
+                and key not in PaginationQuery.model_fields
+                and key != "order_by"
+            )
+        ),
+    )
+    latest_match_id = db_get_latest_match_id(cursor)
+    if (count := count_cache.get(cache_key, latest_match_id)) is not None:
+        return render_page(query_args, count, fetch_page())
+
+    # Counted along with the page, rather than with a query of its own.
+    db_page = fetch_page(count=True)
+    count_cache.set(cache_key, db_page["total"], latest_match_id)
+    return render_page(query_args, db_page["total"], db_page)
+
+
+def export_rows(
+    pg_pool: ConnectionPool,
+    export_func: Callable[..., None],
+    columns: list[str],
+    export_format: ExportFormat,
+    filters: dict[str, Any],
+) -> Iterator[bytes]:
+    # Holds onto a connection until the export is done, or the client goes away and the
+    # generator is closed.
+    pg_connection = pg_pool.getconn()
+    # Named cursors live on the server, rows are only sent over as they are fetched.
+    pg_cursor_ = pg_connection.cursor(name="export")
+    # `wbits=31` wraps the deflate stream in a gzip header and trailer.
+    compressor = zlib.compressobj(wbits=31)
+    json_encoder = json.JSONEncoder(default=serialize_value)
+    try:
+        # Exports take as long as they take, how many run at once is limited instead.
+        with pg_connection.cursor() as settings_cursor:
+            settings_cursor.execute("SET LOCAL statement_timeout = 0")
+        export_func(pg_cursor_, columns, **filters)
+        if export_format == ExportFormat.CSV:
+            yield compressor.compress(serialize_csv([columns]))
+        while rows := pg_cursor_.fetchmany(EXPORT_BATCH_SIZE):
+            if export_format == ExportFormat.CSV:
+                chunk = serialize_csv(
+                    [[serialize_value(value) for value in row] for row in rows]
+                )
+            else:
+                chunk = "".join(
+                    f"{json_encoder.encode(dict(zip(columns, row)))}\n" for row in rows
+                ).encode()
+            if compressed := compressor.compress(chunk):
+                yield compressed
+        yield compressor.flush()
+    finally:
+        pg_cursor_.close()
+        pg_pool.putconn(pg_connection)
+
+
+def serialize_value(value: Any) -> Any:
+    # Datetimes are written out the same way the API models serialize them.
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def serialize_csv(rows: list[list[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
 # === Fighters ===
 @pg_cursor
-def get_fighter_by_id(cursor, id_: int) -> FighterModel | None:
-    if db_fighter := db_get_fighter_by_id(cursor, id_):
-        return FighterModel(**db_fighter)
+def get_fighter_json(cursor, id_: int) -> bytes | None:
+    if db_fighter := db_get_fighter_json(cursor, FIGHTER_JSON_FIELDS, id_):
+        return f"{db_fighter}\n".encode()
     return None
 
 
 @pg_cursor
-def list_fighters(cursor, query_args: ListFighterQuery) -> ListFighterResponse:
-    dumped_args = query_args.model_dump()
-    return ListFighterResponse(
-        page=query_args.page,
-        page_size=query_args.page_size,
-        count=db_fighter_count(cursor, **dumped_args),
-        results=[FighterModel(**x) for x in db_list_fighters(cursor, **dumped_args)],
+def get_fighters_json(cursor, query_args: BatchFighterQuery) -> bytes:
+    by_id: dict[str, str | None] = dict.fromkeys(map(str, query_args.ids))
+    by_name: dict[str, str | None] = dict.fromkeys(query_args.names)
+    for db_fighter in db_get_fighters_json(
+        cursor, FIGHTER_JSON_FIELDS, query_args.ids, query_args.names
+    ):
+        # A fighter may have been asked for by both ID and name.
+        if (id_ := str(db_fighter["id"])) in by_id:
+            by_id[id_] = db_fighter["json"]
+        if db_fighter["name"] in by_name:
+            by_name[db_fighter["name"]] = db_fighter["json"]
+    body = render_json_object(
+        {"by_id": render_json_object(by_id), "by_name": render_json_object(by_name)}
+    )
+    return f"{body}\n".encode()
+
+
+@pg_cursor
+def list_fighters(cursor, query_args: ListFighterQuery) -> bytes:
+    return list_page(
+        cursor,
+        "fighter",
+        db_list_fighters,
+        db_estimate_fighter_count,
+        query_args,
+        FIGHTER_JSON_FIELDS,
+        after_value=query_args.after_value,
+    )
+
+
+@pg_cursor
+def get_leaderboard(cursor, query_args: LeaderboardQuery) -> bytes:
+    db_leaderboard = db_get_leaderboard(
+        cursor,
+        LEADERBOARD_JSON_FIELDS,
+        query_args.tier,
+        query_args.page,
+        query_args.page_size,
+    )
+    # Keys are written in sorted order, as `jsonify` would.
+    return (
+        f'{{"page":{query_args.page},"page_size":{query_args.page_size},'
+        f'"results":{db_leaderboard["results"]},"total":{db_leaderboard["total"]}}}\n'
+    ).encode()
+
+
+@pg_cursor
+def get_fighter_rank_json(
+    cursor, id_: int, query_args: FighterRankQuery
+) -> bytes | None:
+    if db_fighter := db_get_fighter_rank_json(
+        cursor, LEADERBOARD_JSON_FIELDS, id_, query_args.overall
+    ):
+        return f"{db_fighter}\n".encode()
+    return None
+
+
+@pg_cursor
+def search_fighters(cursor, query_args: SearchFighterQuery) -> bytes:
+    results = db_search_fighters(
+        cursor,
+        SEARCH_FIGHTER_JSON_FIELDS,
+        query_args.name,
+        query_args.mode,
+        query_args.limit,
+    )
+    return f'{{"results":{results}}}\n'.encode()
+
+
+def export_fighters(
+    pg_pool: ConnectionPool, query_args: ExportFighterQuery
+) -> Iterator[bytes]:
+    return export_rows(
+        pg_pool,
+        db_export_fighters,
+        list(FighterModel.model_fields),
+        query_args.format,
+        query_args.model_dump(exclude={"format"}),
+    )
+
+
+@dataclass
+class FighterStatsRows:
+    tier: Tier
+    stats: DictRow
+    head_to_head: DictRow | None
+    recent_matches: list[DictRow]
+
+
+def get_fighter_stats(
+    pg_pool: ConnectionPool, id_: int, query_args: FighterStatsQuery
+) -> FighterStatsModel | None:
+    if fighter_stats_rows := fetch_fighter_stats(pg_pool, id_, query_args):
+        return build_fighter_stats(fighter_stats_rows)
+    return None
+
+
+@pg_cursor
+def fetch_fighter_stats(
+    cursor, id_: int, query_args: FighterStatsQuery
+) -> FighterStatsRows | None:
+    if db_fighter := db_get_fighter_by_id(cursor, id_):
+        return fetch_fighter_stats_rows(
+            cursor,
+            db_fighter,
+            tier=query_args.tier,
+            opponent=query_args.opponent,
+            recent=query_args.recent,
+        )
+    return None
+
+
+def fetch_fighter_stats_rows(
+    cursor,
+    fighter: DictRow,
+    tier: str | None,
+    opponent: int | None,
+    recent: int,
+) -> FighterStatsRows:
+    tier = Tier(tier or fighter["tier"])
+    return FighterStatsRows(
+        tier=tier,
+        stats=db_get_fighter_stats(cursor, fighter["id"], tier=tier),
+        head_to_head=(
+            db_get_head_to_head(cursor, fighter["id"], opponent)
+            if opponent is not None
+            else None
+        ),
+        recent_matches=(
+            db_list_fighter_matches(cursor, fighter["id"], limit=recent)
+            if recent
+            else []
+        ),
+    )
+
+
+def build_fighter_stats(fighter_stats_rows: FighterStatsRows) -> FighterStatsModel:
+    db_stats = fighter_stats_rows.stats
+    db_head_to_head = fighter_stats_rows.head_to_head
+    return FighterStatsModel(
+        record=build_record(db_stats["matches"], db_stats["wins"]),
+        tier=fighter_stats_rows.tier,
+        tier_record=build_record(db_stats["tier_matches"], db_stats["tier_wins"]),
+        head_to_head=(
+            build_record(db_head_to_head["matches"], db_head_to_head["wins"])
+            if db_head_to_head
+            else None
+        ),
+        total_bet=db_stats["total_bet"] or 0,
+        total_bet_against=db_stats["total_bet_against"] or 0,
+        average_bet=db_stats["average_bet"],
+        average_bet_share=db_stats["average_bet_share"],
+        average_odds=db_stats["average_odds"],
+        recent_matches=[MatchModel(**x) for x in fighter_stats_rows.recent_matches],
+    )
+
+
+def build_record(matches: int, wins: int) -> RecordModel:
+    return RecordModel(
+        matches=matches,
+        wins=wins,
+        losses=matches - wins,
+        win_rate=wins / matches if matches else None,
     )
 
 
 # === Matches ===
 @pg_cursor
-def get_match_by_id(cursor, id_: int) -> MatchModel | None:
-    if match_ := db_get_match_by_id(cursor, id_):
-        return MatchModel(**match_)
+def get_match_json(cursor, id_: int) -> bytes | None:
+    if db_match := db_get_match_json(cursor, MATCH_JSON_FIELDS, id_):
+        return f"{db_match}\n".encode()
     return None
 
 
 @pg_cursor
-def list_matches(cursor, query_args: ListMatchQuery) -> ListMatchResponse:
-    dumped_args = query_args.model_dump()
-    return ListMatchResponse(
-        page=query_args.page,
-        page_size=query_args.page_size,
-        count=db_get_match_count(cursor, **dumped_args),
-        results=[MatchModel(**x) for x in db_list_matches(cursor, **dumped_args)],
+def get_matches_json(cursor, query_args: BatchMatchQuery) -> bytes:
+    by_id: dict[str, str | None] = dict.fromkeys(map(str, query_args.ids))
+    for db_match in db_get_matches_json(cursor, MATCH_JSON_FIELDS, query_args.ids):
+        by_id[str(db_match["id"])] = db_match["json"]
+    return f"{render_json_object({'by_id': render_json_object(by_id)})}\n".encode()
+
+
+@pg_cursor
+def list_matches(cursor, query_args: ListMatchQuery) -> bytes:
+    return list_page(
+        cursor,
+        "match",
+        db_list_matches,
+        db_estimate_match_count,
+        query_args,
+        MATCH_JSON_FIELDS,
+    )
+
+
+def export_matches(
+    pg_pool: ConnectionPool, query_args: ExportMatchQuery
+) -> Iterator[bytes]:
+    return export_rows(
+        pg_pool,
+        db_export_matches,
+        list(MatchModel.model_fields),
+        query_args.format,
+        query_args.model_dump(exclude={"format"}),
     )
 
 
 # === Current Match ===
+def on_match_event(event: str, data: dict) -> None:
+    if event == "open":
+        current_match_snapshots.invalidate()
+
+
+def get_current_match_snapshot(
+    pg_pool: ConnectionPool, query_args: CurrentMatchInfoQuery
+) -> Snapshot:
+    version = current_match_snapshots.get_version(
+        lambda: get_current_match_updated_at(pg_pool)
+    )
+
+    def build_body() -> bytes:
+        current_match_info = get_current_match_info(pg_pool, query_args)
+        # `matches` and `stats` are left out of modes which do not ask for them rather
+        # than being `null`, the default response keeps the shape it always had.
+        omitted: set[str] = set()
+        if not query_args.stats:
+            omitted.add("stats")
+        elif not query_args.include_matches:
+            omitted.add("matches")
+        data = (
+            current_match_info.model_dump(
+                exclude={
+                    "fighter_blue_info": omitted,
+                    "fighter_red_info": omitted,
+                }
+            )
+            if current_match_info
+            else {}
+        )
+        return f"{json.dumps(data, sort_keys=True, separators=(',', ':'))}\n".encode()
+
+    return current_match_snapshots.get_or_build(
+        tuple(query_args.model_dump().items()), version, build_body
+    )
+
+
 @pg_cursor
-def get_current_match_info(cursor) -> CurrentMatchInfoResponse | None:
+def get_current_match_updated_at(cursor) -> datetime | None:
+    return db_get_current_match_updated_at(cursor)
+
+
+@dataclass
+class FighterDetailsRows:
+    fighter: DictRow
+    stats: FighterStatsRows | None
+    matches: list[DictRow] | None
+
+
+@dataclass
+class CurrentMatchRows:
+    current_match: DictRow
+    fighter_red: FighterDetailsRows | None = None
+    fighter_blue: FighterDetailsRows | None = None
+
+
+def get_current_match_info(
+    pg_pool: ConnectionPool, query_args: CurrentMatchInfoQuery
+) -> CurrentMatchInfoResponse | None:
+    if current_match_rows := fetch_current_match(pg_pool, query_args):
+        return build_current_match_info(current_match_rows)
+    return None
+
+
+@pg_cursor
+def fetch_current_match(
+    cursor, query_args: CurrentMatchInfoQuery
+) -> CurrentMatchRows | None:
     current_match = db_get_current_match(cursor)
     if not current_match:
         return None
 
     if current_match["match_format"] == "exhibition":
-        return CurrentMatchInfoResponse(**current_match)
+        return CurrentMatchRows(current_match)
 
-    return CurrentMatchInfoResponse(
-        **current_match,
-        fighter_blue_info=get_fighter_details(cursor, current_match["fighter_blue"]),  # type: ignore
-        fighter_red_info=get_fighter_details(cursor, current_match["fighter_red"]),  # type: ignore
+    fighter_red = db_get_fighter_by_name(cursor, current_match["fighter_red"])
+    fighter_blue = db_get_fighter_by_name(cursor, current_match["fighter_blue"])
+
+    return CurrentMatchRows(
+        current_match,
+        fighter_red=fetch_fighter_details(
+            cursor, fighter_red, fighter_blue, current_match["tier"], query_args
+        ),
+        fighter_blue=fetch_fighter_details(
+            cursor, fighter_blue, fighter_red, current_match["tier"], query_args
+        ),
     )
 
 
-def get_fighter_details(cursor, name: str) -> ExtendedFighterModel | None:
-    cursor.execute("SELECT * FROM fighter WHERE name = %(name)s", {"name": name})
-    fighter = cursor.fetchone()
+def fetch_fighter_details(
+    cursor,
+    fighter: DictRow | None,
+    opponent: DictRow | None,
+    tier: str | None,
+    query_args: CurrentMatchInfoQuery,
+) -> FighterDetailsRows | None:
     if not fighter:
         return None
 
-    cursor.execute(
-        "SELECT * FROM match WHERE fighter_red = %(id)s OR fighter_blue = %(id)s",
-        {"id": fighter["id"]},
+    stats: FighterStatsRows | None = None
+    if query_args.stats:
+        stats = fetch_fighter_stats_rows(
+            cursor,
+            fighter,
+            tier=tier,
+            opponent=opponent["id"] if opponent else None,
+            recent=query_args.recent,
+        )
+
+    matches: list[DictRow] | None = None
+    if not query_args.stats or query_args.include_matches:
+        matches = db_list_fighter_matches(cursor, fighter["id"])
+
+    return FighterDetailsRows(fighter, stats=stats, matches=matches)
+
+
+def build_current_match_info(
+    current_match_rows: CurrentMatchRows,
+) -> CurrentMatchInfoResponse:
+    return CurrentMatchInfoResponse(
+        **current_match_rows.current_match,
+        fighter_blue_info=build_fighter_details(current_match_rows.fighter_blue),
+        fighter_red_info=build_fighter_details(current_match_rows.fighter_red),
     )
 
+
+def build_fighter_details(
+    fighter_details_rows: FighterDetailsRows | None,
+) -> ExtendedFighterModel | None:
+    if not fighter_details_rows:
+        return None
+
     return ExtendedFighterModel(
-        **fighter, matches=[MatchModel(**x) for x in cursor.fetchall()]
+        **fighter_details_rows.fighter,
+        matches=(
+            [MatchModel(**x) for x in fighter_details_rows.matches]
+            if fighter_details_rows.matches is not None
+            else None
+        ),
+        stats=(
+            build_fighter_stats(fighter_details_rows.stats)
+            if fighter_details_rows.stats
+            else None
+        ),
     )
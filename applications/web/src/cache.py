@@ -0,0 +1,112 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Hashable, TypeVar
+
+VT = TypeVar("VT")
+
+
+class TTLCache(Generic[VT]):
+    """
+    Small thread safe LRU cache where entries expire after `ttl` seconds.
+
+    Every entry is stored alongside a `version`. Reading an entry with a different
+    version than the one it was stored with is treated as a miss, this allows callers
+    to invalidate entries as soon as the underlying data changes rather than waiting on
+    the TTL.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, tuple[float, Any, VT]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Any = None) -> VT | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, entry_version, value = entry
+            if expires_at < time.monotonic() or entry_version != version:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: VT, version: Any = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: Any
+    etag: str
+    body: bytes
+
+
+class SnapshotCache:
+    """
+    Serves prebuilt response bodies for as long as the version of the underlying data
+    does not change.
+
+    The version is fetched at most once every `check_interval` seconds no matter how
+    many requests come in, and each body is only built once per version.
+    """
+
+    def __init__(self, check_interval: float, max_size: int = 32) -> None:
+        self.check_interval = check_interval
+        self._snapshots: TTLCache[Snapshot] = TTLCache(
+            ttl=24 * 60 * 60, max_size=max_size
+        )
+        self._version: Any = None
+        self._version_checked_at: float | None = None
+        self._version_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def get_version(self, fetch_version: Callable[[], Any]) -> Any:
+        with self._version_lock:
+            now = time.monotonic()
+            if (
+                self._version_checked_at is None
+                or self._version_checked_at + self.check_interval < now
+            ):
+                self._version = fetch_version()
+                self._version_checked_at = now
+            return self._version
+
+    def get_or_build(
+        self, key: Hashable, version: Any, build_body: Callable[[], bytes]
+    ) -> Snapshot:
+        if snapshot := self._snapshots.get(key, version):
+            return snapshot
+
+        # Only let one thread build at a time so a new version does not cause every
+        # waiting request to hit the database at once.
+        with self._build_lock:
+            if snapshot := self._snapshots.get(key, version):
+                return snapshot
+
+            body = build_body()
+            snapshot = Snapshot(
+                version=version, etag=hashlib.sha1(body).hexdigest(), body=body
+            )
+            self._snapshots.set(key, snapshot, version)
+            return snapshot
+
+    def invalidate(self) -> None:
+        with self._version_lock:
+            self._version_checked_at = None
+        self._snapshots.clear()
@@ -1,34 +1,363 @@
 # pylint: disable=too-many-statements
 
+import hashlib
+import json
+import re
+from datetime import datetime
+from functools import lru_cache
 from typing import Any
 
+import psycopg2
 from psycopg2.extras import DictRow
 
+from src.metrics import timed_query
+from src.pool import PooledConnection
 
-def generate_query_obj(page: int, page_size: int) -> dict:
-    return {"offset": page * page_size, "limit": page_size}
+PARAMETER_RE = re.compile(r"%\((\w+)\)s|%%")
+
+
+@lru_cache(maxsize=256)
+def prepare_query(query: str) -> tuple[str, str, str]:
+    """
+    Turns a query using named parameters into the name it is prepared under, the
+    statement preparing it, and the statement executing it with the same parameters.
+    """
+    name = f"q_{hashlib.sha1(query.encode()).hexdigest()[:16]}"
+    parameters: list[str] = []
+
+    def replace(match: re.Match) -> str:
+        if (parameter := match.group(1)) is None:
+            return "%"
+        if parameter not in parameters:
+            parameters.append(parameter)
+        return f"${parameters.index(parameter) + 1}"
+
+    prepare_stmt = f"PREPARE {name} AS {PARAMETER_RE.sub(replace, query)}"
+    execute_stmt = f"EXECUTE {name}"
+    if parameters:
+        execute_stmt += f" ({', '.join(f'%({p})s' for p in parameters)})"
+    return name, prepare_stmt, execute_stmt
+
+
+def execute_prepared(
+    cursor, query: str, query_obj: dict[str, Any] | None = None
+) -> None:
+    # Queries whose text never changes are only parsed and planned once per connection,
+    # every later execution reuses the prepared statement.
+    connection = cursor.connection
+    if not isinstance(connection, PooledConnection):
+        cursor.execute(query, query_obj)
+        return
+
+    name, prepare_stmt, execute_stmt = prepare_query(query)
+    if name not in connection.prepared:
+        cursor.execute(prepare_stmt)
+        connection.prepared.add(name)
+    try:
+        cursor.execute(execute_stmt, query_obj)
+    except psycopg2.NotSupportedError:
+        # A table changed shape since the statement was prepared, eg. a migration added
+        # a column to a `SELECT *`. Connections only ever read, so the transaction can be
+        # thrown away and the statement prepared again.
+        connection.rollback()
+        cursor.execute(f"DEALLOCATE {name}")
+        cursor.execute(prepare_stmt)
+        cursor.execute(execute_stmt, query_obj)
+
+
+def generate_query_obj(
+    page: int,
+    page_size: int,
+    after_id: int | None = None,
+    after_value: Any = None,
+) -> dict:
+    query_obj: dict[str, Any] = {"offset": page * page_size, "limit": page_size}
+    if after_id is not None:
+        query_obj["after_id"] = after_id
+    if after_value is not None:
+        query_obj["after_value"] = after_value
+    return query_obj
+
+
+def order_columns(order_by: str) -> tuple[list[str], str]:
+    # `order_by` is a column, prefixed with `-` to sort it in descending order. Ties are
+    # broken by ID in the same direction, so the columns can be compared as a row and
+    # the ordering matches the `(column DESC, id DESC)` style indexes.
+    column = order_by.removeprefix("-")
+    direction = "DESC" if order_by.startswith("-") else "ASC"
+    return (["id"] if column == "id" else [column, "id"]), direction
+
+
+def order_by_sql(order_by: str) -> str:
+    columns, direction = order_columns(order_by)
+    return ", ".join(f"{column} {direction}" for column in columns)
 
 
 def construct_final_query(
-    select_stmt: str, where_stmts: list[str], include_offset: bool = True
+    select_stmt: str,
+    where_stmts: list[str],
+    include_offset: bool = True,
+    keyset: bool = False,
+    order_by: str = "id",
 ) -> str:
+    # Keyset pagination seeks straight to the first row after the cursor using the
+    # index the results are ordered by, rather than walking and discarding every
+    # preceding row. Cursors hold the value of every order column of the last row.
+    if keyset:
+        columns, direction = order_columns(order_by)
+        cursor_values = ["%(after_id)s"]
+        if len(columns) > 1:
+            cursor_values.insert(0, "%(after_value)s")
+        where_stmts = [
+            *where_stmts,
+            f"({', '.join(columns)}) {'<' if direction == 'DESC' else '>'} "
+            f"({', '.join(cursor_values)})",
+        ]
+
     if where_stmts:
         select_stmt = f"{select_stmt} WHERE {' AND '.join(where_stmts)}"
 
+    if keyset:
+        return f"{select_stmt} ORDER BY {order_by_sql(order_by)} LIMIT %(limit)s"
+
     if include_offset:
-        return f"{select_stmt} ORDER BY id ASC OFFSET %(offset)s LIMIT %(limit)s"
+        return (
+            f"{select_stmt} ORDER BY {order_by_sql(order_by)} "
+            "OFFSET %(offset)s LIMIT %(limit)s"
+        )
 
     return select_stmt
 
 
+def json_object_sql(fields: dict[str, type]) -> str:
+    # Renders a row as compact JSON with sorted keys, byte for byte what `jsonify` makes
+    # of the matching API model, bar non ASCII characters which are kept rather than
+    # escaped. Like `datetime.isoformat` the fraction of a second is left out when it is
+    # zero. Like `repr` whole floats keep a trailing `.0`, Postgres only switches to an
+    # exponent from 1e15 rather than 1e16 which no float of the API comes near.
+    parts: list[str] = []
+    for name, type_ in sorted(fields.items()):
+        if type_ is int:
+            value = f"{name}::text"
+        elif type_ is float:
+            value = (
+                f"{name}::text || CASE WHEN {name}::text ~ '^-?[0-9]+$' "
+                "THEN '.0' ELSE '' END"
+            )
+        elif type_ is datetime:
+            value = (
+                f"'\"' || to_char({name}, 'YYYY-MM-DD\"T\"HH24:MI:SS') || CASE "
+                f"WHEN {name} = date_trunc('second', {name}) THEN '' "
+                f"ELSE to_char({name}, '.US') END || '\"'"
+            )
+        else:
+            value = f"to_json({name})::text"
+        separator = "," if parts else "{"
+        parts.append(f"'{separator}\"{name}\":' || COALESCE({value}, 'null')")
+    return f"{' || '.join(parts)} || '}}'"
+
+
+def construct_json_page_query(
+    table: str,
+    fields: dict[str, type],
+    where_stmts: list[str],
+    keyset: bool,
+    count: bool = False,
+    order_by: str = "id",
+) -> str:
+    # The page is rendered into a single JSON array, along with what is needed to point
+    # at the next page. Rows are only rendered once the page is picked, rows skipped
+    # over by an offset never are.
+    #
+    # When `count` is set the total number of rows matching the filters comes back with
+    # the page. It is counted apart from the page, the page is still walked straight off
+    # the index it is ordered by and stops at its last row.
+    #
+    # Along with the page comes `last_key`, the order columns of its last row, which
+    # the cursor to the next page is made of.
+    columns, _ = order_columns(order_by)
+    page_query = construct_final_query(
+        f"SELECT * FROM {table}", where_stmts, keyset=keyset, order_by=order_by
+    )
+    if count:
+        count_query = construct_final_query(
+            f"SELECT COUNT(*) FROM {table}", where_stmts, include_offset=False
+        )
+        total_stmt = f"({count_query})"
+    else:
+        total_stmt = "NULL::bigint"
+
+    return f"""
+        SELECT
+            '[' || COALESCE(
+                string_agg({json_object_sql(fields)}, ',' ORDER BY {order_by_sql(order_by)}),
+                ''
+            ) || ']' AS results,
+            COUNT(*) AS length,
+            (array_agg(
+                json_build_array({', '.join(columns)}) ORDER BY {order_by_sql(order_by)}
+            ))[COUNT(*)] AS last_key,
+            {total_stmt} AS total
+        FROM
+            ({page_query}) AS page
+    """
+
+
+def list_json_page(
+    cursor,
+    table: str,
+    fields: dict[str, type],
+    where_stmts: list[str],
+    query_obj: dict[str, Any],
+    page: int,
+    page_size: int,
+    after_id: int | None,
+    count: bool,
+    order_by: str = "id",
+    after_value: Any = None,
+) -> DictRow:
+    query_obj.update(generate_query_obj(page, page_size, after_id, after_value))
+    cursor.execute(
+        construct_json_page_query(
+            table,
+            fields,
+            where_stmts,
+            keyset=after_id is not None,
+            count=count,
+            order_by=order_by,
+        ),
+        query_obj,
+    )
+    return cursor.fetchone()
+
+
+def estimate_count(
+    cursor, table: str, where_stmts: list[str], query_obj: dict[str, Any]
+) -> int:
+    # Unfiltered counts can be read straight from the table statistics. `reltuples` is
+    # -1 if the table has never been vacuumed or analyzed, in which case fall back to
+    # the planner estimate.
+    if not where_stmts:
+        execute_prepared(
+            cursor,
+            "SELECT reltuples::bigint AS total FROM pg_class WHERE oid = %(table)s::regclass",
+            {"table": table},
+        )
+        total = cursor.fetchone()["total"]
+        if total >= 0:
+            return total
+
+    cursor.execute(
+        "EXPLAIN (FORMAT JSON) "
+        + construct_final_query(
+            f"SELECT 1 FROM {table}", where_stmts, include_offset=False
+        ),
+        query_obj,
+    )
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
 # === Fighters ===
+@timed_query
 def db_get_fighter_by_id(cursor, id_: int) -> DictRow | None:
-    cursor.execute("SELECT * FROM fighter WHERE id = %(id)s", {"id": id_})
+    execute_prepared(cursor, "SELECT * FROM fighter WHERE id = %(id)s", {"id": id_})
     return cursor.fetchone()
 
 
-def db_fighter_count(
-    cursor,
+@timed_query
+def db_get_fighter_json(cursor, fields: dict[str, type], id_: int) -> str | None:
+    execute_prepared(
+        cursor,
+        f"SELECT {json_object_sql(fields)} AS json FROM fighter WHERE id = %(id)s",
+        {"id": id_},
+    )
+    if fighter := cursor.fetchone():
+        return fighter["json"]
+    return None
+
+
+@timed_query
+def db_get_fighters_json(
+    cursor, fields: dict[str, type], ids: list[int], names: list[str]
+) -> list[DictRow]:
+    # A single query however many fighters are asked for, answered by a BitmapOr
+    # across the primary key and name indexes.
+    execute_prepared(
+        cursor,
+        f"""
+        SELECT
+            id,
+            name,
+            {json_object_sql(fields)} AS json
+        FROM
+            fighter
+        WHERE
+            id = ANY(%(ids)s) OR name = ANY(%(names)s)
+        """,
+        {"ids": ids, "names": names},
+    )
+    return cursor.fetchall()
+
+
+@timed_query
+def db_get_fighter_by_name(cursor, name: str) -> DictRow | None:
+    execute_prepared(
+        cursor, "SELECT * FROM fighter WHERE name = %(name)s", {"name": name}
+    )
+    return cursor.fetchone()
+
+
+@timed_query
+def db_get_fighter_stats(cursor, id_: int, tier: str | None = None) -> DictRow:
+    # Stats are kept up to date per fighter and tier by the bot, a fighter only ever has
+    # a row for each tier they fought in.
+    execute_prepared(
+        cursor,
+        """
+        SELECT
+            COALESCE(SUM(matches), 0) AS matches,
+            COALESCE(SUM(wins), 0) AS wins,
+            COALESCE(SUM(matches) FILTER (WHERE tier = %(tier)s), 0) AS tier_matches,
+            COALESCE(SUM(wins) FILTER (WHERE tier = %(tier)s), 0) AS tier_wins,
+            SUM(bet_on) AS total_bet,
+            SUM(bet_against) AS total_bet_against,
+            SUM(bet_on)::float / NULLIF(SUM(matches), 0) AS average_bet,
+            SUM(bet_share_sum) / NULLIF(SUM(bet_share_matches), 0)
+                AS average_bet_share,
+            SUM(odds_sum) / NULLIF(SUM(odds_matches), 0) AS average_odds
+        FROM
+            fighter_stats
+        WHERE
+            fighter_id = %(id)s
+        """,
+        {"id": id_, "tier": tier},
+    )
+    return cursor.fetchone()
+
+
+@timed_query
+def db_get_head_to_head(cursor, id_: int, opponent: int) -> DictRow:
+    execute_prepared(
+        cursor,
+        """
+        SELECT
+            COUNT(*) AS matches,
+            COUNT(*) FILTER (WHERE winner = %(id)s) AS wins
+        FROM
+            match
+        WHERE
+            (fighter_red = %(id)s AND fighter_blue = %(opponent)s)
+            OR (fighter_red = %(opponent)s AND fighter_blue = %(id)s)
+        """,
+        {"id": id_, "opponent": opponent},
+    )
+    return cursor.fetchone()
+
+
+def get_fighter_filters(
     name: str | None = None,
     tier: str | None = None,
     prev_tier: str | None = None,
@@ -37,8 +366,7 @@ def db_fighter_count(
     tier_elo__gte: int | None = None,
     tier_elo__lt: int | None = None,
     **kwargs,
-) -> int:
-    select_stmt = "SELECT COUNT(*) as total FROM fighter"
+) -> tuple[list[str], dict[str, Any]]:
     where_stmts: list[str] = []
     query_obj: dict[str, Any] = {}
 
@@ -64,62 +392,262 @@ def db_fighter_count(
         query_obj["tier_elo__lt"] = tier_elo__lt
         where_stmts.append("tier_elo < %(tier_elo__lt)s")
 
-    cursor.execute(
-        construct_final_query(select_stmt, where_stmts, include_offset=False), query_obj
-    )
-    return cursor.fetchone()["total"]
+    return where_stmts, query_obj
 
 
+@timed_query
+def db_estimate_fighter_count(cursor, **filters) -> int:
+    where_stmts, query_obj = get_fighter_filters(**filters)
+    return estimate_count(cursor, "fighter", where_stmts, query_obj)
+
+
+@timed_query
 def db_list_fighters(
     cursor,
+    fields: dict[str, type],
     page: int,
     page_size: int,
-    name: str | None = None,
-    tier: str | None = None,
-    prev_tier: str | None = None,
-    elo__gte: int | None = None,
-    elo__lt: int | None = None,
-    tier_elo__gte: int | None = None,
-    tier_elo__lt: int | None = None,
-) -> list[DictRow]:
-    select_stmt = "SELECT * FROM fighter"
-    where_stmts: list[str] = []
-    query_obj = generate_query_obj(page, page_size)
+    after_id: int | None = None,
+    count: bool = False,
+    order_by: str = "id",
+    after_value: Any = None,
+    **filters,
+) -> DictRow:
+    where_stmts, query_obj = get_fighter_filters(**filters)
+    return list_json_page(
+        cursor,
+        "fighter",
+        fields,
+        where_stmts,
+        query_obj,
+        page,
+        page_size,
+        after_id,
+        count,
+        order_by=order_by,
+        after_value=after_value,
+    )
 
-    if name:
-        query_obj["name"] = name
-        where_stmts.append("name = %(name)s")
-    if tier:
-        query_obj["tier"] = tier
-        where_stmts.append("tier = %(tier)s")
-    if prev_tier:
-        query_obj["prev_tier"] = prev_tier
-        where_stmts.append("prev_tier = %(prev_tier)s")
-    if elo__gte is not None:
-        query_obj["elo__gte"] = elo__gte
-        where_stmts.append("elo >= %(elo__gte)s")
-    if elo__lt is not None:
-        query_obj["elo__lt"] = elo__lt
-        where_stmts.append("elo < %(elo__lt)s")
-    if tier_elo__gte is not None:
-        query_obj["tier_elo__gte"] = tier_elo__gte
-        where_stmts.append("tier_elo >= %(tier_elo__gte)s")
-    if tier_elo__lt is not None:
-        query_obj["tier_elo__lt"] = tier_elo__lt
-        where_stmts.append("tier_elo < %(tier_elo__lt)s")
 
-    cursor.execute(construct_final_query(select_stmt, where_stmts), query_obj)
-    return cursor.fetchall()
+@timed_query
+def db_export_fighters(cursor, columns: list[str], **filters) -> None:
+    # Only executes the query, rows are left for the caller to fetch as it sees fit.
+    select_stmt = f"SELECT {', '.join(columns)} FROM fighter"
+    where_stmts, query_obj = get_fighter_filters(**filters)
+    cursor.execute(
+        construct_final_query(select_stmt, where_stmts, include_offset=False)
+        + " ORDER BY id ASC",
+        query_obj,
+    )
 
 
-# === Matches ===
-def db_get_match_by_id(cursor, id_: int) -> DictRow | None:
-    cursor.execute("SELECT * FROM match WHERE id = %(id)s", {"id": id_})
+@timed_query
+def db_search_fighters(
+    cursor, fields: dict[str, type], name: str, mode: str, limit: int
+) -> str:
+    # Case insensitive lookups are answered by the `lower(name) COLLATE "C"` index,
+    # fuzzy ones by the `pg_trgm` GIN index. `%` only matches names more similar than
+    # `pg_trgm.similarity_threshold`, 0.3 by default, so typos are tolerated without
+    # ranking every fighter.
+    lower_name = 'lower(name) COLLATE "C"'
+    if mode == "exact":
+        where_stmt = f"{lower_name} = lower(%(name)s)"
+        order_by = f"{lower_name}, name"
+    elif mode == "prefix":
+        where_stmt = f"{lower_name} LIKE lower(%(pattern)s) || '%%'"
+        order_by = f"{lower_name}, name"
+    else:
+        where_stmt = "name %% %(name)s"
+        order_by = "similarity DESC, name"
+
+    cursor.execute(
+        f"""
+        SELECT
+            '[' || COALESCE(string_agg({json_object_sql(fields)}, ',' ORDER BY {order_by}), '')
+                || ']' AS results
+        FROM
+            (
+                SELECT
+                    *,
+                    similarity(name, %(name)s) AS similarity
+                FROM
+                    fighter
+                WHERE
+                    {where_stmt}
+                ORDER BY
+                    {order_by}
+                LIMIT %(limit)s
+            ) AS result
+        """,
+        {
+            "name": name,
+            # `LIKE` wildcards in the name are matched literally.
+            "pattern": name.replace("\\", "\\\\")
+            .replace("%", "\\%")
+            .replace("_", "\\_"),
+            "limit": limit,
+        },
+    )
+    return cursor.fetchone()["results"]
+
+
+@timed_query
+def db_get_leaderboard(
+    cursor, fields: dict[str, type], tier: str | None, page: int, page_size: int
+) -> DictRow:
+    # Ranked by tier ELO within a tier, otherwise by ELO. The `(tier, tier_elo DESC, id
+    # DESC)` and `(elo DESC, id DESC)` indexes hand fighters over already ranked, so
+    # `RANK()` streams and only the fighters up to the end of the page are read, all
+    # from the index. The window's default frame runs up to the last fighter tied with
+    # the current one, which makes `COUNT(*)` those rated at least as high.
+    rating = "tier_elo" if tier else "elo"
+    where_stmts, query_obj = get_fighter_filters(tier=tier)
+    query_obj.update(generate_query_obj(page, page_size))
+    where_stmt = f"WHERE {' AND '.join(where_stmts)}" if where_stmts else ""
+
+    cursor.execute(
+        f"""
+        WITH ranked AS (
+            SELECT
+                id,
+                RANK() OVER rating AS rank,
+                COUNT(*) OVER rating AS rated_at_least
+            FROM
+                fighter
+            {where_stmt}
+            WINDOW rating AS (ORDER BY {rating} DESC)
+            ORDER BY {rating} DESC, id DESC
+            OFFSET %(offset)s
+            LIMIT %(limit)s
+        ), counted AS (
+            SELECT COUNT(*) AS total FROM fighter {where_stmt}
+        )
+        SELECT
+            '[' || COALESCE(
+                string_agg({json_object_sql(fields)}, ',' ORDER BY rank, id DESC), ''
+            ) || ']' AS results,
+            (SELECT total FROM counted) AS total
+        FROM
+            (
+                SELECT
+                    fighter.*,
+                    rank,
+                    -- Share of the other fighters rated lower, from 0 to 100.
+                    COALESCE(
+                        round(
+                            100.0 * (total - rated_at_least) / NULLIF(total - 1, 0), 2
+                        )::float8,
+                        100
+                    ) AS percentile
+                FROM
+                    ranked
+                    JOIN fighter USING (id)
+                    CROSS JOIN counted
+            ) AS page
+        """,
+        query_obj,
+    )
     return cursor.fetchone()
 
 
-def db_get_match_count(
-    cursor,
+@timed_query
+def db_get_fighter_rank_json(
+    cursor, fields: dict[str, type], id_: int, overall: bool
+) -> str | None:
+    # Ranks a single fighter the way the leaderboard does, without ranking everyone
+    # above it. Fighters rated higher, the same and lower are each counted off the
+    # `(tier, tier_elo DESC, id DESC)` or `(elo DESC, id DESC)` index, together they
+    # read every entry of the tier, or of the index, once.
+    rating = "elo" if overall else "tier_elo"
+    scope = "" if overall else "other.tier = fighter.tier AND "
+
+    def count(comparison: str) -> str:
+        return (
+            f"(SELECT COUNT(*) FROM fighter AS other "
+            f"WHERE {scope}other.{rating} {comparison} fighter.{rating})"
+        )
+
+    execute_prepared(
+        cursor,
+        f"""
+        WITH counts AS MATERIALIZED (
+            SELECT
+                id,
+                {count(">")} AS higher,
+                {count("=")} AS tied,
+                {count("<")} AS lower
+            FROM
+                fighter
+            WHERE
+                id = %(id)s
+        )
+        SELECT
+            {json_object_sql(fields)} AS json
+        FROM
+            (
+                SELECT
+                    fighter.*,
+                    higher + 1 AS rank,
+                    -- Share of the other fighters rated lower, from 0 to 100.
+                    COALESCE(
+                        round(100.0 * lower / NULLIF(higher + tied + lower - 1, 0), 2)
+                            ::float8,
+                        100
+                    ) AS percentile
+                FROM
+                    counts
+                    JOIN fighter USING (id)
+            ) AS ranked
+        """,
+        {"id": id_},
+    )
+    if fighter := cursor.fetchone():
+        return fighter["json"]
+    return None
+
+
+# === Matches ===
+@timed_query
+def db_get_match_json(cursor, fields: dict[str, type], id_: int) -> str | None:
+    execute_prepared(
+        cursor,
+        f"SELECT {json_object_sql(fields)} AS json FROM match WHERE id = %(id)s",
+        {"id": id_},
+    )
+    if match_ := cursor.fetchone():
+        return match_["json"]
+    return None
+
+
+@timed_query
+def db_get_matches_json(
+    cursor, fields: dict[str, type], ids: list[int]
+) -> list[DictRow]:
+    execute_prepared(
+        cursor,
+        f"SELECT id, {json_object_sql(fields)} AS json FROM match WHERE id = ANY(%(ids)s)",
+        {"ids": ids},
+    )
+    return cursor.fetchall()
+
+
+@timed_query
+def db_list_fighter_matches(
+    cursor, fighter_id: int, limit: int | None = None
+) -> list[DictRow]:
+    # Without a limit every match is returned in the order they were recorded,
+    # otherwise only the most recent `limit` matches are returned newest first. Either
+    # query is prepared once, the limit is only ever a parameter.
+    query = "SELECT * FROM match WHERE fighter_red = %(id)s OR fighter_blue = %(id)s"
+    query_obj: dict[str, Any] = {"id": fighter_id}
+    if limit is not None:
+        query += " ORDER BY id DESC LIMIT %(limit)s"
+        query_obj["limit"] = limit
+    execute_prepared(cursor, query, query_obj)
+    return cursor.fetchall()
+
+
+def get_match_filters(
     fighter_red: int | None = None,
     fighter_blue: int | None = None,
     fighter: int | None = None,
@@ -140,8 +668,7 @@ def db_get_match_count(
     match_format: str | None = None,
     colour: str | None = None,
     **kwargs,
-) -> int:
-    select_stmt = "SELECT COUNT(*) as total FROM match"
+) -> tuple[list[str], dict[str, Any]]:
     where_stmts: list[str] = []
     query_obj: dict[str, Any] = {}
 
@@ -207,107 +734,67 @@ def db_get_match_count(
         where_stmts.append("colour = %(colour)s")
         query_obj["colour"] = colour
 
-    cursor.execute(
-        construct_final_query(select_stmt, where_stmts, include_offset=False), query_obj
-    )
-    return cursor.fetchone()["total"]
+    return where_stmts, query_obj
 
 
+@timed_query
+def db_estimate_match_count(cursor, **filters) -> int:
+    where_stmts, query_obj = get_match_filters(**filters)
+    return estimate_count(cursor, "match", where_stmts, query_obj)
+
+
+@timed_query
 def db_list_matches(
     cursor,
+    fields: dict[str, type],
     page: int,
     page_size: int,
-    fighter_red: int | None = None,
-    fighter_blue: int | None = None,
-    fighter: int | None = None,
-    winner: int | None = None,
-    bet_red__gte: int | None = None,
-    bet_red__lt: int | None = None,
-    bet_blue__gte: int | None = None,
-    bet_blue__lt: int | None = None,
-    bet__gte: int | None = None,
-    bet__lt: int | None = None,
-    streak_red__gte: int | None = None,
-    streak_red__lt: int | None = None,
-    streak_blue__gte: int | None = None,
-    streak_blue__lt: int | None = None,
-    streak__gte: int | None = None,
-    streak__lt: int | None = None,
-    tier: str | None = None,
-    match_format: str | None = None,
-    colour: str | None = None,
-) -> list[DictRow]:
-    select_stmt = "SELECT * FROM match"
-    where_stmts: list[str] = []
-    query_obj = generate_query_obj(page, page_size)
+    after_id: int | None = None,
+    count: bool = False,
+    **filters,
+) -> DictRow:
+    where_stmts, query_obj = get_match_filters(**filters)
+    return list_json_page(
+        cursor,
+        "match",
+        fields,
+        where_stmts,
+        query_obj,
+        page,
+        page_size,
+        after_id,
+        count,
+    )
 
-    if fighter_red is not None:
-        where_stmts.append("fighter_red = %(fighter_red)s")
-        query_obj["fighter_red"] = fighter_red
-    if fighter_blue is not None:
-        where_stmts.append("fighter_blue = %(fighter_blue)s")
-        query_obj["fighter_blue"] = fighter_blue
-    if fighter is not None:
-        where_stmts.append("(fighter_red = %(fighter)s OR fighter_blue = %(fighter)s)")
-        query_obj["fighter"] = fighter
-    if winner is not None:
-        where_stmts.append("winner = %(winner)s")
-        query_obj["winner"] = winner
-    if bet_red__gte is not None:
-        where_stmts.append("bet_red >= %(bet_red__gte)s")
-        query_obj["bet_red__gte"] = bet_red__gte
-    if bet_red__lt is not None:
-        where_stmts.append("bet_red < %(bet_red__lt)s")
-        query_obj["bet_red__lt"] = bet_red__lt
-    if bet_blue__gte is not None:
-        where_stmts.append("bet_blue >= %(bet_blue__gte)s")
-        query_obj["bet_blue__gte"] = bet_blue__gte
-    if bet_blue__lt is not None:
-        where_stmts.append("bet_blue < %(bet_blue__lt)s")
-        query_obj["bet_blue__lt"] = bet_blue__lt
-    if bet__gte is not None:
-        where_stmts.append("(bet_red >= %(bet__gte)s OR bet_blue >= %(bet__gte)s)")
-        query_obj["bet__gte"] = bet__gte
-    if bet__lt is not None:
-        where_stmts.append("(bet_red >= %(bet__lt)s OR bet_blue >= %(bet__lt)s)")
-        query_obj["bet__lt"] = bet__lt
-    if streak_red__gte is not None:
-        where_stmts.append("streak_red >= %(streak_red__gte)s")
-        query_obj["streak_red__gte"] = streak_red__gte
-    if streak_red__lt is not None:
-        where_stmts.append("streak_red < %(streak_red__lt)s")
-        query_obj["streak_red__lt"] = streak_red__lt
-    if streak_blue__gte is not None:
-        where_stmts.append("streak_blue >= %(streak_blue__gte)s")
-        query_obj["streak_blue__gte"] = streak_blue__gte
-    if streak_blue__lt is not None:
-        where_stmts.append("streak_blue < %(streak_blue__lt)s")
-        query_obj["streak_blue__lt"] = streak_blue__lt
-    if streak__gte is not None:
-        where_stmts.append(
-            "(streak_red >= %(streak__gte)s OR streak_blue >= %(streak__gte)s)"
-        )
-        query_obj["streak__gte"] = streak__gte
-    if streak__lt is not None:
-        where_stmts.append(
-            "(streak_red >= %(streak__lt)s OR streak_blue >= %(streak__lt)s)"
-        )
-        query_obj["streak__lt"] = streak__lt
-    if tier:
-        where_stmts.append("tier = %(tier)s")
-        query_obj["tier"] = tier
-    if match_format:
-        where_stmts.append("match_format = %(match_format)s")
-        query_obj["match_format"] = match_format
-    if colour:
-        where_stmts.append("colour = %(colour)s")
-        query_obj["colour"] = colour
 
-    cursor.execute(construct_final_query(select_stmt, where_stmts), query_obj)
-    return cursor.fetchall()
+@timed_query
+def db_export_matches(cursor, columns: list[str], **filters) -> None:
+    # Only executes the query, rows are left for the caller to fetch as it sees fit.
+    select_stmt = f"SELECT {', '.join(columns)} FROM match"
+    where_stmts, query_obj = get_match_filters(**filters)
+    cursor.execute(
+        construct_final_query(select_stmt, where_stmts, include_offset=False)
+        + " ORDER BY id ASC",
+        query_obj,
+    )
+
+
+@timed_query
+def db_get_latest_match_id(cursor) -> int | None:
+    execute_prepared(cursor, "SELECT MAX(id) AS latest FROM match")
+    return cursor.fetchone()["latest"]
 
 
 # === Current Match ===
+@timed_query
 def db_get_current_match(cursor) -> DictRow | None:
-    cursor.execute("SELECT * FROM current_match LIMIT 1")
+    execute_prepared(cursor, "SELECT * FROM current_match LIMIT 1")
     return cursor.fetchone()
+
+
+@timed_query
+def db_get_current_match_updated_at(cursor) -> datetime | None:
+    execute_prepared(cursor, "SELECT updated_at FROM current_match LIMIT 1")
+    if current_match := cursor.fetchone():
+        return current_match["updated_at"]
+    return None
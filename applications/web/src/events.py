@@ -0,0 +1,128 @@
+import json
+import logging
+import queue
+import threading
+import time
+from select import select
+from typing import Callable
+
+import psycopg2
+import psycopg2.extensions
+
+# Must match `Database.EVENTS_CHANNEL` in the bot.
+EVENTS_CHANNEL = "saltyboy_events"
+
+logger = logging.getLogger(__name__)
+
+
+class TooManySubscribers(Exception):
+    """Raised when the maximum number of event stream subscribers is reached"""
+
+
+class EventBroadcaster:
+    """
+    Fans out events to every subscriber. Each subscriber gets its own bounded queue, a
+    subscriber that falls too far behind simply misses events rather than holding up
+    everybody else.
+    """
+
+    def __init__(self, max_subscribers: int, max_queued_events: int = 16) -> None:
+        self.max_subscribers = max_subscribers
+        self.max_queued_events = max_queued_events
+        self._subscribers: set[queue.Queue[tuple[str, str]]] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> queue.Queue[tuple[str, str]]:
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            subscriber: queue.Queue[tuple[str, str]] = queue.Queue(
+                self.max_queued_events
+            )
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue[tuple[str, str]]) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                logger.debug("Dropping %s event for a slow subscriber.", event)
+
+
+class EventListener(threading.Thread):
+    """
+    Holds a single `LISTEN` connection to PostgreSQL and forwards every notification
+    sent by the bot to the broadcaster and `on_event` callbacks.
+    """
+
+    RECONNECT_BACKOFF_MAX = 60
+
+    def __init__(
+        self,
+        broadcaster: EventBroadcaster,
+        on_event: list[Callable[[str, dict], None]],
+        **connection_kwargs,
+    ) -> None:
+        super().__init__(name="event-listener", daemon=True)
+        self.broadcaster = broadcaster
+        self.on_event = on_event
+        self.connection_kwargs = connection_kwargs
+
+    def run(self) -> None:
+        backoff = 1
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.warning(
+                    "Event listener connection failed. Reconnecting in %s seconds.",
+                    backoff,
+                    exc_info=True,
+                )
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.RECONNECT_BACKOFF_MAX)
+            else:
+                backoff = 1
+
+    def _listen(self) -> None:
+        connection = psycopg2.connect(**self.connection_kwargs)
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+            logger.info("Listening for events on %s.", EVENTS_CHANNEL)
+
+            while True:
+                # Wake up every so often even without notifications, this makes sure
+                # a dead connection is noticed by `poll`.
+                select([connection], [], [], 60)
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    self._handle(notify.payload)
+        finally:
+            connection.close()
+
+    def _handle(self, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+            event = data["event"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed event: %s", payload)
+            return
+
+        for callback in self.on_event:
+            try:
+                callback(event, data)
+            except Exception:
+                logger.error("Event callback failed.", exc_info=True)
+
+        self.broadcaster.publish(event, payload)
@@ -0,0 +1,101 @@
+from functools import wraps
+from typing import TYPE_CHECKING, Callable, Iterator, TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+
+if TYPE_CHECKING:
+    from src.pool import ConnectionPool
+
+RT = TypeVar("RT")
+
+# Most requests are answered within a few milliseconds, the default buckets start at
+# 5ms which would lump all of them together.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUESTS = Counter(
+    "saltyboy_web_requests_total",
+    "Requests handled, by route, method and status code.",
+    ["route", "method", "status"],
+)
+REQUEST_DURATION = Histogram(
+    "saltyboy_web_request_duration_seconds",
+    "Time taken to handle requests. Streamed bodies are sent afterwards, their time is "
+    "not included.",
+    ["route", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "saltyboy_web_response_size_bytes",
+    "Size of response bodies. Streamed bodies are not included.",
+    ["route"],
+    buckets=SIZE_BUCKETS,
+)
+POOL_WAIT = Histogram(
+    "saltyboy_web_db_pool_wait_seconds",
+    "Time taken to check a connection out of the database connection pool.",
+    buckets=LATENCY_BUCKETS,
+)
+POOL_WAITING = Gauge(
+    "saltyboy_web_db_pool_waiting",
+    "Threads currently waiting on a connection from the database connection pool.",
+)
+QUERY_DURATION = Histogram(
+    "saltyboy_web_db_query_duration_seconds",
+    "Time taken by each database function, including fetching the results.",
+    ["function"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def timed_query(func: Callable[..., RT]) -> Callable[..., RT]:
+    histogram = QUERY_DURATION.labels(func.__name__)
+
+    @wraps(func)
+    def inner(*args, **kwargs) -> RT:
+        with histogram.time():
+            return func(*args, **kwargs)
+
+    return inner
+
+
+class PoolCollector(Collector):
+    """
+    Reports how many connections of `pg_pool` are in use and how many are idle,
+    whenever metrics are scraped.
+    """
+
+    def __init__(self, pg_pool: "ConnectionPool") -> None:
+        self.pg_pool = pg_pool
+
+    def collect(self) -> Iterator[Metric]:
+        connections = GaugeMetricFamily(
+            "saltyboy_web_db_pool_connections",
+            "Connections of the database connection pool, by state.",
+            labels=["state"],
+        )
+        connections.add_metric(["in_use"], self.pg_pool.in_use)
+        connections.add_metric(["idle"], self.pg_pool.idle)
+        yield connections
+        yield GaugeMetricFamily(
+            "saltyboy_web_db_pool_max_connections",
+            "Most connections the database connection pool will open.",
+            value=self.pg_pool.maxconn,
+        )
@@ -0,0 +1,121 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, cast
+
+import psycopg2
+from psycopg2.extensions import connection as Connection
+from psycopg2.pool import ThreadedConnectionPool
+
+from src.metrics import POOL_WAIT, POOL_WAITING
+
+
+class PoolTimeout(Exception):
+    """No connection could be checked out of the pool in time."""
+
+
+class PooledConnection(Connection):
+    """
+    Connection which keeps track of the statements prepared on it, and when it was last
+    handed back to the pool.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of PostgreSQL connections.
+
+    `ThreadedConnectionPool` raises as soon as every connection is checked out, here
+    checking out waits up to `checkout_timeout` seconds for one to be handed back before
+    raising `PoolTimeout`. Connections which sat idle for longer than
+    `health_check_interval` seconds are checked before being handed out, those which
+    went stale, eg. after a database restart, are replaced with a new connection.
+
+    Every statement run on a connection is cancelled after `statement_timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        minconn: int,
+        maxconn: int,
+        checkout_timeout: float = 5,
+        statement_timeout: float = 10,
+        health_check_interval: float = 60,
+        **connection_kwargs: Any,
+    ) -> None:
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._pool = ThreadedConnectionPool(
+            minconn,
+            maxconn,
+            connection_factory=PooledConnection,
+            options=f"-c statement_timeout={int(statement_timeout * 1000)}",
+            **connection_kwargs,
+        )
+
+    # psycopg2 has no public API for these, they are read from the pool's own state.
+    # pylint: disable=protected-access
+    @property
+    def in_use(self) -> int:
+        return len(self._pool._used)  # type: ignore[attr-defined]
+
+    @property
+    def idle(self) -> int:
+        return len(self._pool._pool)  # type: ignore[attr-defined]
+
+    # pylint: enable=protected-access
+
+    def getconn(self) -> PooledConnection:
+        with POOL_WAITING.track_inprogress(), POOL_WAIT.time():
+            if not self._slots.acquire(  # pylint: disable=consider-using-with
+                timeout=self.checkout_timeout
+            ):
+                raise PoolTimeout(
+                    f"No database connection became available within "
+                    f"{self.checkout_timeout} seconds."
+                )
+        try:
+            return self._get_healthy_connection()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, connection: PooledConnection) -> None:
+        try:
+            connection.last_used = time.monotonic()
+            self._pool.putconn(connection)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        connection = self.getconn()
+        try:
+            yield connection
+        finally:
+            self.putconn(connection)
+
+    def _get_healthy_connection(self) -> PooledConnection:
+        # Every stale connection is thrown away, new connections are always healthy so
+        # this ends once the pool runs out of idle ones.
+        while True:
+            connection = cast(PooledConnection, self._pool.getconn())
+            if (
+                not connection.closed
+                and time.monotonic() - connection.last_used < self.health_check_interval
+            ):
+                return connection
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connection.rollback()
+                return connection
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                self._pool.putconn(connection, close=True)
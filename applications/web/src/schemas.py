@@ -1,15 +1,65 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
 from datetime import datetime
 from enum import StrEnum, unique
-from typing import Optional
+from typing import Any, Optional
 
-from pydantic import BaseModel, Field, field_serializer
+from pydantic import (
+    BaseModel,
+    Field,
+    field_serializer,
+    field_validator,
+    model_validator,
+)
+
+
+# === Cursors ===
+def encode_cursor(*values: Any) -> str:
+    return urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode("ascii")))
+    except (BinasciiError, UnicodeError, ValueError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+    if not isinstance(values, list) or not values:
+        raise ValueError("Invalid cursor.")
+
+    return values
 
 
 # === Base ===
+# Most IDs or names that can be looked up in a single batch request.
+BATCH_MAX_SIZE = 500
+
+
+@unique
+class CountMode(StrEnum):
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+    NONE = "none"
+
+
 class PaginationResponse(BaseModel):
     page: int = Field(description="Current page number.")
     page_size: int = Field(description="Current page size.")
-    count: int = Field(description="Total number of results.")
+    count: Optional[int] = Field(
+        description=(
+            "Total number of results. Approximate when `count_mode` is `estimate`, "
+            "`null` when `count_mode` is `none`."
+        )
+    )
+    next_cursor: Optional[str] = Field(
+        default=None,
+        description=(
+            "Opaque cursor pointing at the next page. Pass it back as `cursor` to "
+            "continue from where this page left off. `null` when there are no more "
+            "results."
+        ),
+    )
 
 
 class PaginationQuery(BaseModel):
@@ -17,6 +67,60 @@ class PaginationQuery(BaseModel):
     page_size: int = Field(
         default=100, description="Number of results per page.", ge=1, le=100
     )
+    cursor: str = Field(
+        default=None,
+        description=(
+            "Opaque cursor taken from the `next_cursor` of a previous response. When "
+            "set `page` is ignored and results continue directly after the cursor. "
+            "Recommended when scraping, deep pages cost the same as the first one."
+        ),
+    )
+    count_mode: CountMode = Field(
+        default=CountMode.EXACT,
+        description=(
+            "How the total `count` is calculated. `exact` counts every matching row, "
+            "`estimate` uses the database planner's estimate which is much cheaper "
+            "but approximate, and `none` skips counting altogether. Exact counts may "
+            "be served from a short lived cache."
+        ),
+    )
+
+    @field_validator("cursor")
+    @classmethod
+    def validate_cursor(cls, v: str | None) -> str | None:
+        if v is not None and not isinstance(decode_cursor(v)[-1], int):
+            raise ValueError("Invalid cursor.")
+        return v
+
+    @property
+    def after_id(self) -> int | None:
+        if self.cursor is None:
+            return None
+        return decode_cursor(self.cursor)[-1]
+
+
+@unique
+class ExportFormat(StrEnum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class ExportQuery(BaseModel):
+    format: ExportFormat = Field(
+        default=ExportFormat.NDJSON,
+        description=(
+            "Format of the export. `ndjson` writes one JSON object per line, in the "
+            "same shape as the list endpoints' `results`. `csv` writes a header row "
+            "followed by one row per result."
+        ),
+    )
+
+
+def split_ids(v: Any) -> Any:
+    # IDs may be repeated, `ids=1&ids=2`, comma separated, `ids=1,2`, or both.
+    if isinstance(v, list):
+        return [id_ for item in v for id_ in str(item).split(",") if id_]
+    return v
 
 
 class IdPath(BaseModel):
@@ -45,6 +149,26 @@ class AllMatchFormat(StrEnum):
     EXHIBITION = "exhibition"
 
 
+@unique
+class SearchMode(StrEnum):
+    EXACT = "exact"
+    PREFIX = "prefix"
+    FUZZY = "fuzzy"
+
+
+@unique
+class FighterOrder(StrEnum):
+    ID = "id"
+    ELO = "elo"
+    ELO_DESC = "-elo"
+    TIER_ELO = "tier_elo"
+    TIER_ELO_DESC = "-tier_elo"
+    BEST_STREAK = "best_streak"
+    BEST_STREAK_DESC = "-best_streak"
+    LAST_UPDATED = "last_updated"
+    LAST_UPDATED_DESC = "-last_updated"
+
+
 @unique
 class Colour(StrEnum):
     RED = "Red"
@@ -52,7 +176,7 @@ class Colour(StrEnum):
 
 
 # === Fighter ===
-class ListFighterQuery(PaginationQuery):
+class FighterFilterQuery(BaseModel):
     name: str = Field(
         default=None,
         description="Filter fighters by the name of the fighter. Case sensitive. Note, fighter's names are unique, therefore this is likely to only return one result.",
@@ -82,6 +206,51 @@ class ListFighterQuery(PaginationQuery):
     )
 
 
+class ListFighterQuery(FighterFilterQuery, PaginationQuery):
+    order_by: FighterOrder = Field(
+        default=FighterOrder.ID,
+        description=(
+            "Order of the results. Prefix with `-` for descending order, eg. `-elo` "
+            "for the highest ELO first. Ties are ordered by ID. Cursors only continue "
+            "results in the order they were made for."
+        ),
+    )
+
+    @model_validator(mode="after")
+    def validate_cursor_order(self) -> "ListFighterQuery":
+        # Cursors of ordered results hold the value of the order column of the last
+        # fighter before its ID.
+        if self.cursor is None:
+            return self
+
+        values = decode_cursor(self.cursor)
+        if self.order_by == FighterOrder.ID:
+            if len(values) != 1:
+                raise ValueError("Cursor does not match `order_by`.")
+            return self
+
+        if len(values) != 2:
+            raise ValueError("Cursor does not match `order_by`.")
+        if self.order_by.removeprefix("-") == "last_updated":
+            try:
+                datetime.fromisoformat(values[0])
+            except (TypeError, ValueError) as e:
+                raise ValueError("Invalid cursor.") from e
+        elif not isinstance(values[0], int) or isinstance(values[0], bool):
+            raise ValueError("Invalid cursor.")
+        return self
+
+    @property
+    def after_value(self) -> Any:
+        if self.cursor is None or self.order_by == FighterOrder.ID:
+            return None
+        return decode_cursor(self.cursor)[0]
+
+
+class ExportFighterQuery(FighterFilterQuery, ExportQuery):
+    pass
+
+
 class FighterModel(BaseModel):
     id: int = Field(description="ID of the fighter.")
     name: str = Field(description="Name of the fighter. Case sensitive.")
@@ -105,8 +274,109 @@ class ListFighterResponse(PaginationResponse):
     results: list[FighterModel] = Field(description="Filtered fighters.")
 
 
+class BatchFighterQuery(BaseModel):
+    ids: list[int] = Field(
+        default=[],
+        description="IDs of the fighters to get. Repeated, or comma separated.",
+        max_length=BATCH_MAX_SIZE,
+    )
+    names: list[str] = Field(
+        default=[],
+        description="Names of the fighters to get. Case sensitive. Repeated.",
+        max_length=BATCH_MAX_SIZE,
+    )
+
+    @field_validator("ids", mode="before")
+    @classmethod
+    def validate_ids(cls, v: Any) -> Any:
+        return split_ids(v)
+
+
+class BatchFighterResponse(BaseModel):
+    by_id: dict[str, Optional[FighterModel]] = Field(
+        description="Fighters keyed by each of the requested `ids`. `null` if not found."
+    )
+    by_name: dict[str, Optional[FighterModel]] = Field(
+        description="Fighters keyed by each of the requested `names`. `null` if not found."
+    )
+
+
+class LeaderboardQuery(BaseModel):
+    tier: Tier = Field(
+        default=None,
+        description=(
+            "Rank fighters within this tier by tier ELO. Every fighter is ranked by "
+            "ELO when not set."
+        ),
+    )
+    page: int = Field(default=0, description="Page to view.", ge=0)
+    page_size: int = Field(
+        default=100, description="Number of results per page.", ge=1, le=100
+    )
+
+
+class LeaderboardFighterModel(FighterModel):
+    rank: int = Field(
+        description="Rank of the fighter, from 1. Fighters rated the same share a rank."
+    )
+    percentile: float = Field(
+        description="Percentage of the other ranked fighters rated lower, from 0 to 100."
+    )
+
+
+class FighterRankQuery(BaseModel):
+    overall: bool = Field(
+        default=False,
+        description=(
+            "Rank the fighter by ELO against every fighter rather than by tier ELO "
+            "within its tier."
+        ),
+    )
+
+
+class LeaderboardResponse(BaseModel):
+    page: int = Field(description="Current page number.")
+    page_size: int = Field(description="Current page size.")
+    total: int = Field(description="Number of ranked fighters.")
+    results: list[LeaderboardFighterModel] = Field(
+        description="Ranked fighters, highest rated first."
+    )
+
+
+class SearchFighterQuery(BaseModel):
+    name: str = Field(
+        description="Name, or part of the name, of the fighter to search for.",
+        min_length=1,
+        max_length=255,
+    )
+    mode: SearchMode = Field(
+        default=SearchMode.FUZZY,
+        description=(
+            "How names are matched, always case insensitively. `exact` matches the "
+            "whole name, `prefix` names starting with `name`, and `fuzzy` names similar "
+            "to `name`, typos included."
+        ),
+    )
+    limit: int = Field(default=10, description="Most fighters to return.", ge=1, le=100)
+
+
+class SearchFighterModel(FighterModel):
+    similarity: float = Field(
+        description="Trigram similarity between the name of the fighter and `name`, from 0 to 1."
+    )
+
+
+class SearchFighterResponse(BaseModel):
+    results: list[SearchFighterModel] = Field(
+        description=(
+            "Matching fighters. Ordered by similarity for `fuzzy` searches, otherwise "
+            "by name."
+        )
+    )
+
+
 # === Matches ===
-class ListMatchQuery(PaginationQuery):
+class MatchFilterQuery(BaseModel):
     fighter_red: int = Field(
         default=None,
         description="Filter matches where the Red fighter was a specific fighter by ID.",
@@ -187,6 +457,14 @@ class ListMatchQuery(PaginationQuery):
     )
 
 
+class ListMatchQuery(MatchFilterQuery, PaginationQuery):
+    pass
+
+
+class ExportMatchQuery(MatchFilterQuery, ExportQuery):
+    pass
+
+
 class MatchModel(BaseModel):
     id: int = Field(description="ID of the match.")
     date: datetime = Field(description="Date of the match.")
@@ -217,10 +495,104 @@ class ListMatchResponse(PaginationResponse):
     results: list[MatchModel] = Field(description="Filtered matches.")
 
 
+class BatchMatchQuery(BaseModel):
+    ids: list[int] = Field(
+        default=[],
+        description="IDs of the matches to get. Repeated, or comma separated.",
+        max_length=BATCH_MAX_SIZE,
+    )
+
+    @field_validator("ids", mode="before")
+    @classmethod
+    def validate_ids(cls, v: Any) -> Any:
+        return split_ids(v)
+
+
+class BatchMatchResponse(BaseModel):
+    by_id: dict[str, Optional[MatchModel]] = Field(
+        description="Matches keyed by each of the requested `ids`. `null` if not found."
+    )
+
+
+# === Fighter Stats ===
+class FighterStatsQuery(BaseModel):
+    tier: Tier = Field(
+        default=None,
+        description="Tier to calculate `tier_record` for. Defaults to the current tier of the fighter.",
+    )
+    opponent: int = Field(
+        default=None,
+        description="ID of a fighter to calculate the `head_to_head` record against.",
+        ge=1,
+    )
+    recent: int = Field(
+        default=10,
+        description="Number of most recent matches to include in `recent_matches`.",
+        ge=0,
+        le=100,
+    )
+
+
+class RecordModel(BaseModel):
+    matches: int = Field(description="Number of matches fought.")
+    wins: int = Field(description="Number of matches won.")
+    losses: int = Field(description="Number of matches lost.")
+    win_rate: Optional[float] = Field(
+        description="Ratio of matches won, between 0 and 1. `null` if no matches were fought."
+    )
+
+
+class FighterStatsModel(BaseModel):
+    record: RecordModel = Field(description="Record across all matches.")
+    tier: Optional[Tier] = Field(description="Tier used to calculate `tier_record`.")
+    tier_record: RecordModel = Field(description="Record across matches in `tier`.")
+    head_to_head: Optional[RecordModel] = Field(
+        description="Record against the opponent. `null` if no opponent was given."
+    )
+    total_bet: int = Field(description="Total amount bet on the fighter.")
+    total_bet_against: int = Field(
+        description="Total amount bet on the opponents of the fighter."
+    )
+    average_bet: Optional[float] = Field(
+        description="Average amount bet on the fighter. `null` if no matches were fought."
+    )
+    average_bet_share: Optional[float] = Field(
+        description="Average share of the total pot bet on the fighter, between 0 and 1. `null` if no matches were fought."
+    )
+    average_odds: Optional[float] = Field(
+        description="Average odds of the fighter, the amount bet against them for every 1 bet on them. `null` if nothing was ever bet on them."
+    )
+    recent_matches: list[MatchModel] = Field(
+        description="Most recent matches fought, newest first."
+    )
+
+
 # === Current Match ===
+class CurrentMatchInfoQuery(BaseModel):
+    stats: bool = Field(
+        default=False,
+        description="Include aggregated `stats` for each fighter instead of their full match history.",
+    )
+    include_matches: bool = Field(
+        default=False,
+        description="When `stats` is set, also include every match of each fighter in `matches`.",
+    )
+    recent: int = Field(
+        default=10,
+        description="When `stats` is set, number of most recent matches to include in `recent_matches`.",
+        ge=0,
+        le=100,
+    )
+
+
 class ExtendedFighterModel(FighterModel):
-    matches: list[MatchModel] = Field(
-        description="All matches the fighter has fought in."
+    matches: Optional[list[MatchModel]] = Field(
+        default=None,
+        description="All matches the fighter has fought in. Omitted in `stats` mode unless `include_matches` is set.",
+    )
+    stats: Optional[FighterStatsModel] = Field(
+        default=None,
+        description="Aggregated statistics of the fighter. Only included in `stats` mode.",
     )
 
 
@@ -0,0 +1,26 @@
+import os
+
+import psycopg2
+import pytest
+
+
+@pytest.fixture(scope="session")
+def pg_cursor():
+    # Tests rendering with Postgres need a database, `make docker-up-db`, they are
+    # skipped when none can be reached.
+    try:
+        connection = psycopg2.connect(
+            user=os.environ.get("POSTGRES_USER", "postgres"),
+            password=os.environ.get("POSTGRES_PASSWORD", ""),
+            host=os.environ.get("POSTGRES_HOST", "localhost"),
+            port=int(os.environ.get("POSTGRES_PORT", "5432")),
+            database=os.environ.get("POSTGRES_DB", "postgres"),
+            connect_timeout=5,
+            client_encoding="UTF8",
+        )
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"No database to connect to: {e}")
+
+    with connection, connection.cursor() as cursor:
+        yield cursor
+    connection.close()
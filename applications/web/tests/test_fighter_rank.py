@@ -0,0 +1,82 @@
+"""
+Checks a single fighter looked up by ID gets the rank and percentile the leaderboard
+gives it, ties included, both within its tier and against every fighter.
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+from psycopg2.extras import DictCursor
+
+from src.biz import LEADERBOARD_JSON_FIELDS
+from src.database import db_get_fighter_rank_json, db_get_leaderboard
+
+# Plenty of ties within and across tiers, and a tier of a single fighter.
+FIGHTERS = [
+    (id_, tier, 1500 + id_ % 4 * 10, 1500 - id_ % 3 * 10)
+    for id_, tier in enumerate("AAAAAAABBBBBBBBBBSX", start=1)
+]
+
+
+@pytest.fixture(name="fighter_cursor")
+def fixture_fighter_cursor(pg_cursor):
+    # A temporary `fighter` table hides the real one, if any, from the queries.
+    with pg_cursor.connection.cursor(cursor_factory=DictCursor) as cursor:
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE fighter (
+                id integer PRIMARY KEY,
+                name varchar,
+                tier varchar,
+                prev_tier varchar,
+                elo integer,
+                tier_elo integer,
+                best_streak integer,
+                created_time timestamp,
+                last_updated timestamp
+            )
+            """
+        )
+        try:
+            for id_, tier, elo, tier_elo in FIGHTERS:
+                cursor.execute(
+                    "INSERT INTO fighter VALUES (%s, %s, %s, %s, %s, %s, 0, %s, %s)",
+                    (
+                        id_,
+                        f"Fighter {id_}",
+                        tier,
+                        tier,
+                        elo,
+                        tier_elo,
+                        datetime(2024, 1, 1),
+                        datetime(2024, 1, 1),
+                    ),
+                )
+            yield cursor
+        finally:
+            cursor.execute("DROP TABLE pg_temp.fighter")
+
+
+@pytest.mark.parametrize("tier", ["A", "B", "S", None])
+def test_rank_matches_leaderboard(fighter_cursor, tier) -> None:
+    leaderboard = json.loads(
+        db_get_leaderboard(
+            fighter_cursor, LEADERBOARD_JSON_FIELDS, tier, page=0, page_size=100
+        )["results"]
+    )
+    assert len(leaderboard) == sum(tier in (None, f[1]) for f in FIGHTERS)
+
+    for fighter in leaderboard:
+        rank = db_get_fighter_rank_json(
+            fighter_cursor, LEADERBOARD_JSON_FIELDS, fighter["id"], tier is None
+        )
+        assert rank is not None
+        assert json.loads(rank) == fighter
+
+
+def test_rank_of_missing_fighter(fighter_cursor) -> None:
+    assert (
+        db_get_fighter_rank_json(fighter_cursor, LEADERBOARD_JSON_FIELDS, 999, False)
+        is None
+    )
@@ -0,0 +1,123 @@
+"""
+Checks rows rendered as JSON by Postgres, `json_object_sql`, are byte for byte what
+`jsonify` makes of the matching API model, as the endpoints used to respond.
+"""
+
+from datetime import datetime
+from typing import Any
+
+import pytest
+from flask import Flask, jsonify
+from pydantic import BaseModel
+
+from src.biz import get_json_fields
+from src.database import json_object_sql
+from src.schemas import (
+    Colour,
+    FighterModel,
+    LeaderboardFighterModel,
+    MatchModel,
+    RecordedMatchFormat,
+    Tier,
+)
+
+SQL_TYPES = {int: "bigint", float: "float8", datetime: "timestamp"}
+
+FIGHTER = {
+    "id": 1,
+    "name": "Fighter",
+    "tier": "A",
+    "prev_tier": "S",
+    "elo": 1523,
+    "tier_elo": 1488,
+    "best_streak": 7,
+    "created_time": datetime(2024, 1, 2, 3, 4, 5),
+    "last_updated": datetime(2024, 1, 2, 3, 4, 5, 123456),
+}
+
+MATCH = {
+    "id": 10,
+    "date": datetime(2024, 5, 6, 7, 8, 9, 1),
+    "fighter_red": 1,
+    "fighter_blue": 2,
+    "winner": 2,
+    "bet_red": 1000,
+    "bet_blue": 250000,
+    "streak_red": -3,
+    "streak_blue": 4,
+    "tier": Tier.X,
+    "match_format": RecordedMatchFormat.TOURNAMENT,
+    "colour": Colour.BLUE,
+}
+
+
+def render_with_postgres(cursor, model: type[BaseModel], row: dict[str, Any]) -> bytes:
+    fields = get_json_fields(model)
+    columns = ", ".join(
+        f"%({name})s::{SQL_TYPES.get(type_, 'text')} AS {name}"
+        for name, type_ in fields.items()
+    )
+    cursor.execute(
+        f"SELECT {json_object_sql(fields)} FROM (SELECT {columns}) AS row",
+        {key: getattr(value, "value", value) for key, value in row.items()},
+    )
+    return cursor.fetchone()[0].encode()
+
+
+def render_with_jsonify(model: type[BaseModel], row: dict[str, Any]) -> bytes:
+    with Flask(__name__).app_context():
+        return jsonify(model(**row).model_dump()).get_data().rstrip(b"\n")
+
+
+@pytest.mark.parametrize(
+    "model, row",
+    [
+        pytest.param(FighterModel, FIGHTER, id="fighter"),
+        pytest.param(
+            FighterModel,
+            {
+                **FIGHTER,
+                "name": 'Q"uo\\te\ttab/slash\x01',
+                "created_time": datetime(2024, 1, 2, 3, 4, 5, 500000),
+                "last_updated": datetime(2024, 1, 2, 3, 4, 5, 1),
+            },
+            id="fighter-escaped-name-and-microseconds",
+        ),
+        pytest.param(MatchModel, MATCH, id="match-enums"),
+        pytest.param(
+            MatchModel,
+            {
+                **MATCH,
+                "tier": Tier.P,
+                "match_format": RecordedMatchFormat.MATCHMAKING,
+                "colour": Colour.RED,
+                "date": datetime(2024, 12, 31, 23, 59, 59),
+            },
+            id="match-enums-whole-seconds",
+        ),
+        *[
+            pytest.param(
+                LeaderboardFighterModel,
+                {**FIGHTER, "rank": 3, "percentile": percentile},
+                id=f"leaderboard-{percentile}",
+            )
+            for percentile in [100.0, 0.0, 99.34, 1 / 3, 12.5, 1e-05, 123456.0]
+        ],
+    ],
+)
+def test_postgres_renders_like_jsonify(pg_cursor, model, row) -> None:
+    assert render_with_postgres(pg_cursor, model, row) == render_with_jsonify(
+        model, row
+    )
+
+
+def test_non_ascii_decodes_the_same(pg_cursor) -> None:
+    # Non ASCII characters are sent as is rather than as `\u` escapes, the JSON decodes
+    # to the same value either way.
+    row = {**FIGHTER, "name": "Fighter ☆ é"}
+    rendered = render_with_postgres(pg_cursor, FighterModel, row)
+    assert "☆".encode() in rendered
+    with Flask(__name__).app_context():
+        assert Flask(__name__).json.loads(rendered) == Flask(__name__).json.loads(
+            render_with_jsonify(FighterModel, row)
+        )
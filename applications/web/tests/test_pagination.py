@@ -0,0 +1,217 @@
+"""
+Checks cursors survive a round trip and that paging through with them, keyset
+pagination, visits every row once in order even when the order column has ties across
+page boundaries. Queries run against SQLite, which compares rows like Postgres does.
+"""
+
+import re
+import sqlite3
+from base64 import urlsafe_b64encode
+from datetime import datetime, timedelta
+
+import pytest
+from pydantic import ValidationError
+
+from src.database import (
+    construct_final_query,
+    construct_json_page_query,
+    generate_query_obj,
+    order_columns,
+)
+from src.schemas import (
+    FighterOrder,
+    ListFighterQuery,
+    PaginationQuery,
+    decode_cursor,
+    encode_cursor,
+)
+
+PAGE_SIZE = 3
+
+# Few distinct values so nearly every page boundary falls in the middle of a tie.
+FIGHTERS = [
+    {
+        "id": id_,
+        "elo": 1500 + id_ % 3 * 10,
+        "tier_elo": 1500 - id_ % 2 * 10,
+        "best_streak": id_ % 4,
+        "last_updated": (
+            datetime(2024, 1, 1) + timedelta(microseconds=id_ % 5 * 250000)
+        ).isoformat(),
+    }
+    for id_ in range(1, 27)
+]
+
+
+@pytest.fixture(name="sqlite_cursor")
+def fixture_sqlite_cursor():
+    connection = sqlite3.connect(":memory:")
+    connection.execute(
+        "CREATE TABLE fighter "
+        "(id INTEGER, elo INTEGER, tier_elo INTEGER, best_streak INTEGER, "
+        "last_updated TEXT)"
+    )
+    connection.executemany(
+        "INSERT INTO fighter VALUES "
+        "(:id, :elo, :tier_elo, :best_streak, :last_updated)",
+        FIGHTERS,
+    )
+    yield connection.cursor()
+    connection.close()
+
+
+def fetch_page(cursor, query_args: ListFighterQuery) -> list[tuple]:
+    columns, _ = order_columns(query_args.order_by)
+    query = construct_final_query(
+        f"SELECT {', '.join(columns)} FROM fighter",
+        [],
+        keyset=query_args.after_id is not None,
+        order_by=query_args.order_by,
+    )
+    # SQLite names parameters differently and only takes `OFFSET` after `LIMIT`.
+    query = re.sub(r"%\((\w+)\)s", r":\1", query).replace(
+        "OFFSET :offset LIMIT :limit", "LIMIT :limit OFFSET :offset"
+    )
+    cursor.execute(
+        query,
+        generate_query_obj(
+            query_args.page,
+            query_args.page_size,
+            query_args.after_id,
+            query_args.after_value,
+        ),
+    )
+    return cursor.fetchall()
+
+
+@pytest.mark.parametrize("order_by", list(FighterOrder))
+def test_keyset_pages_visit_every_row_once(sqlite_cursor, order_by) -> None:
+    columns, direction = order_columns(order_by)
+    expected = sorted(
+        (tuple(fighter[column] for column in columns) for fighter in FIGHTERS),
+        reverse=direction == "DESC",
+    )
+
+    rows: list[tuple] = []
+    query_args = ListFighterQuery(order_by=order_by, page_size=PAGE_SIZE)
+    while page := fetch_page(sqlite_cursor, query_args):
+        rows.extend(page)
+        query_args = ListFighterQuery(
+            order_by=order_by, page_size=PAGE_SIZE, cursor=encode_cursor(*page[-1])
+        )
+
+    assert rows == expected
+
+
+@pytest.mark.parametrize("order_by", ["elo", "-elo"])
+def test_keyset_page_starts_after_tied_boundary_row(sqlite_cursor, order_by) -> None:
+    # The cursor points at the middle of a tie, the next page picks up with the next ID
+    # of the same value rather than skipping or repeating the rest of the tie.
+    query_args = ListFighterQuery(
+        order_by=order_by, page_size=PAGE_SIZE, cursor=encode_cursor(1510, 4)
+    )
+    if order_by == "elo":
+        assert fetch_page(sqlite_cursor, query_args) == [
+            (1510, 7),
+            (1510, 10),
+            (1510, 13),
+        ]
+    else:
+        assert fetch_page(sqlite_cursor, query_args) == [
+            (1510, 1),
+            (1500, 24),
+            (1500, 21),
+        ]
+
+
+def test_keyset_query_compares_order_columns_as_a_row() -> None:
+    assert construct_final_query(
+        "SELECT * FROM fighter", ["tier = %(tier)s"], keyset=True, order_by="-tier_elo"
+    ) == (
+        "SELECT * FROM fighter WHERE tier = %(tier)s AND "
+        "(tier_elo, id) < (%(after_value)s, %(after_id)s) "
+        "ORDER BY tier_elo DESC, id DESC LIMIT %(limit)s"
+    )
+    assert construct_final_query("SELECT * FROM match", [], keyset=True) == (
+        "SELECT * FROM match WHERE (id) > (%(after_id)s) "
+        "ORDER BY id ASC LIMIT %(limit)s"
+    )
+
+
+def test_counted_page_is_read_straight_off_the_table() -> None:
+    # Counting the filtered rows must not get in the way of the page being walked off
+    # the index it is ordered by.
+    where_stmts = ["(fighter_red = %(fighter)s OR fighter_blue = %(fighter)s)"]
+    query = " ".join(
+        construct_json_page_query(
+            "match", {"id": int}, where_stmts, keyset=True, count=True
+        ).split()
+    )
+    assert "WITH" not in query
+    assert (
+        f"FROM ({construct_final_query('SELECT * FROM match', where_stmts, keyset=True)})"
+        " AS page"
+    ) in query
+    count_query = construct_final_query(
+        "SELECT COUNT(*) FROM match", where_stmts, include_offset=False
+    )
+    assert f"({count_query}) AS total" in query
+
+
+@pytest.mark.parametrize(
+    "values",
+    [[1], [0], [1500, 42], ["2024-01-01T00:00:00.250000", 7], ["ñame", -1]],
+)
+def test_cursor_round_trip(values) -> None:
+    cursor = encode_cursor(*values)
+    assert re.fullmatch(r"[A-Za-z0-9_=-]+", cursor)
+    assert decode_cursor(cursor) == values
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        urlsafe_b64encode(b"\xff\xfe").decode(),
+        urlsafe_b64encode(b"not json").decode(),
+        urlsafe_b64encode(b"[]").decode(),
+        urlsafe_b64encode(b'{"id": 1}').decode(),
+        "ñ",
+    ],
+)
+def test_decode_invalid_cursor(cursor) -> None:
+    with pytest.raises(ValueError, match="Invalid cursor."):
+        decode_cursor(cursor)
+
+
+def test_pagination_query_cursor() -> None:
+    assert PaginationQuery().after_id is None
+    assert PaginationQuery(cursor=encode_cursor(42)).after_id == 42
+    with pytest.raises(ValidationError):
+        PaginationQuery(cursor=encode_cursor("42"))
+
+
+@pytest.mark.parametrize(
+    "order_by, values",
+    [
+        ("id", [1500, 42]),
+        ("elo", [42]),
+        ("elo", ["1500", 42]),
+        ("-elo", [True, 42]),
+        ("last_updated", ["yesterday", 42]),
+        ("-last_updated", [None, 42]),
+    ],
+)
+def test_cursor_must_match_order_by(order_by, values) -> None:
+    with pytest.raises(ValidationError):
+        ListFighterQuery(order_by=order_by, cursor=encode_cursor(*values))
+
+
+def test_ordered_cursor_values() -> None:
+    query_args = ListFighterQuery(
+        order_by=FighterOrder.ELO_DESC, cursor=encode_cursor(1500, 42)
+    )
+    assert (query_args.after_value, query_args.after_id) == (1500, 42)
+
+    query_args = ListFighterQuery(order_by=FighterOrder.ID, cursor=encode_cursor(42))
+    assert (query_args.after_value, query_args.after_id) == (None, 42)